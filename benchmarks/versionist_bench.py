@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of versionist.
+
+Synthetic target lists and temporary directory trees are generated for every
+size, and each case is timed several times. The minimum and the median of
+the timed calls are reported; with a few calls per case, tail percentiles
+would only repeat the slowest call. Results are written as JSON, and two
+result files can be compared to catch regressions.
+
+    python benchmarks/versionist_bench.py run --sizes 1000,100000 --output new.json
+    python benchmarks/versionist_bench.py compare base.json new.json --threshold 0.1
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from versionist import FileVersionist, Versionist
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+kDefaultSizes = "1000,10000,100000,1000000"
+kDefaultDirSizes = "1000,10000,100000"
+
+kPatterns = {"token": "shot_comp_<version>\\.exr",
+             "regex": "shot_comp_(?P<version>v\\d{4})\\.exr"}
+
+
+#-------------------------------------------------------------------------------
+## Generates names where hit_ratio of them match the patterns. Versions are
+## shuffled, so the latest one is not at the end of the list.
+##
+## @param size : <int> number of names.
+##
+## @param hit_ratio : <float> ratio of names which match.
+##
+## @param seed : <int> random seed.
+##
+## @return : <list> of names.
+def make_names(size, hit_ratio, seed = 0):
+    rand = random.Random(seed)
+    hits = int(size * hit_ratio)
+    names = ["shot_comp_v%04d.exr" % (index % 10000) for index in range(hits)]
+    names.extend("plate_%07d.dpx" % index for index in range(size - hits))
+    rand.shuffle(names)
+    return names
+
+
+#-------------------------------------------------------------------------------
+## Creates a directory with empty files and directories for the names.
+## Every other name is a directory.
+##
+## @param root : <str> parent directory.
+##
+## @param names : <list> of names.
+##
+## @return : <str> created directory.
+def make_directory(root, names):
+    directory = tempfile.mkdtemp(dir = root)
+    for index, name in enumerate(names):
+        path = os.path.join(directory, name)
+        if index % 2:
+            os.mkdir(path)
+        else:
+            open(path, "w").close()
+
+    return directory
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+#-------------------------------------------------------------------------------
+## Times a function. Garbage collection is disabled while timing, and peak
+## memory is measured in a separate call when tracemalloc is available.
+##
+## @param func : <function> function to time.
+##
+## @param repeat : <int> number of timed calls.
+##
+## @return : <dict> latencies in seconds and peak memory in bytes.
+def measure(func, repeat):
+    func()
+    latencies = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = timeit.default_timer()
+            func()
+            latencies.append(timeit.default_timer() - start)
+        finally:
+            gc.enable()
+
+    peak = None
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {"latencies": latencies, "peak_memory": peak}
+
+
+def scan_cases(sizes):
+    for size in sizes:
+        for hit_ratio in (1.0, 0.1):
+            names = make_names(size, hit_ratio)
+            for pattern_kind, pattern in sorted(kPatterns.items()):
+                for match_type in (Versionist.kMatchType, Versionist.kSearchType):
+                    name_pattern = pattern if match_type == Versionist.kSearchType else "^%s$" % pattern
+
+                    def latest(names = names, name_pattern = name_pattern, match_type = match_type):
+                        Versionist(names, name_pattern, padding = 4, match_type = match_type).get_latest_name()
+
+                    yield ("latest/%s/%s/hit%g/%d" % (pattern_kind, match_type, hit_ratio, size), size, latest)
+
+            def next_version(names = names):
+                Versionist(names, "^shot_comp_<version>\\.exr$", padding = 4).get_next_version_name()
+
+            def history(names = names):
+                Versionist(names, "^shot_comp_<version>\\.exr$", padding = 4).get_history()
+
+            yield ("next/token/match/hit%g/%d" % (hit_ratio, size), size, next_version)
+            yield ("history/token/match/hit%g/%d" % (hit_ratio, size), size, history)
+
+
+def listing_cases(sizes, root):
+    for size in sizes:
+        directory = make_directory(root, make_names(size, 0.1))
+        for target_type in (FileVersionist.kTargetFile, FileVersionist.kTargetDir, FileVersionist.kTargetBoth):
+
+            def listing(directory = directory, target_type = target_type):
+                FileVersionist(directory, "^shot_comp_<version>\\.exr$", padding = 4,
+                               target_type = target_type).get_latest_name()
+
+            yield ("listing/%s/hit0.1/%d" % (target_type, size), size, listing)
+
+
+def run(args):
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    dir_sizes = [int(size) for size in args.dir_sizes.split(",") if size]
+    root = tempfile.mkdtemp(prefix = "versionist_bench_")
+    results = {}
+
+    try:
+        cases = [scan_cases(sizes)]
+        if not args.skip_listing:
+            cases.append(listing_cases(dir_sizes, root))
+
+        for generator in cases:
+            for name, size, func in generator:
+                if args.filter and args.filter not in name:
+                    continue
+
+                measured = measure(func, args.repeat)
+                latencies = measured["latencies"]
+                typical = median(latencies)
+                results[name] = {"size": size,
+                                 "throughput": size / typical if typical else None,
+                                 "min": min(latencies),
+                                 "median": typical,
+                                 "peak_memory": measured["peak_memory"]}
+                print_result(name, results[name])
+
+    finally:
+        shutil.rmtree(root)
+
+    report = {"python": platform.python_version(),
+              "platform": platform.platform(),
+              "repeat": args.repeat,
+              "results": results}
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent = 2, sort_keys = True)
+
+
+def print_result(name, result):
+    memory = result["peak_memory"]
+    print("%-44s %12.0f /s  min %9.2f ms  median %9.2f ms  peak %s" %
+          (name, result["throughput"] or 0, result["min"] * 1000, result["median"] * 1000,
+           "-" if memory is None else "%.1f MB" % (memory / 1048576.0)))
+
+
+#-------------------------------------------------------------------------------
+## Compares two result files. Cases which are slower or use more memory than
+## the threshold are reported as regressions, and the exit status is 1.
+## Times are compared by their minimum, which is the least affected by other
+## load on the machine. Small peaks are not compared because they are
+## dominated by noise.
+def compare(args):
+    with open(args.base) as base_file:
+        base = json.load(base_file)["results"]
+    with open(args.new) as new_file:
+        new = json.load(new_file)["results"]
+
+    regressions = []
+    for name in sorted(set(base) & set(new)):
+        old_result = base[name]
+        new_result = new[name]
+        time_ratio = new_result["min"] / old_result["min"] if old_result["min"] else 1.0
+        memory_ratio = None
+        if (old_result.get("peak_memory") or 0) >= args.memory_floor and new_result.get("peak_memory") is not None:
+            memory_ratio = new_result["peak_memory"] / float(old_result["peak_memory"])
+
+        mark = ""
+        if time_ratio > 1.0 + args.threshold or (memory_ratio is not None and memory_ratio > 1.0 + args.threshold):
+            mark = "REGRESSION"
+            regressions.append(name)
+        elif time_ratio < 1.0 - args.threshold:
+            mark = "faster"
+
+        print("%-44s time x%.2f  memory %s  %s" %
+              (name, time_ratio, "-" if memory_ratio is None else "x%.2f" % memory_ratio, mark))
+
+    for name in sorted(set(base) ^ set(new)):
+        print("%-44s only in %s" % (name, "base" if name in base else "new"))
+
+    return 1 if regressions else 0
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmarks of versionist.")
+    commands = parser.add_subparsers(dest = "command")
+
+    run_parser = commands.add_parser("run", help = "run benchmarks")
+    run_parser.add_argument("--sizes", default = kDefaultSizes, help = "comma separated list sizes")
+    run_parser.add_argument("--dir-sizes", default = kDefaultDirSizes, help = "comma separated directory sizes")
+    run_parser.add_argument("--repeat", type = int, default = 5, help = "timed calls per case")
+    run_parser.add_argument("--filter", default = None, help = "run cases which have this text")
+    run_parser.add_argument("--skip-listing", action = "store_true", help = "skip directory listing cases")
+    run_parser.add_argument("--output", default = None, help = "JSON file to write")
+
+    compare_parser = commands.add_parser("compare", help = "compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type = float, default = 0.1, help = "allowed slowdown ratio")
+    compare_parser.add_argument("--memory-floor", type = int, default = 1 << 20,
+                                help = "peak memory in bytes below which memory is not compared")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args)
+        return 0
+
+    elif args.command == "compare":
+        return compare(args)
+
+    parser.print_help()
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
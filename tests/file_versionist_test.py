@@ -1,12 +1,48 @@
 # -*- coding: utf-8 -*-
 import os
 import re
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 
-from versionist import FileVersionist
+from versionist import FileVersionist, VersionKeyError
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    import pathlib
+except ImportError:
+    pathlib = None
 
 TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), "test_data")
 
+
+class CountingFileVersionist(FileVersionist):
+
+    listing_count = 0
+
+    def _list_directory(self, directory, accept = None):
+        CountingFileVersionist.listing_count += 1
+        time.sleep(0.05)
+        return super(CountingFileVersionist, self)._list_directory(directory, accept)
+
+
+class ThreadRecordingFileVersionist(FileVersionist):
+
+    def __init__(self, *args, **kwargs):
+        self.listing_threads = []
+        super(ThreadRecordingFileVersionist, self).__init__(*args, **kwargs)
+
+    def _iter_directory(self, directory, accept = None):
+        self.listing_threads.append(threading.current_thread())
+        return super(ThreadRecordingFileVersionist, self)._iter_directory(directory, accept)
+
+
 class TestFileVersioninst(unittest.TestCase):
 
 
@@ -75,6 +111,287 @@ class TestFileVersioninst(unittest.TestCase):
 
 
 
+    def test_listing_is_filtered_by_pattern(self):
+        pat = "^dog_<version>\.txt$"
+        directory = os.path.join(TEST_DATA_DIR, "file_search_test01")
+        vernist = FileVersionist(directory, pat)
+        self.assertEqual(sorted(vernist._targets), ["dog_v001.txt", "dog_v002.txt", "dog_v005.txt"])
+        vernist.set_name_pattern("^dog_<version>\.yaml$")
+        self.assertIsNone(vernist.get_latest_name())
+        self.assertEqual(vernist._targets, [])
+
+
+    def test_missing_directory(self):
+        pat = "^dog_<version>\.txt$"
+        directory = os.path.join(TEST_DATA_DIR, "no_such_directory")
+        vernist = FileVersionist(directory, pat)
+        self.assertIsNone(vernist.get_latest_namePath())
+        self.assertEqual(vernist.get_next_version_name(), "v001")
+
+
+    def test_target_type_from_directory_entry(self):
+        directory = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(directory, "dog_v004"))
+            open(os.path.join(directory, "dog_v002"), "w").close()
+            pat = "^dog_<version>$"
+            file_vernist = FileVersionist(directory, pat)
+            dir_vernist = FileVersionist(directory, pat, target_type = FileVersionist.kTargetDir)
+            both_vernist = FileVersionist(directory, pat, target_type = FileVersionist.kTargetBoth)
+            self.assertEqual(file_vernist.get_latest_version_name(), "v002")
+            self.assertEqual(dir_vernist.get_latest_version_name(), "v004")
+            self.assertEqual(both_vernist.get_latest_version_name(), "v004")
+
+        finally:
+            shutil.rmtree(directory)
+
+
+    def test_listing_cache_is_shared(self):
+        directory = tempfile.mkdtemp()
+        FileVersionist.enable_listing_cache(maxsize = 8)
+        try:
+            for name in ("dog_v001.ma", "dog_v002.ma", "cat_v007.ma"):
+                open(os.path.join(directory, name), "w").close()
+            os.utime(directory, (time.time() - 60, time.time() - 60))
+
+            vernist = FileVersionist(directory, "^dog_<version>\.ma$")
+            self.assertEqual(vernist.get_latest_version_name(), "v002")
+            other = FileVersionist(directory, "^cat_<version>\.ma$")
+            self.assertEqual(other.get_latest_version_name(), "v007")
+            info = FileVersionist.listing_cache_info()
+            self.assertEqual((info.hits, info.misses), (1, 1))
+
+            open(os.path.join(directory, "dog_v003.ma"), "w").close()
+            vernist.refresh()
+            self.assertEqual(vernist.get_latest_version_name(), "v003")
+            info = FileVersionist.listing_cache_info()
+            self.assertEqual((info.hits, info.misses), (1, 2))
+
+        finally:
+            FileVersionist.disable_listing_cache()
+            shutil.rmtree(directory)
+
+
+    def test_listing_cache_ttl(self):
+        directory = tempfile.mkdtemp()
+        FileVersionist.enable_listing_cache(maxsize = 1, ttl = 60)
+        try:
+            open(os.path.join(directory, "dog_v001.ma"), "w").close()
+            vernist = FileVersionist(directory, "^dog_<version>\.ma$")
+            open(os.path.join(directory, "dog_v002.ma"), "w").close()
+            vernist.refresh()
+            self.assertEqual(vernist.get_latest_version_name(), "v001")
+
+            FileVersionist(TEST_DATA_DIR, "^dog_<version>\.ma$")
+            info = FileVersionist.listing_cache_info()
+            self.assertEqual((info.hits, info.misses, info.evictions), (1, 2, 1))
+
+        finally:
+            FileVersionist.disable_listing_cache()
+            shutil.rmtree(directory)
+
+
+    def test_scan_directories(self):
+        directories = [os.path.join(TEST_DATA_DIR, "file_search_test01"),
+                       (os.path.join(TEST_DATA_DIR, "file_search_test02"), "^dog_<version>\.ya?ml$"),
+                       os.path.join(TEST_DATA_DIR, "no_such_directory")]
+        results = FileVersionist.scan_directories(directories, "^dog_<version>\.txt$", max_workers = 2)
+        latest = dict((result.directory, result.version.versionName) for result in results)
+        self.assertEqual(latest, {directories[0]: "v005",
+                                  directories[1][0]: "v003",
+                                  directories[2]: None})
+
+
+    def test_scan_directories_error(self):
+        directories = [os.path.join(TEST_DATA_DIR, "file_search_test01"),
+                       (os.path.join(TEST_DATA_DIR, "file_search_test02"), "^dog_<ver>\.yaml$")]
+        results = list(FileVersionist.scan_directories(directories, "^dog_<version>\.txt$"))
+        errors = dict((result.directory, result.error) for result in results)
+        self.assertIsNone(errors[directories[0]])
+        self.assertIsInstance(errors[directories[1][0]], VersionKeyError)
+
+
+    def test_scan_directories_bad_item(self):
+        directory = os.path.join(TEST_DATA_DIR, "file_search_test01")
+        directories = [directory, 42, (directory, "^dog_<version>\.txt$", "extra")]
+        if pathlib is not None:
+            directories.append(pathlib.Path(directory))
+
+        results = list(FileVersionist.scan_directories(directories, "^dog_<version>\.txt$", max_workers = 2))
+        self.assertEqual(len(results), len(directories))
+        self.assertEqual([result.version.versionName for result in results if result.error is None],
+                         ["v005"] * (len(directories) - 2))
+        self.assertEqual(len([result for result in results if result.error is not None]), 2)
+
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_async_lookup(self):
+        pat = "^dog_<version>\.txt$"
+        directory = os.path.join(TEST_DATA_DIR, "file_search_test01")
+        vernist = FileVersionist(name_pattern = pat)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(vernist.set_directory_async(directory))
+            self.assertEqual(vernist.get_latest_version_name(), "v005")
+            path = loop.run_until_complete(vernist.get_latest_namePath_async())
+            self.assertEqual(path, os.path.join(directory, "dog_v005.txt"))
+            next_name = loop.run_until_complete(vernist.get_next_version_name_async())
+            self.assertEqual(next_name, "v006")
+
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_async_listing_is_coalesced(self):
+        pat = "^dog_<version>\.txt$"
+        directory = os.path.join(TEST_DATA_DIR, "file_search_test01")
+        vernists = [CountingFileVersionist(name_pattern = pat) for _ in range(4)]
+        CountingFileVersionist.listing_count = 0
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            for vernist in vernists:
+                vernist._directory = directory
+
+            gathered = asyncio.gather(*[vernist.get_latest_name_async() for vernist in vernists])
+            names = loop.run_until_complete(gathered)
+
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        self.assertEqual(names, ["dog_v005.txt"] * 4)
+        self.assertEqual(CountingFileVersionist.listing_count, 1)
+
+
+    def test_streaming(self):
+        directory = tempfile.mkdtemp()
+        try:
+            open(os.path.join(directory, "dog_v001.ma"), "w").close()
+            vernist = FileVersionist(directory, "^dog_<version>\.ma$", streaming = True)
+            self.assertEqual(vernist._targets, [])
+            self.assertEqual(vernist.get_latest_version_name(), "v001")
+            open(os.path.join(directory, "dog_v002.ma"), "w").close()
+            self.assertEqual(vernist.get_latest_version_name(), "v001")
+            vernist.refresh()
+            self.assertEqual(vernist.get_latest_version_name(), "v002")
+            vernist.set_directory(os.path.join(directory, "no_such_directory"))
+            self.assertIsNone(vernist.get_latest_version_name())
+
+        finally:
+            shutil.rmtree(directory)
+
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_streaming_async_lookup(self):
+        directory = tempfile.mkdtemp()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            open(os.path.join(directory, "dog_v003.ma"), "w").close()
+            vernist = ThreadRecordingFileVersionist(directory, "^dog_<version>\.ma$", streaming = True)
+            self.assertEqual(loop.run_until_complete(vernist.get_latest_name_async()), "dog_v003.ma")
+            self.assertEqual(vernist._targets, [])
+            self.assertEqual(len(vernist.listing_threads), 1)
+            self.assertIsNot(vernist.listing_threads[0], threading.current_thread())
+
+            open(os.path.join(directory, "dog_v004.ma"), "w").close()
+            loop.run_until_complete(vernist.refresh_async())
+            self.assertEqual(loop.run_until_complete(vernist.get_next_version_name_async()), "v005")
+            self.assertEqual(len(vernist.listing_threads), 2)
+            self.assertNotIn(threading.current_thread(), vernist.listing_threads)
+
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+            shutil.rmtree(directory)
+
+
+    def test_reserve_next_version(self):
+        directory = tempfile.mkdtemp()
+        try:
+            open(os.path.join(directory, "dog_v001.ma"), "w").close()
+            vernist = FileVersionist(directory, "^dog_<version>\.ma$")
+            self.assertEqual(vernist.reserve_next_version(), os.path.join(directory, "dog_v002.ma"))
+            self.assertEqual(vernist.reserve_next_version(), os.path.join(directory, "dog_v003.ma"))
+
+            other = FileVersionist(directory, "^dog_<version>\.ma$")
+            open(os.path.join(directory, "dog_v004.ma"), "w").close()
+            paths = other.reserve_next_versions(2)
+            self.assertEqual([os.path.basename(path) for path in paths], ["dog_v005.ma", "dog_v006.ma"])
+            self.assertTrue(all(os.path.isfile(path) for path in paths))
+
+            open(os.path.join(directory, "dog_v008.ma"), "w").close()
+            paths = other.reserve_next_versions(2)
+            self.assertEqual([os.path.basename(path) for path in paths], ["dog_v009.ma", "dog_v010.ma"])
+            self.assertFalse(os.path.exists(os.path.join(directory, "dog_v007.ma")))
+
+        finally:
+            shutil.rmtree(directory)
+
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_reserve_after_set_directory_async(self):
+        directories = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            open(os.path.join(directories[0], "dog_v007.ma"), "w").close()
+            open(os.path.join(directories[1], "dog_v001.ma"), "w").close()
+            vernist = FileVersionist(directories[0], "^dog_<version>\.ma$")
+            self.assertEqual(vernist.reserve_next_version(), os.path.join(directories[0], "dog_v008.ma"))
+
+            loop.run_until_complete(vernist.set_directory_async(directories[1]))
+            self.assertEqual(vernist.reserve_next_version(), os.path.join(directories[1], "dog_v002.ma"))
+
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+            for directory in directories:
+                shutil.rmtree(directory)
+
+
+    def test_reserve_with_template(self):
+        directory = tempfile.mkdtemp()
+        try:
+            vernist = FileVersionist(directory, "^shot_<version>$", target_type = FileVersionist.kTargetDir)
+            self.assertRaises(ValueError, vernist.reserve_next_version)
+            path = vernist.reserve_next_version("shot_<version>")
+            self.assertEqual(path, os.path.join(directory, "shot_v001"))
+            self.assertTrue(os.path.isdir(path))
+            self.assertRaises(ValueError, vernist.reserve_next_version, "shot_v")
+
+        finally:
+            shutil.rmtree(directory)
+
+
+    def test_reserve_concurrently(self):
+        directory = tempfile.mkdtemp()
+        try:
+            open(os.path.join(directory, "dog_v001.ma"), "w").close()
+            reserved = []
+
+            def publish():
+                vernist = FileVersionist(directory, "^dog_<version>\.ma$")
+                for _ in range(5):
+                    reserved.append(vernist.reserve_next_version())
+
+            threads = [threading.Thread(target = publish) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(len(reserved), 40)
+            self.assertEqual(len(set(reserved)), 40)
+
+        finally:
+            shutil.rmtree(directory)
+
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from xml.sax.saxutils import escape
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from urlparse import parse_qs, urlparse
+
+from versionist import FileVersionist, ListingBackend, LocalListingBackend, ObjectStoreListingBackend, Versionist
+
+
+class FakeBucket(object):
+    """In memory bucket which answers ListObjectsV2 like S3 does."""
+
+    def __init__(self, keys):
+        self.keys = sorted(keys)
+        self.prefixes = []
+
+    def list_objects_v2(self, Bucket, Prefix = "", Delimiter = None, MaxKeys = 1000, ContinuationToken = None):
+        self.prefixes.append(Prefix)
+        entries = []
+        for key in self.keys:
+            if not key.startswith(Prefix):
+                continue
+
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                entry = ("prefix", Prefix + rest[:rest.index(Delimiter) + 1])
+            else:
+                entry = ("key", key)
+
+            if entry not in entries:
+                entries.append(entry)
+
+        start = int(ContinuationToken or 0)
+        page = entries[start:start + MaxKeys]
+        response = {"Contents": [{"Key": value} for kind, value in page if kind == "key"],
+                    "CommonPrefixes": [{"Prefix": value} for kind, value in page if kind == "prefix"],
+                    "IsTruncated": start + MaxKeys < len(entries)}
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + MaxKeys)
+
+        return response
+
+
+class BucketHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = dict((key, values[0]) for key, values in parse_qs(url.query).items())
+        response = self.server.bucket.list_objects_v2(url.path.strip("/"),
+                                                      Prefix = query.get("prefix", ""),
+                                                      Delimiter = query.get("delimiter"),
+                                                      MaxKeys = int(query.get("max-keys", 1000)),
+                                                      ContinuationToken = query.get("continuation-token"))
+        body = ['<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">']
+        body.extend("<Contents><Key>%s</Key><Size>0</Size></Contents>" % escape(item["Key"])
+                    for item in response["Contents"])
+        body.extend("<CommonPrefixes><Prefix>%s</Prefix></CommonPrefixes>" % escape(item["Prefix"])
+                    for item in response["CommonPrefixes"])
+        body.append("<IsTruncated>%s</IsTruncated>" % ("true" if response["IsTruncated"] else "false"))
+        if response["IsTruncated"]:
+            body.append("<NextContinuationToken>%s</NextContinuationToken>" % response["NextContinuationToken"])
+        body.append("</ListBucketResult>")
+        data = "".join(body).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestListingBackend(unittest.TestCase):
+
+    KEYS = ["show/sh010/comp/comp_v001.nk",
+            "show/sh010/comp/comp_v002.nk",
+            "show/sh010/comp/comp_v010.nk",
+            "show/sh010/comp/comp_v004/",
+            "show/sh010/comp/comp_v011/render.exr",
+            "show/sh010/comp/notes.txt",
+            "show/sh010/comp/plate_v020.nk",
+            "show/sh010/compositing_v030.nk",
+            "show/sh020/comp/comp_v099.nk"]
+
+    def setUp(self):
+        Versionist.set_version_key("version")
+        self.bucket = FakeBucket(self.KEYS)
+        self.server = HTTPServer(("127.0.0.1", 0), BucketHandler)
+        self.server.bucket = self.bucket
+        self.thread = threading.Thread(target = self.server.serve_forever, args = (0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.endpoint = "http://127.0.0.1:%d" % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_http_endpoint(self):
+        backend = ObjectStoreListingBackend("publish", endpoint = self.endpoint, page_size = 2)
+        vernist = FileVersionist("show/sh010/comp", "^comp_<version>\\.nk$", listing_backend = backend)
+        self.assertEqual(vernist.get_latest_name(), "comp_v010.nk")
+        self.assertEqual(vernist.get_latest_namePath(), "show/sh010/comp/comp_v010.nk")
+        self.assertEqual(vernist.get_next_version_name(), "v011")
+        self.assertEqual(self.bucket.prefixes, ["show/sh010/comp/comp_v"] * 3)
+        self.assertEqual(backend.request_count, 3)
+
+        vernist = FileVersionist("show/sh010/comp/", "^comp_<version>$", listing_backend = backend,
+                                 target_type = FileVersionist.kTargetDir)
+        self.assertEqual(vernist.get_latest_name(), "comp_v011")
+
+        vernist = FileVersionist("show/sh010/comp", "^.*_<version>\\..*$", listing_backend = backend,
+                                 target_type = FileVersionist.kTargetBoth)
+        self.assertEqual(vernist.get_latest_name(), "plate_v020.nk")
+        self.assertEqual(self.bucket.prefixes[-1], "show/sh010/comp/")
+
+        vernist = FileVersionist("show/missing", "^comp_<version>\\.nk$", listing_backend = backend)
+        self.assertEqual(vernist.get_latest_name(), None)
+
+    def test_lazy_pages(self):
+        backend = ObjectStoreListingBackend("publish", endpoint = self.endpoint, page_size = 1)
+        names = backend.iter_names("show/sh010/comp", FileVersionist.kTargetFile, prefix = "comp_")
+        self.assertEqual(backend.request_count, 0)
+        self.assertEqual(next(names), "comp_v001.nk")
+        self.assertEqual(backend.request_count, 1)
+        self.assertEqual(list(names), ["comp_v002.nk", "comp_v010.nk"])
+
+    def test_client(self):
+        backend = ObjectStoreListingBackend("publish", client = self.bucket, page_size = 2)
+        vernist = FileVersionist("show/sh010/comp", "^comp_<version>\\.nk$", listing_backend = backend,
+                                 streaming = True)
+        self.assertEqual(vernist.get_latest_name(), "comp_v010.nk")
+        self.assertEqual([ver_obj.name for ver_obj in vernist.get_history()],
+                         ["comp_v001.nk", "comp_v002.nk", "comp_v010.nk"])
+        self.assertEqual(set(self.bucket.prefixes), set(["show/sh010/comp/comp_v"]))
+
+    def test_local_features(self):
+        backend = ObjectStoreListingBackend("publish", client = self.bucket)
+        FileVersionist.enable_listing_cache()
+        try:
+            vernist = FileVersionist("show/sh010/comp", "^comp_<version>\\.nk$", listing_backend = backend)
+            self.assertEqual(vernist.get_latest_name(), "comp_v010.nk")
+            self.assertEqual(FileVersionist.listing_cache_info().currsize, 0)
+        finally:
+            FileVersionist.disable_listing_cache()
+
+        self.assertRaises(RuntimeError, vernist.reserve_next_version)
+        self.assertRaises(ValueError, ObjectStoreListingBackend, "publish")
+
+    def test_local_backend(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for name in ["comp_v001.nk", "comp_v003.nk", "notes.txt"]:
+                open(os.path.join(temp_dir, name), "w").close()
+            os.mkdir(os.path.join(temp_dir, "comp_v002"))
+
+            backend = LocalListingBackend()
+            self.assertEqual(sorted(backend.iter_names(temp_dir, FileVersionist.kTargetFile)),
+                             ["comp_v001.nk", "comp_v003.nk", "notes.txt"])
+            self.assertEqual(list(backend.iter_names(temp_dir, FileVersionist.kTargetDir)), ["comp_v002"])
+            self.assertEqual(list(backend.iter_names(os.path.join(temp_dir, "missing"), FileVersionist.kTargetBoth)), [])
+
+            vernist = FileVersionist(temp_dir, "^comp_<version>\\.nk$", listing_backend = backend)
+            self.assertEqual(vernist.get_latest_name(), "comp_v003.nk")
+
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_abstract_backend(self):
+        class NamesBackend(ListingBackend):
+            def iter_names(self, directory, target_type, accept = None, prefix = ""):
+                return iter(["comp_v004.nk", "comp_v002.nk"])
+
+        self.assertRaises(TypeError, ListingBackend)
+        self.assertRaises(TypeError, type("EmptyBackend", (ListingBackend,), {}))
+        vernist = FileVersionist("/show/sh010/comp", "^comp_<version>\\.nk$", listing_backend = NamesBackend())
+        self.assertEqual(vernist.get_latest_name(), "comp_v004.nk")
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_async_listing_per_backend(self):
+        temp_dir = tempfile.mkdtemp()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            open(os.path.join(temp_dir, "dog_v009.ma"), "w").close()
+            backend = ObjectStoreListingBackend("publish", client = FakeBucket([temp_dir.strip("/") + "/dog_v777.ma"]))
+            local = FileVersionist(temp_dir, "^dog_<version>\\.ma$")
+            remote = FileVersionist(temp_dir, "^dog_<version>\\.ma$", listing_backend = backend)
+
+            gathered = asyncio.gather(local.get_latest_name_async(), remote.get_latest_name_async())
+            self.assertEqual(loop.run_until_complete(gathered), ["dog_v009.ma", "dog_v777.ma"])
+
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
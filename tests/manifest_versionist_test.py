@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from versionist import ManifestVersionist, Versionist
+
+
+class TestManifestVersionist(unittest.TestCase):
+
+    TEST_LINES = [u"/show/sq01/sh010/comp_v003.nk",
+                  u"/show/sq01/sh010/comp_v012.nk",
+                  u"/show/sq01/sh020/comp_v012.nk",
+                  u"/show/sq01/sh020/comp_v007.nk.bak",
+                  u"/show/sq01/sh030/anim_v020.ma",
+                  u"/show/sq01/sh030/comp_v009.nk"]
+
+    def setUp(self):
+        Versionist.set_version_key("version")
+        self.temp_dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+    def write_manifest(self, lines, trailing = True):
+        path = os.path.join(self.temp_dir, "manifest.txt")
+        with io.open(path, "w", encoding = "utf-8", newline = "") as manifest:
+            manifest.write(u"\n".join(lines) + (u"\n" if trailing else u""))
+        return path
+
+
+    def assertSameAsList(self, lines, name_pattern, **kwargs):
+        names = [line.encode("utf-8") if bytes is str else line for line in lines]
+        expected = Versionist(names, name_pattern, **kwargs)
+        vernist = ManifestVersionist(self.write_manifest(lines), name_pattern, **kwargs)
+        self.assertEqual(vernist.get_latest_name(), expected.get_latest_name())
+        self.assertEqual(vernist.get_latest_version_num(), expected.get_latest_version_num())
+        return vernist
+
+
+    def test_latest(self):
+        vernist = self.assertSameAsList(self.TEST_LINES, "comp_<version>\\.nk$", match_type = "search")
+        self.assertEqual(vernist.get_latest_name(), "/show/sq01/sh010/comp_v012.nk")
+        self.assertEqual(vernist.get_next_version_name(), "v013")
+
+
+    def test_match_type(self):
+        self.assertSameAsList(self.TEST_LINES, "/show/sq01/sh020/comp_<version>")
+        self.assertSameAsList(self.TEST_LINES, "comp_<version>")
+
+
+    def test_non_ascii_lines(self):
+        lines = self.TEST_LINES + [u"/show/sq01/sh040/comp_v099_é.nk", u"/show/sq01/sh040/comp_v0١٣.nk"]
+        vernist = self.assertSameAsList(lines, "comp_(?P<version>v\\d+)", match_type = "search")
+        self.assertEqual(vernist.get_latest_version_num(), 99)
+
+
+    def test_line_by_line_patterns(self):
+        self.assertSameAsList(self.TEST_LINES, "comp_<version>(?=\\.nk$)", match_type = "search")
+        self.assertSameAsList(self.TEST_LINES, "sh0\\d0\\s*/comp_<version>", match_type = "search")
+        self.assertSameAsList(self.TEST_LINES, "(?s).*_<version>\\.ma")
+
+
+    def test_history(self):
+        vernist = ManifestVersionist(self.write_manifest(self.TEST_LINES, trailing = False),
+                                     "comp_<version>\\.nk$", match_type = "search")
+        self.assertEqual([ver_obj.versionNum for ver_obj in vernist.get_history()], [3, 9, 12, 12])
+        self.assertEqual(vernist.get_latest_name(), "/show/sq01/sh010/comp_v012.nk")
+
+
+    def test_parallel_scan(self):
+        lines = self.TEST_LINES * 50 + [u"/show/sq02/sh010/comp_v012.nk"]
+        vernist = ManifestVersionist(self.write_manifest(lines), "comp_<version>\\.nk$", match_type = "search")
+        vernist.set_parallel(3, threshold = 0)
+        self.assertEqual(vernist.get_latest_name(), "/show/sq01/sh010/comp_v012.nk")
+        vernist.set_name_pattern("comp_<version>(?=\\.nk$)")
+        self.assertEqual(vernist.get_latest_name(), "/show/sq01/sh010/comp_v012.nk")
+
+
+    def test_empty_and_missing(self):
+        vernist = ManifestVersionist(self.write_manifest([], trailing = False), "comp_<version>")
+        self.assertIsNone(vernist.get_latest_name())
+        self.assertEqual(vernist.get_next_version_num(), 1)
+        vernist.set_manifest(os.path.join(self.temp_dir, "no_such_manifest.txt"))
+        self.assertRaises(IOError, vernist.get_latest_name)
+        self.assertRaises(RuntimeError, ManifestVersionist().get_latest_name)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
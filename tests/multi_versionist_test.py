@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from versionist import MultiVersionist, Versionist
+
+class TestMultiVersionist(unittest.TestCase):
+
+    TEST_NAME_LIST1 = ["charA_v001.ma", "charA_v003.ma", "charA_v002.abc",
+                       "charA_v004.usd", "charA_v005.usd", "charB_v009.ma",
+                       "charA_v007.ma\n", "notes.txt"]
+
+    def setUp(self):
+        Versionist.set_version_key("version")
+
+
+    def tearDown(self):
+        Versionist.set_version_key("version")
+
+
+    def test_latest_of_every_pattern(self):
+        patterns = {"ma": "^charA_<version>\.ma$",
+                    "abc": "^charA_<version>\.abc$",
+                    "usd": "^charA_<version>\.usd$",
+                    "vdb": "^charA_<version>\.vdb$"}
+        multi = MultiVersionist(self.TEST_NAME_LIST1, patterns)
+        latest = multi.get_latest_versions()
+        self.assertEqual(latest["ma"].name, "charA_v007.ma\n")
+        self.assertEqual(latest["abc"].versionName, "v002")
+        self.assertEqual(latest["usd"].versionNum, 5)
+        self.assertIsNone(latest["vdb"].name)
+
+
+    def test_same_as_versionist(self):
+        patterns = {"any": "<version>",
+                    "ma": "_<version>\.ma\Z",
+                    "char": "^char(?P<letter>\w)_<version>",
+                    "alt": "^(?:charA|charB)_<version>\.ma$"}
+        for match_type in (Versionist.kMatchType, Versionist.kSearchType):
+            multi = MultiVersionist(self.TEST_NAME_LIST1, patterns, match_type = match_type)
+            for key, pat in patterns.items():
+                vernist = Versionist(self.TEST_NAME_LIST1, pat, match_type = match_type)
+                self.assertEqual(multi.get_latest_version(key).name, vernist.get_latest_name())
+
+
+
+if __name__ == "__main__":
+    unittest.main()
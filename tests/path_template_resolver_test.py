@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from versionist import FileVersionist, PathTemplateResolver, Versionist
+
+
+class TestPathTemplateResolver(unittest.TestCase):
+
+    TEST_FILES = ["sq01/sh010/publish/v001/cache_v001.abc",
+                  "sq01/sh010/publish/v002/cache_v001.abc",
+                  "sq01/sh010/publish/v002/cache_v003.abc",
+                  "sq01/sh010/publish/v002/notes.txt",
+                  "sq01/sh020/publish/v004/cache_v001.abc",
+                  "sq01/sh020/work/v009/cache_v009.abc",
+                  "sq02/sh030/publish/v001/cache_v002.abc"]
+
+    def setUp(self):
+        Versionist.set_version_key("version")
+        self.temp_dir = tempfile.mkdtemp()
+        for path in self.TEST_FILES:
+            path = os.path.join(self.temp_dir, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, "w").close()
+
+        os.makedirs(os.path.join(self.temp_dir, "sq01/sh010/publish/v003"))
+        self.template = self.temp_dir + "/<seq>/<shot>/publish/<version>/cache_<version>.abc"
+
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+    def relative_paths(self, results):
+        return [os.path.relpath(result.path, self.temp_dir).replace(os.sep, "/") for result in results]
+
+
+    def test_latest_at_every_level(self):
+        resolver = PathTemplateResolver(self.template, target_type = FileVersionist.kTargetFile)
+        results = resolver.resolve()
+        self.assertEqual(self.relative_paths(results), ["sq01/sh020/publish/v004/cache_v001.abc",
+                                                        "sq02/sh030/publish/v001/cache_v002.abc"])
+        self.assertEqual(results[0].fields, {"seq": "sq01", "shot": "sh020"})
+        self.assertEqual([ver_obj.versionNum for ver_obj in results[0].versions], [4, 1])
+        ## root, 2 sequences, 3 shots, 3 latest publishes
+        self.assertEqual(resolver.listing_count, 9)
+
+
+    def test_fallback(self):
+        resolver = PathTemplateResolver(self.template)
+        results = resolver.resolve(fallback = True)
+        self.assertEqual(self.relative_paths(results), ["sq01/sh010/publish/v002/cache_v003.abc",
+                                                        "sq01/sh020/publish/v004/cache_v001.abc",
+                                                        "sq02/sh030/publish/v001/cache_v002.abc"])
+        self.assertEqual(resolver.listing_count, 10)
+
+
+    def test_plain_levels_do_not_use_pattern_cache(self):
+        Versionist.clear_pattern_cache()
+        PathTemplateResolver(self.template).resolve()
+        ## only the versioned levels: publish and cache
+        self.assertEqual(Versionist.pattern_cache_info().currsize, 2)
+
+
+    def test_fixed_fields_are_not_listed(self):
+        resolver = PathTemplateResolver(self.template)
+        results = resolver.resolve({"seq": "sq01", "shot": "sh020"})
+        self.assertEqual(self.relative_paths(results), ["sq01/sh020/publish/v004/cache_v001.abc"])
+        self.assertEqual(resolver.listing_count, 2)
+
+        self.assertEqual(resolver.resolve({"seq": "sq09"}), [])
+        self.assertEqual(resolver.listing_count, 1)
+
+
+    def test_fields_in_versioned_level(self):
+        resolver = PathTemplateResolver(self.temp_dir + "/sq01/<shot>/<dept>/<version>",
+                                        target_type = FileVersionist.kTargetDir,
+                                        field_patterns = {"dept": "publish|work"})
+        results = resolver.resolve()
+        self.assertEqual(self.relative_paths(results), ["sq01/sh010/publish/v003",
+                                                        "sq01/sh020/publish/v004",
+                                                        "sq01/sh020/work/v009"])
+
+
+
+if __name__ == "__main__":
+    unittest.main()
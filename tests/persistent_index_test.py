@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from versionist import FileVersionist, PersistentIndex, Versionist
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+class CountingFileVersionist(FileVersionist):
+
+    listing_count = 0
+    index_threads = []
+
+    def _indexed_history(self):
+        CountingFileVersionist.index_threads.append(threading.current_thread())
+        return super(CountingFileVersionist, self)._indexed_history()
+
+    def _iter_directory(self, directory, accept = None):
+        CountingFileVersionist.listing_count += 1
+        return super(CountingFileVersionist, self)._iter_directory(directory, accept)
+
+
+class TestPersistentIndex(unittest.TestCase):
+
+    def setUp(self):
+        Versionist.set_version_key("version")
+        CountingFileVersionist.listing_count = 0
+        CountingFileVersionist.index_threads = []
+        self.temp_dir = tempfile.mkdtemp()
+        self.shot_dir = os.path.join(self.temp_dir, "shot")
+        os.mkdir(self.shot_dir)
+        for name in ["comp_v001.nk", "comp_v004.nk", "comp_v002.nk", "notes.txt"]:
+            open(os.path.join(self.shot_dir, name), "w").close()
+        self.age_directory(60)
+        self.index = PersistentIndex(os.path.join(self.temp_dir, "index.db"))
+
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.temp_dir)
+
+
+    def age_directory(self, seconds):
+        stamp = time.time() - seconds
+        os.utime(self.shot_dir, (stamp, stamp))
+
+
+    def create_versionist(self):
+        return CountingFileVersionist(self.shot_dir, "^comp_<version>.nk$", persistent_index = self.index)
+
+
+    def test_cold_start_reads_index(self):
+        vernist = self.create_versionist()
+        self.assertEqual(CountingFileVersionist.listing_count, 0)
+        self.assertEqual(vernist.get_latest_name(), "comp_v004.nk")
+        self.assertEqual(CountingFileVersionist.listing_count, 1)
+
+        vernist = self.create_versionist()
+        self.assertEqual(vernist.get_latest_namePath(), os.path.join(self.shot_dir, "comp_v004.nk"))
+        self.assertEqual([ver_obj.versionNum for ver_obj in vernist.get_history()], [1, 2, 4])
+        self.assertEqual(CountingFileVersionist.listing_count, 1)
+
+
+    def test_changed_directory_is_rescanned(self):
+        self.assertEqual(self.create_versionist().get_latest_version_num(), 4)
+
+        open(os.path.join(self.shot_dir, "comp_v007.nk"), "w").close()
+        self.age_directory(30)
+        self.assertEqual(self.create_versionist().get_latest_version_num(), 7)
+        self.assertEqual(CountingFileVersionist.listing_count, 2)
+
+
+    def test_recent_directory_is_not_stored(self):
+        self.age_directory(0)
+        self.assertEqual(self.create_versionist().get_latest_version_num(), 4)
+        self.assertEqual(self.create_versionist().get_latest_version_num(), 4)
+        self.assertEqual(CountingFileVersionist.listing_count, 2)
+
+
+    def test_signature_separates_records(self):
+        self.assertEqual(self.create_versionist().get_latest_version_num(), 4)
+        vernist = CountingFileVersionist(self.shot_dir, "^comp_<version>.nk$", initial_number = 0,
+                                         persistent_index = self.index)
+        self.assertEqual(vernist.get_next_version_num(), 5)
+        self.assertEqual(CountingFileVersionist.listing_count, 2)
+
+
+    def test_shared_between_instances(self):
+        self.assertEqual(self.create_versionist().get_latest_version_num(), 4)
+        other = PersistentIndex(self.index._path)
+        try:
+            vernist = CountingFileVersionist(self.shot_dir, "^comp_<version>.nk$", persistent_index = other)
+            self.assertEqual(vernist.get_latest_version_num(), 4)
+            self.assertEqual(CountingFileVersionist.listing_count, 1)
+
+            other.clear()
+            self.assertEqual(self.create_versionist().get_latest_version_num(), 4)
+            self.assertEqual(CountingFileVersionist.listing_count, 2)
+
+        finally:
+            other.close()
+
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_async_lookup(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            vernist = self.create_versionist()
+            self.assertEqual(loop.run_until_complete(vernist.get_latest_name_async()), "comp_v004.nk")
+            vernist = self.create_versionist()
+            self.assertEqual(loop.run_until_complete(vernist.get_next_version_num_async()), 5)
+
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        self.assertEqual(CountingFileVersionist.listing_count, 1)
+        self.assertEqual(len(CountingFileVersionist.index_threads), 2)
+        self.assertNotIn(threading.current_thread(), CountingFileVersionist.index_threads)
+
+
+    def test_missing_directory(self):
+        shutil.rmtree(self.shot_dir)
+        vernist = self.create_versionist()
+        self.assertIsNone(vernist.get_latest_name())
+        self.assertEqual(vernist.get_next_version_num(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
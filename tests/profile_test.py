@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from versionist import FileVersionist, Profile, Versionist
+
+
+class TestProfile(unittest.TestCase):
+
+    def setUp(self):
+        Versionist.set_version_key("version")
+        self.temp_dir = tempfile.mkdtemp()
+        for name in ["dog_v001.ma", "dog_v002.ma", "notes.txt"]:
+            open(os.path.join(self.temp_dir, name), "w").close()
+        os.mkdir(os.path.join(self.temp_dir, "dog_v003.ma"))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_scan_counters(self):
+        targets = ["dog_v001", "dog_v002", "cat_v003", "dog_v004"]
+        with Versionist.profile() as profile:
+            vernist = Versionist(targets, "^dog_<version>$")
+            self.assertEqual(vernist.get_latest_name(), "dog_v004")
+            self.assertEqual(vernist.get_latest_version_name(), "v004")
+
+        self.assertIsInstance(profile, Profile)
+        self.assertEqual(profile.counters["scan"], 1)
+        self.assertEqual(profile.counters["targets"], 4)
+        self.assertEqual(profile.counters["matches"], 3)
+        self.assertLessEqual(profile.counters["regex"], 4)
+        self.assertEqual(profile.counters["latest_cache_hit"], 1)
+        self.assertIn("scan", profile.timers)
+
+        with Versionist.profile() as profile:
+            Versionist(targets, "^dog_<version>$").get_latest_name()
+        self.assertEqual(profile.counters["pattern_compile"], 0)
+        self.assertEqual(profile.counters["pattern_cache_hit"], 1)
+
+    def test_listing_counters(self):
+        with Versionist.profile() as profile:
+            vernist = FileVersionist(self.temp_dir, "^dog_<version>\\.ma$",
+                                     target_type = FileVersionist.kTargetFile)
+            self.assertEqual(vernist.get_latest_name(), "dog_v002.ma")
+
+        self.assertEqual(profile.counters["listing"], 1)
+        self.assertEqual(profile.counters["listing_entries"], 4)
+        self.assertEqual(profile.counters["type_check"], 3)
+        self.assertEqual(profile.counters["targets"], 2)
+        self.assertIn("listing", profile.timers)
+
+    def test_hooks(self):
+        events = []
+
+        def hook(event, count, seconds):
+            events.append(event)
+
+        Versionist.add_hook(hook)
+        try:
+            Versionist(["dog_v001"], "^dog_<version>$").get_latest_name()
+        finally:
+            Versionist.remove_hook(hook)
+
+        self.assertIn("scan", events)
+        del events[:]
+        Versionist(["dog_v001"], "^dog_<version>$").get_latest_name()
+        self.assertEqual(events, [])
+
+    def test_other_threads(self):
+        def work():
+            Versionist(["dog_v001"], "^dog_<version>$").get_latest_name()
+
+        with Versionist.profile() as profile:
+            thread = threading.Thread(target = work)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(profile.counters["scan"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from versionist import Versionist, VersionHistory, VersionObj, VersionTable
+
+class TestVersionHistory(unittest.TestCase):
+
+    TEST_NAME_LIST1 = ["dog_v010", "dog_v003", "dog_v007", "dog_v001",
+                       "dog_v020", "dog_v015", "cat_v002", "dog_v012"]
+
+    def setUp(self):
+        Versionist.set_version_key("version")
+
+
+    def tearDown(self):
+        Versionist.set_version_key("version")
+
+
+    def get_history(self):
+        vernist = Versionist(self.TEST_NAME_LIST1, "^dog_<version>$")
+        return vernist.get_history()
+
+
+    def test_sorted(self):
+        history = self.get_history()
+        self.assertEqual([ver_obj.versionNum for ver_obj in history], [1, 3, 7, 10, 12, 15, 20])
+        self.assertEqual(history.latest().name, "dog_v020")
+
+
+    def test_previous_and_next(self):
+        history = self.get_history()
+        self.assertEqual(history.previous("v007").versionName, "v003")
+        self.assertEqual(history.previous(8).versionName, "v007")
+        self.assertIsNone(history.previous(1))
+        self.assertEqual(history.next(10).versionName, "v012")
+        self.assertIsNone(history.next("v020"))
+
+
+    def test_range_and_membership(self):
+        history = self.get_history()
+        names = [ver_obj.versionName for ver_obj in history.between("v010", "v020")]
+        self.assertEqual(names, ["v010", "v012", "v015", "v020"])
+        self.assertIn("v007", history)
+        self.assertNotIn(8, history)
+        self.assertEqual([ver_obj.versionNum for ver_obj in history.latest_n(2)], [20, 15])
+
+
+    def test_insert_and_remove(self):
+        history = self.get_history()
+        ver_obj = VersionObj(verNum = 11, verName = "v011", name = "dog_v011")
+        history.insert(ver_obj)
+        self.assertEqual(history.next(10).versionName, "v011")
+        self.assertTrue(history.remove(ver_obj))
+        self.assertEqual(history.next(10).versionName, "v012")
+
+
+    def test_empty(self):
+        history = VersionHistory()
+        self.assertIsNone(history.latest().name)
+        self.assertEqual(history.latest_n(3), [])
+        self.assertIsNone(history.previous(1))
+
+
+
+
+class TestVersionTable(unittest.TestCase):
+
+
+    def test_columnar_storage(self):
+        ver_objs = [VersionObj(verNum = num % 3, verName = "v%03d" % (num % 3), name = "asset%d_v%03d" % (num, num % 3))
+                    for num in range(30)]
+        table = VersionTable(ver_objs)
+        self.assertEqual(len(table), 30)
+        self.assertEqual(list(table), ver_objs)
+        self.assertEqual(table[4], ver_objs[4])
+        self.assertEqual(table[-2:], ver_objs[-2:])
+        self.assertEqual(len(table._strings), 3)
+        del table[0]
+        self.assertEqual(table[0], ver_objs[1])
+
+
+    def test_empty_version(self):
+        table = VersionTable()
+        table.append(VersionObj(verNum = 1, verName = None, name = "dog"))
+        self.assertIsNone(table[0].versionName)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
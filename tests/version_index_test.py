@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from versionist import VersionIndex, Versionist
+
+class TestVersionIndex(unittest.TestCase):
+
+    TEST_NAME_LIST1 = ["dog_v001.ma", "dog_v003.ma", "dog_v002.ma",
+                       "cat_v005.ma", "cat_v001.ma",
+                       "rat_v001.abc", "pig_notes.txt",
+                       "cat_v005.ma"]
+
+    def setUp(self):
+        Versionist.set_version_key("version")
+
+
+    def tearDown(self):
+        Versionist.set_version_key("version")
+
+
+    def test_latest_of_every_group(self):
+        pat = "^(?P<asset>\w+)_<version>\.ma$"
+        index = VersionIndex(self.TEST_NAME_LIST1, pat)
+        self.assertEqual(sorted(index.keys()), ["cat", "dog"])
+        self.assertEqual(index.get_latest_name("dog"), "dog_v003.ma")
+        self.assertEqual(index.get_latest_version_num("cat"), 5)
+        self.assertEqual(index.get_next_version_name("cat"), "v006")
+
+
+    def test_versions_are_sorted(self):
+        pat = "^(?P<asset>\w+)_<version>\.ma$"
+        index = VersionIndex(self.TEST_NAME_LIST1, pat)
+        versions = [ver_obj.versionNum for ver_obj in index.get_versions("dog")]
+        self.assertEqual(versions, [1, 2, 3])
+
+
+    def test_missing_group(self):
+        pat = "^(?P<asset>\w+)_<version>\.ma$"
+        index = VersionIndex(self.TEST_NAME_LIST1, pat)
+        self.assertNotIn("rabbit", index)
+        self.assertIsNone(index.get_latest_name("rabbit"))
+        self.assertEqual(index.get_next_version_name("rabbit"), "v001")
+        self.assertEqual(index.get_versions("rabbit"), [])
+
+
+    def test_tuple_key(self):
+        pat = "^(?P<asset>\w+?)_<version>\.(?P<ext>\w+)$"
+        index = VersionIndex(self.TEST_NAME_LIST1, pat)
+        self.assertEqual(index.get_latest_name(("rat", "abc")), "rat_v001.abc")
+        self.assertEqual(index.get_latest_version_name(("dog", "ma")), "v003")
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from versionist import FileVersionist, PersistentIndex, VersionHistory, VersionObj, VersionScheme, Versionist
+
+
+class TestVersionScheme(unittest.TestCase):
+
+    SEMVER = "v<major:int>.<minor:int>.<patch:int>"
+
+    def setUp(self):
+        Versionist.set_version_key("version")
+
+    def test_semver(self):
+        targets = ["lib_v2.10.3.so", "lib_v2.9.12.so", "lib_v10.0.0.so", "lib_v2.10.30.so", "lib.so"]
+        vernist = Versionist(targets, "^lib_<version>\\.so$", version_scheme = self.SEMVER)
+        self.assertEqual(vernist.get_latest_name(), "lib_v10.0.0.so")
+        self.assertEqual(vernist.get_latest_version_name(), "v10.0.0")
+        self.assertEqual(vernist.get_latest_version_num(), (10, 0, 0))
+        self.assertEqual(vernist.get_next_version_name(), "v10.0.1")
+        self.assertEqual(vernist.get_next_version_name("minor"), "v10.1.0")
+        self.assertEqual(vernist.get_next_version_num("major"), (11, 0, 0))
+        self.assertRaises(ValueError, vernist.get_next_version_name, "build")
+
+        history = vernist.get_history()
+        self.assertEqual([ver_obj.versionName for ver_obj in history], ["v2.9.12", "v2.10.3", "v2.10.30", "v10.0.0"])
+        self.assertEqual(history.get("v2.10.3").name, "lib_v2.10.3.so")
+        self.assertEqual(history.previous((10, 0, 0)).name, "lib_v2.10.30.so")
+        self.assertEqual([ver_obj.name for ver_obj in history.between("v2.10.0", "v2.10.99")],
+                         ["lib_v2.10.3.so", "lib_v2.10.30.so"])
+
+    def test_fixed_width(self):
+        targets = ["plate_v012_r04.exr", "plate_v012_r10.exr", "plate_v011_r99.exr", "plate_v12_r11.exr"]
+        vernist = Versionist(targets, "^plate_<version>\\.exr$",
+                             version_scheme = VersionScheme("v<main:int:3>_r<rev:int:2:1>"))
+        self.assertEqual(vernist.get_latest_name(), "plate_v012_r10.exr")
+        self.assertEqual(vernist.get_latest_version_num(), (12, 10))
+        self.assertEqual(vernist.get_next_version_name(), "v012_r11")
+        self.assertEqual(vernist.get_next_version_name("main"), "v013_r01")
+        self.assertEqual(len(vernist.get_history()), 3)
+
+        vernist.set_targets([])
+        self.assertEqual(vernist.get_latest_name(), None)
+        self.assertEqual(vernist.get_next_version_name(), "v000_r01")
+
+        vernist.set_version_scheme(None)
+        vernist.set_targets(["plate_v003.exr"])
+        self.assertEqual(vernist.get_next_version_name(), "v004")
+        self.assertRaises(ValueError, vernist.get_next_version_name, "main")
+
+    def test_date(self):
+        scheme = "<date:date:%Y%m%d>_v<take:int:2:1>"
+        targets = ["20261017_v03.mov", "20261016_v09.mov", "20261399_v01.mov", "20261017_v01.mov"]
+        vernist = Versionist(targets, "^<version>\\.mov$", version_scheme = scheme)
+        self.assertEqual(vernist.get_latest_name(), "20261017_v03.mov")
+        self.assertEqual(vernist.get_next_version_name(), "20261017_v04")
+        self.assertEqual([ver_obj.name for ver_obj in vernist.get_history()],
+                         ["20261016_v09.mov", "20261017_v01.mov", "20261017_v03.mov"])
+
+        today = datetime.date.today().strftime("%Y%m%d")
+        vernist.set_targets(["20000101_v05.mov"])
+        self.assertEqual(vernist.get_next_version_name("date"), today + "_v01")
+        vernist.set_targets([])
+        self.assertEqual(vernist.get_next_version_name(), today + "_v01")
+        vernist.set_targets([today + "_v02.mov"])
+        self.assertRaises(ValueError, vernist.get_next_version_name, "date")
+
+    def test_text(self):
+        targets = ["asset_alpha_v2.usd", "asset_beta_v1.usd", "asset_alpha_v10.usd"]
+        vernist = Versionist(targets, "^asset_<version>\\.usd$", version_scheme = "<stage:text>_v<num:int>")
+        self.assertEqual(vernist.get_latest_name(), "asset_beta_v1.usd")
+        self.assertEqual(vernist.get_next_version_name(), "beta_v2")
+        self.assertRaises(ValueError, vernist.get_next_version_name, "stage")
+
+    def test_scheme(self):
+        scheme = VersionScheme(self.SEMVER)
+        self.assertEqual(scheme.field_names, ("major", "minor", "patch"))
+        self.assertEqual(scheme.parse("v1.20.3"), (1, 20, 3))
+        self.assertEqual(scheme.format((1, 20, 3)), "v1.20.3")
+        self.assertEqual(scheme.bump((1, 20, 3), "minor", steps = 2), (1, 22, 0))
+        self.assertRaises(ValueError, scheme.parse, "v1.20")
+        self.assertFalse(scheme.lexical)
+        self.assertTrue(VersionScheme("v<main:int:3>_r<rev:int:2>").lexical)
+        self.assertEqual(scheme, VersionScheme(self.SEMVER))
+        self.assertRaises(ValueError, VersionScheme, "v001")
+        self.assertRaises(ValueError, VersionScheme, "<a:int>.<a:int>")
+        self.assertRaises(ValueError, VersionScheme, "<a:date:%Y%B>")
+
+        history = VersionHistory([VersionObj(verNum=(1, 2, 0), verName="v1.2.0", name="a")], version_scheme = scheme)
+        history.insert(VersionObj(verNum=(1, 10, 0), verName="v1.10.0", name="b"))
+        self.assertEqual(history.latest().name, "b")
+        self.assertTrue("v1.2.0" in history)
+
+        history = VersionHistory(version_scheme = scheme)
+        history.insert(VersionObj(verNum=(1, 2, 0), verName="v1.2.0", name="a"))
+        self.assertEqual(history.latest().name, "a")
+
+    def test_file_versionist(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for name in ["lib_v1.2.3.so", "lib_v1.10.0.so", "lib_v1.9.so"]:
+                open(os.path.join(temp_dir, name), "w").close()
+
+            vernist = FileVersionist(temp_dir, "^lib_<version>\\.so$", version_scheme = self.SEMVER)
+            self.assertEqual(vernist.get_latest_name(), "lib_v1.10.0.so")
+            self.assertEqual(vernist.reserve_next_versions(2),
+                             [os.path.join(temp_dir, "lib_v1.10.1.so"), os.path.join(temp_dir, "lib_v1.10.2.so")])
+
+            index = PersistentIndex(os.path.join(temp_dir, "index.db"))
+            try:
+                for _ in range(2):
+                    vernist = FileVersionist(temp_dir, "^lib_<version>\\.so$", version_scheme = self.SEMVER,
+                                             persistent_index = index)
+                    self.assertEqual([ver_obj.versionNum for ver_obj in vernist.get_history()],
+                                     [(1, 2, 3), (1, 10, 0), (1, 10, 1), (1, 10, 2)])
+            finally:
+                index.close()
+
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+import versionist
+from versionist import FileVersionist, Versionist, VersionClient, VersionQueryError, VersionServer
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix domain sockets are not supported")
+class TestVersionServer(unittest.TestCase):
+
+    def setUp(self):
+        Versionist.set_version_key("version")
+        self.temp_dir = tempfile.mkdtemp()
+        for name in ["comp_v001.nk", "comp_v007.nk", "notes.txt"]:
+            open(os.path.join(self.temp_dir, name), "w").close()
+
+        self.socket_path = os.path.join(self.temp_dir, "versionist.sock")
+        self.pattern = "^comp_<version>\\.nk$"
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.close()
+        FileVersionist.disable_listing_cache()
+        shutil.rmtree(self.temp_dir)
+
+    def start_server(self):
+        self.server = VersionServer(self.socket_path)
+        thread = threading.Thread(target = self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def test_queries(self):
+        self.start_server()
+        client = VersionClient(self.socket_path, fallback = False)
+        try:
+            self.assertEqual(client.get_latest_namePath(self.temp_dir, self.pattern),
+                             os.path.join(self.temp_dir, "comp_v007.nk"))
+            self.assertEqual(client.query(self.temp_dir, self.pattern, "next_version_name"), "v008")
+            self.assertEqual(client.query(self.temp_dir, self.pattern, "latest_version_num", padding = 3), 7)
+            self.assertRaises(VersionQueryError, client.query, self.temp_dir, self.pattern, "oldest")
+            self.assertRaises(VersionQueryError, client.query, self.temp_dir, self.pattern, color = "red")
+
+            queries = [{"id": index, "directory": self.temp_dir, "name_pattern": self.pattern}
+                       for index in range(VersionClient.kPipelineWindow * 3)]
+            responses = client.query_many(queries)
+            self.assertEqual([response["id"] for response in responses], list(range(len(queries))))
+            self.assertEqual(set(response["result"] for response in responses),
+                             set([os.path.join(self.temp_dir, "comp_v007.nk")]))
+
+            open(os.path.join(self.temp_dir, "comp_v009.nk"), "w").close()
+            FileVersionist.clear_listing_cache()
+            self.assertEqual(client.query(self.temp_dir, self.pattern, "latest_name"), "comp_v009.nk")
+
+        finally:
+            client.close()
+
+    def test_fallback(self):
+        client = VersionClient(self.socket_path)
+        self.assertEqual(client.query(self.temp_dir, self.pattern, "latest_name"), "comp_v007.nk")
+        self.assertRaises(socket.error, VersionClient(self.socket_path, fallback = False).query,
+                          self.temp_dir, self.pattern)
+
+        self.start_server()
+        client._retry_time = 0.0
+        self.assertEqual(client.query(self.temp_dir, self.pattern, "latest_name"), "comp_v007.nk")
+        self.assertIsNotNone(client._local.connection)
+        client.close()
+
+    def test_running_server(self):
+        self.start_server()
+        self.assertRaises(OSError, VersionServer, self.socket_path)
+
+    def test_socket_path_not_a_socket(self):
+        open(self.socket_path, "w").close()
+        self.assertRaises(OSError, VersionServer, self.socket_path)
+        self.assertTrue(os.path.isfile(self.socket_path))
+        self.assertEqual(VersionClient(self.socket_path).query(self.temp_dir, self.pattern, "latest_name"),
+                         "comp_v007.nk")
+
+    @unittest.skipUnless(hasattr(os, "getuid") and os.getuid() == 0, "changing the owner needs root")
+    def test_socket_of_another_user(self):
+        self.start_server()
+        os.chown(self.socket_path, 12345, -1)
+        self.assertRaises(OSError, VersionClient(self.socket_path, fallback = False).query,
+                          self.temp_dir, self.pattern)
+        self.assertRaises(OSError, VersionServer, self.socket_path)
+        os.chown(self.socket_path, os.getuid(), -1)
+
+    def test_default_socket_path(self):
+        environ = dict(os.environ)
+        os.environ.pop("VERSIONIST_SOCKET", None)
+        try:
+            os.environ["XDG_RUNTIME_DIR"] = self.temp_dir
+            self.assertEqual(versionist._default_socket_path(), os.path.join(self.temp_dir, "versionist.sock"))
+
+            os.environ.pop("XDG_RUNTIME_DIR")
+            path = versionist._default_socket_path()
+            mode = os.stat(os.path.dirname(path)).st_mode
+            self.assertEqual(mode & 0o777, 0o700)
+
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+    def test_batch(self):
+        lines = [json.dumps({"id": 1, "directory": self.temp_dir, "name_pattern": self.pattern}),
+                 "",
+                 "[1, 2]",
+                 json.dumps({"id": 2, "directory": self.temp_dir, "name_pattern": self.pattern,
+                             "query": "next_version_num"})]
+        stdin = io.BytesIO(("\n".join(lines) + "\n").encode("utf-8"))
+        stdout = io.BytesIO()
+        old_stdin, old_stdout = sys.stdin, sys.stdout
+        sys.stdin, sys.stdout = stdin, stdout
+        try:
+            self.assertEqual(versionist.main(["batch"]), 0)
+        finally:
+            sys.stdin, sys.stdout = old_stdin, old_stdout
+
+        responses = [json.loads(line) for line in stdout.getvalue().decode("utf-8").splitlines()]
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(responses[0], {"id": 1, "result": os.path.join(self.temp_dir, "comp_v007.nk")})
+        self.assertIn("error", responses[1])
+        self.assertEqual(responses[2], {"id": 2, "result": 8})
+
+
+if __name__ == "__main__":
+    unittest.main()
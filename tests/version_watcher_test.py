@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from versionist import FileVersionist, VersionWatcher
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+class TestVersionWatcher(unittest.TestCase):
+
+
+    def setUp(self):
+        FileVersionist.set_version_key("version")
+        self.directory = tempfile.mkdtemp()
+        self.touch("dog_v001.ma")
+
+
+    def tearDown(self):
+        FileVersionist.set_version_key("version")
+        shutil.rmtree(self.directory)
+
+
+    def touch(self, name):
+        open(os.path.join(self.directory, name), "w").close()
+
+
+    def wait_for(self, func, expected, timeout = 5.0):
+        end = time.time() + timeout
+        while time.time() < end:
+            if func() == expected:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(func(), expected)
+
+
+    def check_live_updates(self, watcher):
+        vernist = FileVersionist(self.directory, "^dog_<version>\.ma$")
+        vernist.watch(watcher)
+        try:
+            self.assertEqual(vernist.get_latest_version_name(), "v001")
+            self.touch("dog_v003.ma")
+            self.touch("cat_v009.ma")
+            self.wait_for(vernist.get_latest_version_name, "v003")
+            self.assertEqual(vernist.get_next_version_num(), 4)
+
+            os.remove(os.path.join(self.directory, "dog_v003.ma"))
+            self.wait_for(vernist.get_latest_version_name, "v001")
+
+        finally:
+            vernist.unwatch()
+
+
+    def test_unwatch_after_close(self):
+        watcher = VersionWatcher()
+        vernist = FileVersionist(self.directory, "^dog_<version>\.ma$")
+        vernist.watch(watcher)
+        watcher.close()
+        self.touch("dog_v002.ma")
+
+        vernist.unwatch()
+        self.assertEqual(vernist.get_latest_version_name(), "v002")
+        self.assertEqual(watcher._directories, {})
+
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def test_set_directory_async_moves_watch(self):
+        other = tempfile.mkdtemp()
+        watcher = VersionWatcher()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            open(os.path.join(other, "dog_v004.ma"), "w").close()
+            vernist = FileVersionist(self.directory, "^dog_<version>\.ma$")
+            vernist.watch(watcher)
+
+            loop.run_until_complete(vernist.set_directory_async(other))
+            self.assertEqual(vernist.get_latest_namePath(), os.path.join(other, "dog_v004.ma"))
+            self.assertEqual(list(watcher._directories), [os.path.abspath(other)])
+            path = loop.run_until_complete(vernist.get_latest_namePath_async())
+            self.assertEqual(path, os.path.join(other, "dog_v004.ma"))
+
+            vernist.unwatch()
+            self.assertEqual(watcher._directories, {})
+
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+            watcher.close()
+            shutil.rmtree(other)
+
+
+    def test_inotify_updates(self):
+        watcher = VersionWatcher()
+        try:
+            if not watcher.uses_inotify():
+                self.skipTest("inotify is not available")
+            self.check_live_updates(watcher)
+
+        finally:
+            watcher.close()
+
+
+    def test_polling_updates(self):
+        watcher = VersionWatcher(poll_interval = 0.02, use_inotify = False)
+        try:
+            self.assertFalse(watcher.uses_inotify())
+            self.check_live_updates(watcher)
+
+        finally:
+            watcher.close()
+
+
+    def test_directory_type_from_event(self):
+        watcher = VersionWatcher()
+        vernist = FileVersionist(self.directory, "^dog_<version>\.ma$")
+        vernist.watch(watcher)
+        try:
+            os.mkdir(os.path.join(self.directory, "dog_v005.ma"))
+            self.touch("dog_v002.ma")
+            self.wait_for(vernist.get_latest_version_name, "v002")
+
+        finally:
+            vernist.unwatch()
+            watcher.close()
+
+
+
+if __name__ == "__main__":
+    unittest.main()
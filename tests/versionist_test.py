@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 import os
+import pickle
 import re
 import unittest
 
-from versionist import Versionist, VersionKeyError
+from versionist import Versionist, VersionKeyError, VersionObj, _compile_name_pattern
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class TestVersioninst(unittest.TestCase):
 
@@ -151,6 +157,188 @@ class TestVersioninst(unittest.TestCase):
             latest_version_name = vernist.get_latest_version_name()
 
 
+    def test_scan_result_is_memoized(self):
+        pat = "^dog\_<version>$"
+        targets = list(self.TEST_NAME_LIST1)
+        vernist = Versionist(targets, pat)
+        self.assertEqual(vernist.get_latest_version_name(), "v003")
+        targets.append("dog_v010")
+        self.assertEqual(vernist.get_latest_version_name(), "v003")
+        vernist.refresh()
+        self.assertEqual(vernist.get_latest_version_name(), "v010")
+
+
+    def test_setter_invalidates_scan_result(self):
+        pat = "^dog\_<version>$"
+        targets = self.TEST_NAME_LIST1
+        vernist = Versionist(targets, pat)
+        self.assertEqual(vernist.get_latest_version_name(), "v003")
+        vernist.set_name_pattern("^cat\_<version>$")
+        self.assertEqual(vernist.get_latest_version_name(), "v008")
+        vernist.set_prefix("ver")
+        vernist.set_name_pattern("^dog\_<version>$")
+        self.assertEqual(vernist.get_latest_version_name(), "ver003")
+        Versionist.set_version_key("version_name")
+        with self.assertRaises(VersionKeyError):
+            vernist.get_latest_version_name()
+
+
+    def test_instance_version_key(self):
+        pat = "^dog\_<version_name>$"
+        targets = self.TEST_NAME_LIST1
+        vernist = Versionist(targets, pat, version_key = "version_name")
+        other = Versionist(targets, "^cat\_<version>$")
+        self.assertEqual(vernist.get_latest_version_name(), "v003")
+        self.assertEqual(other.get_latest_version_name(), "v008")
+        self.assertEqual(Versionist.VERSION_KEY, "version")
+
+
+    def test_instance_set_version_key(self):
+        pat = "^dog\_<ver>$"
+        targets = self.TEST_NAME_LIST1
+        vernist = Versionist(targets, pat)
+        vernist.set_version_key("ver")
+        self.assertEqual(vernist.get_latest_version_name(), "v003")
+        self.assertEqual(Versionist.VERSION_KEY, "version")
+        with self.assertRaises(ValueError):
+            vernist.set_version_key(1)
+
+
+    def test_pattern_cache_is_shared(self):
+        Versionist.clear_pattern_cache()
+        pat = "^dog\_<version>$"
+        Versionist(self.TEST_NAME_LIST1, pat).get_latest_version_name()
+        Versionist(self.TEST_NAME_LIST1, pat).get_latest_version_name()
+        info = Versionist.pattern_cache_info()
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.currsize, 1)
+
+
+    def test_pattern_cache_eviction(self):
+        Versionist.clear_pattern_cache()
+        Versionist.set_pattern_cache_size(2)
+        try:
+            for animal in ("dog", "cat", "rat"):
+                Versionist(self.TEST_NAME_LIST1, "^%s\_<version>$" % animal).get_latest_version_name()
+
+            info = Versionist.pattern_cache_info()
+            self.assertEqual(info.evictions, 1)
+            self.assertEqual(info.currsize, 2)
+
+        finally:
+            Versionist.set_pattern_cache_size(256)
+
+
+    def test_generator_targets(self):
+        pat = "^cat\_<version>$"
+        targets = (name for name in self.TEST_NAME_LIST1)
+        vernist = Versionist(targets, pat)
+        self.assertEqual(vernist.get_latest_version_name(), "v008")
+        self.assertEqual(vernist.get_next_version_name(), "v009")
+        vernist.set_prefix("ver")
+        with self.assertRaises(RuntimeError):
+            vernist.get_latest_version_name()
+
+
+    def test_directory_entry_targets(self):
+        class Entry(object):
+            def __init__(self, name):
+                self.name = name
+
+        pat = "^dog\_<version>$"
+        targets = iter([Entry(name) for name in self.TEST_NAME_LIST1])
+        vernist = Versionist(targets, pat)
+        self.assertEqual(vernist.get_latest_name(), "dog_v003")
+
+
+    def test_literal_requirements(self):
+        compiled = _compile_name_pattern("^charA_rig_<version>\\.ma$", "v", 3, "version", "match")
+        self.assertEqual(compiled.prefix, "charA_rig_v")
+        self.assertEqual(compiled.suffixes, (".ma", ".ma\n"))
+        compiled = _compile_name_pattern("rig_<version>_(\\w+)_cache", "v", 3, "version", "search")
+        self.assertEqual(compiled.prefix, "")
+        self.assertEqual(compiled.substrings, ("_cache", "rig_v"))
+        compiled = _compile_name_pattern("(?i)^dog_<version>$", "v", 3, "version", "match")
+        self.assertEqual((compiled.prefix, compiled.suffixes, compiled.substrings), ("", (), ()))
+
+
+    def test_prefilter_gives_same_matches(self):
+        targets = self.TEST_NAME_LIST1 + ["dog_v007\n", "dog_v008\n\n", "xdog_v009"]
+        for pat in ("^dog\_<version>$", "dog\_<version>", "^(?:dog|cat)\_<version>$", "\\Adog_<version>\\Z"):
+            for match_type in (Versionist.kMatchType, Versionist.kSearchType):
+                compiled = _compile_name_pattern(pat, "v", 3, "version", match_type)
+                if match_type == Versionist.kMatchType:
+                    expected = [name for name in targets if compiled.regex.match(name)]
+                else:
+                    expected = [name for name in targets if compiled.regex.search(name)]
+                self.assertEqual([name for name, _ in compiled.iter_matches(targets)], expected)
+
+
+    def test_parallel_scan(self):
+        targets = ["dog_v%03d" % (index % 17) for index in range(200)] + ["dog_v016_b", "cat_v099"]
+        targets[150] = "dog_v020"
+        targets[40] = "xdog_v020"
+        serial = Versionist(targets, "dog_<version>", match_type = Versionist.kSearchType)
+        vernist = Versionist(targets, "dog_<version>", match_type = Versionist.kSearchType)
+        vernist.set_parallel(3, threshold = 10)
+        self.assertEqual(vernist.get_latest_name(), "xdog_v020")
+        self.assertEqual(vernist.get_latest_name(), serial.get_latest_name())
+        self.assertEqual(list(vernist.get_history()), list(serial.get_history()))
+
+        vernist = Versionist(targets, "^cow_<version>$", initial_number = 0)
+        vernist.set_parallel(3, threshold = 10)
+        self.assertIsNone(vernist.get_latest_name())
+        self.assertEqual(vernist.get_next_version_num(), 0)
+
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy_backend(self):
+        targets = self.TEST_NAME_LIST1 + ["dog_v012\n", "dog_v012", "dog_v1x2", "dog_v012.ma"]
+        for pat in ("^dog\_<version>$", "dog_<version>", "^(?:dog|cat)\_<version>$", "dog_<version>\\Z"):
+            expected = Versionist(targets, pat)
+            vernist = Versionist(targets, pat)
+            vernist.set_backend(Versionist.kBackendNumpy)
+            self.assertEqual(vernist.get_latest_name(), expected.get_latest_name())
+            self.assertEqual(list(vernist.get_history()), list(expected.get_history()))
+
+        vernist = Versionist(targets, "^dog_<version>$")
+        vernist.set_backend(Versionist.kBackendNumpy)
+        self.assertIsNotNone(vernist._vector_scan(targets))
+        self.assertEqual(vernist.get_latest_name(), "dog_v012\n")
+        self.assertRaises(ValueError, vernist.set_backend, "fortran")
+
+
+
+
+class TestVersionObj(unittest.TestCase):
+
+
+    def test_immutable(self):
+        ver_obj = VersionObj(verNum = 3, verName = "v003", name = "dog_v003")
+        with self.assertRaises(AttributeError):
+            ver_obj._versionNum = 4
+        with self.assertRaises(AttributeError):
+            ver_obj.extra = 1
+        self.assertEqual(ver_obj.versionNum, 3)
+
+
+    def test_hash_and_order(self):
+        ver_objs = [VersionObj(verNum = 3, verName = "v003", name = "dog_v003"),
+                    VersionObj(),
+                    VersionObj(verNum = 1, verName = "v001", name = "dog_v001"),
+                    VersionObj(verNum = 3, verName = "v003", name = "dog_v003")]
+        self.assertEqual(len(set(ver_objs)), 3)
+        self.assertEqual([ver_obj.versionNum for ver_obj in sorted(ver_objs)], [None, 1, 3, 3])
+        self.assertTrue(ver_objs[2] < ver_objs[0])
+        self.assertEqual(max(ver_objs).name, "dog_v003")
+
+
+    def test_pickle(self):
+        ver_obj = VersionObj(verNum = 3, verName = "v003", name = "dog_v003")
+        self.assertEqual(pickle.loads(pickle.dumps(ver_obj, pickle.HIGHEST_PROTOCOL)), ver_obj)
+
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -21,364 +21,5783 @@ __version__ = "1.0"
 #-------------------------------------------------------------------------------
 ## Import
 #-------------------------------------------------------------------------------
+import abc
+import array
+import bisect
+import collections
+import datetime
+import errno
+import itertools
+import json
+import mmap
+import multiprocessing
+import operator
 import os
+import random
 import re
+import select
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+try:
+    import numpy as _numpy
+except ImportError:
+    _numpy = None
+
+
+try:
+    from concurrent import futures as _futures
+except ImportError:
+    _futures = None
+
+
+try:
+    import queue as _queue
+except ImportError:
+    import Queue as _queue
+
+
+try:
+    import socketserver as _socketserver
+except ImportError:
+    import SocketServer as _socketserver
+
+
+try:
+    from urllib.parse import quote as _url_quote, urlencode as _url_encode
+    from urllib.request import Request as _UrlRequest, urlopen as _url_open
+except ImportError:
+    from urllib import quote as _url_quote, urlencode as _url_encode
+    from urllib2 import Request as _UrlRequest, urlopen as _url_open
+
+
+from xml.etree import ElementTree as _ElementTree
+
+
+try:
+    from re import _parser as _sre_parse
+    from re import _constants as _sre_constants
+except ImportError:
+    import sre_parse as _sre_parse
+    import sre_constants as _sre_constants
+
+
+## Base class of abstract classes, which works with both metaclass syntaxes.
+_ABCBase = abc.ABCMeta("_ABCBase", (object,), {})
+
+_imap = getattr(itertools, "imap", map)
+_fs_decode = getattr(os, "fsdecode", lambda name: name.decode(sys.getfilesystemencoding()))
+_fspath = getattr(os, "fspath", lambda path: path)
+_timer = getattr(time, "perf_counter", time.time)
+
+
+try:
+    _string_types = (str, unicode)
+    _unichr = unichr
+except NameError:
+    _string_types = (str,)
+    _unichr = chr
+
+
+CacheInfo = collections.namedtuple("CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"])
+DirectoryResult = collections.namedtuple("DirectoryResult", ["directory", "name_pattern", "version", "path", "error"])
+ResolvedPath = collections.namedtuple("ResolvedPath", ["path", "fields", "versions"])
+
+## Queries answered by the daemon and the batch mode, and the FileVersionist
+## methods which answer them.
+_QUERY_METHODS = {"latest_path": "get_latest_namePath",
+                  "latest_name": "get_latest_name",
+                  "latest_version_name": "get_latest_version_name",
+                  "latest_version_num": "get_latest_version_num",
+                  "next_version_name": "get_next_version_name",
+                  "next_version_num": "get_next_version_num"}
+_QUERY_OPTIONS = frozenset(["padding", "prefix", "initial_number", "match_type", "target_type", "version_key",
+                            "version_scheme"])
+
+
+
+class _LRUCache(object):
+    """Thread safe least-recently-used mapping with a size bound.
+    Hit, miss and eviction counts are kept for diagnostics.
+    """
+
+    def __init__(self, maxsize = 128):
+        super(_LRUCache, self).__init__()
+        self._maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+
+    def get(self, key, default = None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self._misses += 1
+                return default
+
+            self._data[key] = value
+            self._hits += 1
+            return value
+
+
+    def put(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            self._trim()
+
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+
+    def set_maxsize(self, maxsize):
+        with self._lock:
+            self._maxsize = maxsize
+            self._trim()
+
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions, self._maxsize, len(self._data))
+
+
+    def _trim(self):
+        while len(self._data) > max(self._maxsize, 0):
+            self._data.popitem(last = False)
+            self._evictions += 1
+
+
+
+class _classOrInstanceMethod(object):
+    """Descriptor which binds the function to the class when it is accessed
+    through the class, and to the instance when accessed through an instance.
+    """
+
+    def __init__(self, func):
+        self._func = func
+
+
+    def __get__(self, instance, owner):
+        target = owner if instance is None else instance
+        func = self._func
+
+        def bound(*args, **kwargs):
+            return func(target, *args, **kwargs)
+
+        bound.__name__ = func.__name__
+        bound.__doc__ = func.__doc__
+        return bound
+
+
+
+class _ListingEntry(object):
+    """Listing of one directory held by the listing cache. Filtered listings
+    and scan results computed from the listing are kept with it, so they are
+    dropped together when the directory is changed.
+    """
+
+    def __init__(self, names, stamp, created):
+        super(_ListingEntry, self).__init__()
+        self.names = names
+        self.stamp = stamp
+        self.created = created
+        self.filtered = {}
+        self.results = {}
+
+
+
+class _ListingCache(object):
+    """Process wide cache of directory listings keyed by directory path and
+    target type.
+    An entry is validated with a single stat of the directory: it is used while
+    the directory's mtime and inode are unchanged. In TTL mode the directory is
+    not checked at all and an entry is used until it gets older than ttl seconds.
+    """
+
+    ## A listing taken within this many seconds of the directory's mtime is not
+    ## trusted, since another change in the same mtime tick is not detectable.
+    kRacyWindow = 2.0
+
+    def __init__(self, maxsize = 1024, ttl = None):
+        super(_ListingCache, self).__init__()
+        self._entries = _LRUCache(maxsize = maxsize)
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+
+    #---------------------------------------------------------------------------
+    ## Returns valid listing entry of the directory. When there is no valid
+    ## entry, the loader is called to list the directory and the result is stored.
+    ##
+    ## @param directory : <str> directory path.
+    ##
+    ## @param target_type : <str> 'file', 'dir' or 'both'.
+    ##
+    ## @param loader : <function> returns all target names of the directory.
+    ##
+    ## @return : <_ListingEntry> listing entry.
+    def fetch(self, directory, target_type, loader):
+        key = (directory, target_type)
+        entry = self._entries.get(key)
+        now = time.time()
+
+        if self._ttl is not None:
+            stamp = None
+            if entry is not None and now - entry.created <= self._ttl:
+                self._count(hit = True)
+                return entry
+
+        else:
+            stamp, mtime = _directory_stamp(directory)
+            if entry is not None and entry.stamp is not None and entry.stamp == stamp:
+                self._count(hit = True)
+                return entry
+
+            if mtime is not None and now - mtime < self.kRacyWindow:
+                stamp = None
+
+        self._count(hit = False)
+        entry = _ListingEntry(loader(), stamp, now)
+        self._entries.put(key, entry)
+        return entry
+
+
+    def clear(self):
+        self._entries.clear()
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+
+
+    def info(self):
+        entries_info = self._entries.info()
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, entries_info.evictions,
+                             entries_info.maxsize, entries_info.currsize)
+
+
+    def _count(self, hit):
+        if _HOOKS:
+            _emit("listing_cache_hit" if hit else "listing_cache_miss")
+
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+
+
+#-------------------------------------------------------------------------------
+## Returns the values which tell a directory was changed, with one stat call.
+##
+## @return : <tuple> stamp tuple and mtime. The mtime is None when the
+##           directory does not exist.
+def _directory_stamp(directory):
+    try:
+        st = os.stat(directory)
+
+    except OSError as e:
+        if e.errno in (errno.ENOENT, errno.ENOTDIR):
+            return ((None, None, None), None)
+        raise
+
+    mtime = getattr(st, "st_mtime_ns", st.st_mtime)
+    return ((mtime, st.st_ino, st.st_dev), st.st_mtime)
+
+
+
+#-------------------------------------------------------------------------------
+## Returns the thread pool which runs directory listings of the asyncio API.
+## Its size limits the number of listings running at the same time.
+##
+## @return : <concurrent.futures.ThreadPoolExecutor> executor.
+def _async_executor():
+    global _ASYNC_EXECUTOR
+    with _ASYNC_LOCK:
+        if _ASYNC_EXECUTOR is None:
+            _ASYNC_EXECUTOR = _futures.ThreadPoolExecutor(max_workers = _ASYNC_MAX_LISTINGS)
+
+        return _ASYNC_EXECUTOR
+
+
+#-------------------------------------------------------------------------------
+## Returns the event loop of the caller.
+##
+## @return : <asyncio.AbstractEventLoop> event loop.
+def _current_event_loop():
+    if asyncio is None or _futures is None:
+        raise RuntimeError("asyncio is not available.")
+
+    get_running_loop = getattr(asyncio, "get_running_loop", None)
+    if get_running_loop is not None:
+        try:
+            return get_running_loop()
+        except RuntimeError:
+            pass
+
+    return asyncio.get_event_loop()
+
+
+
+#-------------------------------------------------------------------------------
+## Returns iterator of target names. Items which have 'name' attribute, like
+## os.DirEntry from os.scandir, are replaced with the attribute. The kind of
+## items is decided from the first item, so nothing is stored.
+##
+## @param targets : <iterable> of names or directory entries.
+##
+## @return : <iterator> of names.
+def _iter_target_names(targets):
+    iterator = iter(targets)
+    for first in iterator:
+        if isinstance(first, _string_types) or not hasattr(first, "name"):
+            return itertools.chain((first,), iterator)
+
+        return itertools.chain((first.name,), _imap(operator.attrgetter("name"), iterator))
+
+    return iter(())
+
+
+
+_PATTERN_CACHE = _LRUCache(maxsize = 256)
+## Path template levels without a version are plain regular expressions, so
+## they are kept apart from the version patterns.
+_LEVEL_PATTERN_CACHE = _LRUCache(maxsize = 64)
+_NON_ASCII = re.compile(b"[\\x80-\\xff]")
+_MANIFEST_CHUNK_SIZE = 1 << 20
+_LISTING_CACHE = None
+_ASYNC_LOCK = threading.Lock()
+_ASYNC_EXECUTOR = None
+_ASYNC_MAX_LISTINGS = 8
+_ASYNC_INFLIGHT = {}
+_HOOKS = ()
+_HOOKS_LOCK = threading.Lock()
+
+
+#-------------------------------------------------------------------------------
+## Sends an instrumentation event to the hooks. Callers check _HOOKS first, so
+## nothing is measured while no hook is registered.
+##
+## @param event : <str> event name.
+##
+## @param count : <int> count of the event.
+##
+## @param seconds : <float> time spent, or None type.
+def _emit(event, count = 1, seconds = None):
+    for hook in _HOOKS:
+        hook(event, count, seconds)
+
+
+#-------------------------------------------------------------------------------
+## Convert name pattern. If the given string containts version token,
+## it is replaced at here.
+##
+## @return : <str> actual regular expression pattern.
+def _format_name_pattern(name_pattern, version_key, prefix, padding, version_scheme = None):
+
+    if not isinstance(name_pattern, _string_types):
+        raise RuntimeError("File pattern is not set.")
+
+    if version_scheme is not None:
+        if "<%s>" % version_key not in name_pattern:
+            raise VersionKeyError("Name pattern needs version token '<%s>' for version scheme. Got %s." %
+                                  (version_key, name_pattern))
+
+        groupKey = "(?P<%s>%s)" % (version_key, version_scheme.regex(version_key))
+        return name_pattern.replace("<%s>" % version_key, groupKey)
+
+    if "(?P<%s>" % version_key in name_pattern:
+        return name_pattern
+
+    elif "<%s>" % version_key in name_pattern:
+        groupKey = r"(?P<%s>%s\d{%d})" % (version_key, prefix, padding)
+        pat = name_pattern.replace("<%s>" % version_key, groupKey)
+        return pat
+
+    else:
+        raise VersionKeyError("Name pattern needs version key '%s'. Got %s." % (version_key, name_pattern))
+
+
+#-------------------------------------------------------------------------------
+## Returns compiled name pattern. Compiled patterns are shared by all the
+## instances through a bounded LRU cache.
+##
+## @return : <_NamePattern> compiled name pattern.
+def _compile_name_pattern(name_pattern, prefix, padding, version_key, match_type, scheme_template = None):
+    key = (name_pattern, prefix, padding, version_key, match_type, scheme_template)
+    compiled = _PATTERN_CACHE.get(key)
+    if compiled is None:
+        start = _timer() if _HOOKS else None
+        version_scheme = VersionScheme(scheme_template) if scheme_template is not None else None
+        regex = re.compile(_format_name_pattern(name_pattern, version_key, prefix, padding, version_scheme))
+        compiled = _NamePattern(regex, match_type, version_scheme)
+        _PATTERN_CACHE.put(key, compiled)
+        if start is not None:
+            _emit("pattern_compile", 1, _timer() - start)
+
+    elif _HOOKS:
+        _emit("pattern_cache_hit")
+
+    return compiled
+
+
+#-------------------------------------------------------------------------------
+## Finds literal text every match of the regular expression must contain.
+## Only plain sequences of characters are taken; anything else is treated as
+## unknown text between the literals, so the result is always safe to use as a
+## prefilter.
+##
+## @param regex : <_sre.SRE_Pattern> compiled regular expression.
+##
+## @param match_type : <str> 'match' or 'search'
+##
+## @return : <tuple> required prefix, tuple of allowed suffixes and tuple of
+##           required substrings. Empty values mean no requirement.
+def _literal_requirements(regex, match_type):
+    flags = regex.flags
+    if flags & re.IGNORECASE or not isinstance(regex.pattern, _string_types):
+        return ("", (), ())
+
+    multiline = flags & re.MULTILINE
+    LITERAL = _sre_constants.LITERAL
+    SUBPATTERN = _sre_constants.SUBPATTERN
+    AT = _sre_constants.AT
+    begins = (_sre_constants.AT_BEGINNING_STRING,) if multiline else \
+             (_sre_constants.AT_BEGINNING_STRING, _sre_constants.AT_BEGINNING)
+    strict_ends = (_sre_constants.AT_END_STRING,)
+    loose_ends = () if multiline else (_sre_constants.AT_END,)
+    if isinstance(regex.pattern, bytes):
+        max_char, to_char = 0x7f, chr
+    else:
+        max_char, to_char = 0x10ffff, _unichr
+
+    tokens = []
+
+    def walk(items):
+        for op, av in items:
+            if op == LITERAL and av <= max_char:
+                tokens.append(("lit", av))
+
+            elif op == SUBPATTERN and (len(av) == 2 or not (av[1] or av[2])):
+                walk(av[-1])
+
+            elif op == AT:
+                if av in begins:
+                    tokens.append(("begin", None))
+                elif av in strict_ends:
+                    tokens.append(("end", True))
+                elif av in loose_ends:
+                    tokens.append(("end", False))
+
+            else:
+                tokens.append(("gap", None))
+
+    try:
+        walk(_sre_parse.parse(regex.pattern, flags))
+    except Exception:
+        return ("", (), ())
+
+    anchored = match_type == Versionist.kMatchType
+    while tokens and tokens[0][0] == "begin":
+        anchored = True
+        tokens.pop(0)
+
+    end = None
+    while tokens and tokens[-1][0] == "end":
+        end = tokens[-1][1] if end is None else (end or tokens[-1][1])
+        tokens.pop()
+
+    if any(kind in ("begin", "end") for kind, _ in tokens):
+        return ("", (), ())
+
+    chunks = [[]]
+    for kind, av in tokens:
+        if kind == "lit":
+            chunks[-1].append(av)
+        else:
+            chunks.append([])
+
+    text = ["".join(to_char(av) for av in chunk) for chunk in chunks]
+
+    prefix = ""
+    suffixes = ()
+    if anchored:
+        prefix = text.pop(0)
+
+    if end is not None and text:
+        suffix = text.pop()
+        if suffix:
+            suffixes = (suffix,) if end else (suffix, suffix + "\n")
+
+    substrings = []
+    for chunk in sorted(set(chunk for chunk in text if chunk), key = len, reverse = True):
+        if not any(chunk in kept for kept in substrings + [prefix] + list(suffixes)):
+            substrings.append(chunk)
+
+    return (prefix, suffixes, tuple(substrings))
+
+
+
+class _NamePattern(object):
+    """Compiled name pattern with the literal text its matches require.
+    Cheap string checks reject most names before the regular expression runs,
+    and the result is exactly the same as running the regular expression alone.
+    """
+
+    def __init__(self, regex, match_type, version_scheme = None):
+        super(_NamePattern, self).__init__()
+        self.regex = regex
+        self.version_scheme = version_scheme
+        self.groupindex = regex.groupindex
+
+        if match_type == Versionist.kMatchType:
+            self.matchFunc = regex.match
+        else:
+            self.matchFunc = regex.search
+
+        self.prefix, self.suffixes, self.substrings = _literal_requirements(regex, match_type)
+        self.accept = self._make_accept()
+        self._match_type = match_type
+        self._manifest_regex = None
+        self._layouts = {}
+
+
+    #---------------------------------------------------------------------------
+    ## Returns bytes regular expression which finds the matches of this pattern
+    ## over a buffer of lines. It is compiled on first use.
+    ##
+    ## @return : <tuple> compiled bytes pattern, or None type when the pattern
+    ##           can not run over the buffer, and whether the matches can be
+    ##           collected at once.
+    def manifest_regex(self):
+        if self._manifest_regex is None:
+            self._manifest_regex = _compile_manifest_pattern(self.regex, self._match_type)
+
+        return self._manifest_regex
+
+
+    #---------------------------------------------------------------------------
+    ## Returns fixed width layout of the pattern for the vectorized scan. It is
+    ## analyzed on first use.
+    ##
+    ## @param version_key : <str> version group name.
+    ##
+    ## @param prefix : <str> version string's prefix.
+    ##
+    ## @return : <tuple> layout from _fixed_width_layout(), or None type.
+    def fixed_width_layout(self, version_key, prefix):
+        key = (version_key, prefix)
+        if key not in self._layouts:
+            self._layouts[key] = _fixed_width_layout(self.regex, self._match_type, version_key, prefix)
+
+        return self._layouts[key]
+
+
+    #---------------------------------------------------------------------------
+    ## Yields names which match and their match objects.
+    ##
+    ## @param names : <iterable> of names.
+    ##
+    ## @return : <generator> of (name, match object) tuples.
+    def iter_matches(self, names):
+        if _HOOKS:
+            return self._counted_matches(names)
+
+        return self._iter_matches(names, self.matchFunc)
+
+
+    #---------------------------------------------------------------------------
+    ## Yields matches like iter_matches() and reports the number of names,
+    ## regular expression evaluations and matches, and the time of the scan.
+    def _counted_matches(self, names):
+        counts = [0, 0, 0]
+        matchFunc = self.matchFunc
+
+        def counted_names():
+            for name in names:
+                counts[0] += 1
+                yield name
+
+        def counted_match(name):
+            counts[1] += 1
+            return matchFunc(name)
+
+        start = _timer()
+        try:
+            for name, mObj in self._iter_matches(counted_names(), counted_match):
+                counts[2] += 1
+                yield name, mObj
+
+        finally:
+            _emit("scan", 1, _timer() - start)
+            _emit("targets", counts[0])
+            _emit("regex", counts[1])
+            _emit("matches", counts[2])
+
+
+    def _iter_matches(self, names, matchFunc):
+        prefix = self.prefix
+        suffixes = self.suffixes
+        substrings = self.substrings
+
+        if not (prefix or suffixes or substrings):
+            for name in names:
+                mObj = matchFunc(name)
+                if mObj is not None:
+                    yield name, mObj
+            return
+
+        for name in names:
+            if prefix and not name.startswith(prefix):
+                continue
+
+            if suffixes and not name.endswith(suffixes):
+                continue
+
+            if substrings:
+                for substring in substrings:
+                    if substring not in name:
+                        break
+                else:
+                    substring = None
+
+                if substring is not None:
+                    continue
+
+            mObj = matchFunc(name)
+            if mObj is not None:
+                yield name, mObj
+
+
+    def _make_accept(self):
+        matchFunc = self.matchFunc
+        prefix = self.prefix
+        suffixes = self.suffixes
+        substrings = self.substrings
+
+        if not (prefix or suffixes or substrings):
+            return matchFunc
+
+        def accept(name):
+            if prefix and not name.startswith(prefix):
+                return None
+
+            if suffixes and not name.endswith(suffixes):
+                return None
+
+            for substring in substrings:
+                if substring not in name:
+                    return None
+
+            return matchFunc(name)
+
+        return accept
+
+
+
+#-------------------------------------------------------------------------------
+## Compiles the name pattern as bytes pattern which runs over a buffer of lines
+## in multiline mode. Every match found in the buffer is the same as matching the
+## line alone, unless the match runs over the line feed. Patterns which can look
+## beyond the line, like lookarounds or string anchors, are not compiled.
+##
+## @param regex : <_sre.SRE_Pattern> compiled name pattern.
+##
+## @param match_type : <str> 'match' or 'search'
+##
+## @return : <tuple> compiled bytes pattern, or None type, and whether the
+##           matches can be collected at once. That is when no match runs over
+##           a line feed and every line has one match at most.
+def _compile_manifest_pattern(regex, match_type):
+    pattern = regex.pattern
+    if not isinstance(pattern, bytes):
+        try:
+            pattern = pattern.encode("ascii")
+        except UnicodeError:
+            return (None, False)
+
+    for token in (b"(?=", b"(?!", b"(?<=", b"(?<!", b"\\A", b"\\Z", b"\\z"):
+        if token in pattern:
+            return (None, False)
+
+    anchored = match_type == Versionist.kMatchType
+    if anchored:
+        pattern = b"^(?:" + pattern + b")"
+
+    flags = (regex.flags & ~re.UNICODE) | re.MULTILINE
+    try:
+        manifest = re.compile(pattern, flags)
+        items = list(_sre_parse.parse(regex.pattern, regex.flags))
+    except (re.error, ValueError):
+        return (None, False)
+
+    AT = _sre_constants.AT
+    if items and items[0] == (AT, _sre_constants.AT_BEGINNING):
+        anchored = True
+    if items and items[-1] == (AT, _sre_constants.AT_END):
+        anchored = True
+
+    single_line = not _consumes_line_feed(items, regex.flags & re.DOTALL)
+    return (manifest, anchored and single_line)
+
+
+#-------------------------------------------------------------------------------
+## Tells whether parsed regular expression can consume a line feed. Unknown
+## items are taken as they can.
+##
+## @param items : <list> parsed regular expression items.
+##
+## @param dotall : <bool> True when '.' matches a line feed.
+##
+## @return : <bool> False when no match can have a line feed.
+def _consumes_line_feed(items, dotall):
+    C = _sre_constants
+    repeats = (C.MAX_REPEAT, C.MIN_REPEAT, getattr(C, "POSSESSIVE_REPEAT", None))
+    safe_categories = (C.CATEGORY_DIGIT, C.CATEGORY_WORD, C.CATEGORY_NOT_SPACE)
+    line_feed = ord("\n")
+
+    for op, av in items:
+        if op == C.LITERAL:
+            if av == line_feed:
+                return True
+
+        elif op == C.NOT_LITERAL:
+            if av != line_feed:
+                return True
+
+        elif op == C.ANY:
+            if dotall:
+                return True
+
+        elif op == C.IN:
+            for item_op, item_av in av:
+                if item_op == C.LITERAL and item_av != line_feed:
+                    continue
+                if item_op == C.RANGE and not item_av[0] <= line_feed <= item_av[1]:
+                    continue
+                if item_op == C.CATEGORY and item_av in safe_categories:
+                    continue
+                return True
+
+        elif op in (C.AT, C.GROUPREF):
+            continue
+
+        elif op == C.SUBPATTERN:
+            sub_dotall = dotall
+            if len(av) == 4:
+                sub_dotall = (dotall or av[1] & re.DOTALL) and not av[2] & re.DOTALL
+            if _consumes_line_feed(av[-1], sub_dotall):
+                return True
+
+        elif op in repeats:
+            if _consumes_line_feed(av[2], dotall):
+                return True
+
+        elif op == C.BRANCH:
+            for branch in av[1]:
+                if _consumes_line_feed(branch, dotall):
+                    return True
+
+        elif op == getattr(C, "ATOMIC_GROUP", None):
+            if _consumes_line_feed(av, dotall):
+                return True
+
+        else:
+            return True
+
+    return False
+
+
+#-------------------------------------------------------------------------------
+## Returns spans of the lines which have non ASCII bytes. Bytes patterns do not
+## see these lines like text patterns do, so they are matched as text.
+##
+## @param buf : <mmap> buffer of lines.
+##
+## @param start : <int> start offset, at the beginning of a line.
+##
+## @param end : <int> end offset, at the end of a line.
+##
+## @return : <list> of (line start, line end) tuples.
+def _non_ascii_lines(buf, start, end):
+    lines = []
+    for mObj in _NON_ASCII.finditer(buf, start, end):
+        line_start = buf.rfind(b"\n", start, mObj.start()) + 1 or start
+        line_end = buf.find(b"\n", mObj.start(), end)
+        if line_end == -1:
+            line_end = end
+
+        if lines and lines[-1][0] == line_start:
+            continue
+
+        lines.append((line_start, line_end))
+
+    return lines
+
+
+#-------------------------------------------------------------------------------
+## Finds the line of latest version in a range of the buffer. The range is
+## scanned in chunks of whole lines, so memory use does not grow with the size
+## of the range. Only the winning line is located; callers decode it. Ties go
+## to the first line like the scan of a list does.
+##
+## @param buf : <mmap> buffer of lines separated by line feeds.
+##
+## @param start : <int> start offset, at the beginning of a line.
+##
+## @param end : <int> end offset, at the end of a line.
+##
+## @param compiled : <_NamePattern> compiled name pattern.
+##
+## @param version_key : <str> version group name.
+##
+## @param prefix : <str> version string's prefix.
+##
+## @param min_version : <int> versions below this number are ignored.
+##
+## @param encoding : <str> text encoding of the lines.
+##
+## @return : <tuple> latest version number and start offset of its line, both
+##           None type when nothing matches, or None type when a match runs
+##           over a line feed and the range has to be matched line by line.
+def _scan_manifest_range(buf, start, end, compiled, version_key, prefix, min_version, encoding):
+    regex, collect = compiled.manifest_regex()
+    if regex is None:
+        return None
+
+    if not isinstance(prefix, bytes):
+        prefix = prefix.encode("ascii")
+
+    best_num = min_version - 1
+    best_start = None
+
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = buf.find(b"\n", min(chunk_start + _MANIFEST_CHUNK_SIZE, end), end) + 1 or end
+
+        if collect and (bytes is str or _NON_ASCII.search(buf, chunk_start, chunk_end) is None):
+            num, line_start = _collect_manifest_chunk(buf, chunk_start, chunk_end, regex, version_key, prefix, best_num)
+        else:
+            result = _match_manifest_chunk(buf, chunk_start, chunk_end, compiled, version_key, prefix, best_num, encoding)
+            if result is None:
+                return None
+            num, line_start = result
+
+        if line_start is not None:
+            best_num = num
+            best_start = line_start
+
+        chunk_start = chunk_end
+
+    if best_start is None:
+        return (None, None)
+
+    return (best_num, best_start)
+
+
+#-------------------------------------------------------------------------------
+## Finds the first line above the given version in a chunk whose lines have
+## one match at most. Version strings are collected at once, and the chunk is
+## walked match by match only to locate the winner.
+##
+## @return : <tuple> version number and start offset of its line, or
+##           (None, None) when no version is above.
+def _collect_manifest_chunk(buf, start, end, regex, version_key, prefix, above):
+    group = regex.groupindex[version_key]
+    values = regex.findall(buf, start, end)
+    if regex.groups > 1:
+        values = [value[group - 1] for value in values]
+
+    best_num = above
+    for value in set(values):
+        num = int(value.replace(prefix, b""))
+        if num > best_num:
+            best_num = num
+
+    if best_num == above:
+        return (None, None)
+
+    for mObj in regex.finditer(buf, start, end):
+        if int(mObj.group(group).replace(prefix, b"")) == best_num:
+            return (best_num, buf.rfind(b"\n", start, mObj.start()) + 1 or start)
+
+
+#-------------------------------------------------------------------------------
+## Finds the first line above the given version in a chunk, match by match.
+## Only the first match of each line counts, and lines with non ASCII bytes are
+## decoded and matched as text.
+##
+## @return : <tuple> version number and start offset of its line, (None, None)
+##           when no version is above, or None type when a match runs over a
+##           line feed.
+def _match_manifest_chunk(buf, start, end, compiled, version_key, prefix, above, encoding):
+    regex = compiled.manifest_regex()[0]
+    group = regex.groupindex[version_key]
+    text_lines = [] if bytes is str else _non_ascii_lines(buf, start, end)
+    text_starts = [line_start for line_start, _ in text_lines]
+    find = buf.find
+
+    best_num = above
+    best_start = None
+    line_end = start
+
+    for mObj in regex.finditer(buf, start, end):
+        match_start, match_end = mObj.span()
+        if find(b"\n", match_start, match_end) != -1:
+            return None
+
+        if match_start < line_end:
+            continue
+
+        if text_starts:
+            index = bisect.bisect_right(text_starts, match_start) - 1
+            if index >= 0 and match_start <= text_lines[index][1]:
+                continue
+
+        line_end = find(b"\n", match_end, end)
+        if line_end == -1:
+            line_end = end
+
+        num = int(mObj.group(group).replace(prefix, b""))
+        if num > best_num:
+            best_num = num
+            best_start = buf.rfind(b"\n", start, match_start) + 1 or start
+
+    text_prefix = prefix.decode("ascii")
+    for line_start, line_end in text_lines:
+        mObj = compiled.matchFunc(buf[line_start:line_end].decode(encoding))
+        if mObj is None:
+            continue
+
+        num = int(mObj.group(version_key).replace(text_prefix, ""))
+        if num > best_num or (num == best_num and best_start is not None and line_start < best_start):
+            best_num = num
+            best_start = line_start
+
+    if best_start is None:
+        return (None, None)
+
+    return (best_num, best_start)
+
+
+
+#-------------------------------------------------------------------------------
+## Finds the layout of patterns which are literal text, fixed number of digits
+## and literal text, like the ones made with version token. Matches of such
+## patterns can be found by comparing characters at fixed positions.
+##
+## @param regex : <_sre.SRE_Pattern> compiled name pattern.
+##
+## @param match_type : <str> 'match' or 'search'
+##
+## @param version_key : <str> version group name.
+##
+## @param prefix : <str> version string's prefix.
+##
+## @return : <tuple> character codes before the digits, start of the version
+##           group, number of digits, character codes after the digits and the
+##           end anchor; None, '$' or '\\Z'. None type for other patterns.
+def _fixed_width_layout(regex, match_type, version_key, prefix):
+    if regex.flags & ~(re.UNICODE | getattr(re, "ASCII", 0)) or any(char.isdigit() for char in prefix):
+        return None
+
+    C = _sre_constants
+    try:
+        items = list(_sre_parse.parse(regex.pattern, regex.flags))
+    except Exception:
+        return None
+
+    anchored = match_type == Versionist.kMatchType
+    if items and items[0][0] == C.AT and items[0][1] in (C.AT_BEGINNING, C.AT_BEGINNING_STRING):
+        anchored = True
+        items.pop(0)
+
+    end = None
+    if items and items[-1] == (C.AT, C.AT_END):
+        end = "$"
+        items.pop()
+    elif items and items[-1] == (C.AT, C.AT_END_STRING):
+        end = "\\Z"
+        items.pop()
+
+    if not anchored:
+        return None
+
+    group_id = regex.groupindex.get(version_key)
+    head = []
+    tail = []
+    group_start = None
+    digits = None
+
+    for op, av in items:
+        if op == C.LITERAL:
+            (head if digits is None else tail).append(av)
+            continue
+
+        if op != C.SUBPATTERN or av[0] != group_id or digits is not None:
+            return None
+        if len(av) == 4 and (av[1] or av[2]):
+            return None
+
+        group_start = len(head)
+        for sub_op, sub_av in av[-1]:
+            if sub_op == C.LITERAL and digits is None:
+                head.append(sub_av)
+            elif sub_op == C.MAX_REPEAT and digits is None and sub_av[0] == sub_av[1] and \
+                 list(sub_av[2]) == [(C.IN, [(C.CATEGORY, C.CATEGORY_DIGIT)])]:
+                digits = sub_av[0]
+            else:
+                return None
+
+    if digits is None or not 0 < digits <= 18:
+        return None
+
+    if head[group_start:] != [ord(char) for char in prefix]:
+        return None
+
+    return (tuple(head), group_start, digits, tuple(tail), end)
+
+
+#-------------------------------------------------------------------------------
+## Finds versions of the names with array operations. Names are copied into a
+## fixed width array wide enough for the layout, literal characters and digits
+## are compared column by column, and the digits are converted at once. Rows
+## whose digit columns are not ASCII are matched with the regular expression,
+## so the result is the same as the scan of the names.
+##
+## @param names : <list> of names.
+##
+## @param layout : <tuple> layout from _fixed_width_layout().
+##
+## @param compiled : <_NamePattern> compiled name pattern.
+##
+## @param version_key : <str> version group name.
+##
+## @param prefix : <str> version string's prefix.
+##
+## @param min_version : <int> versions below this number are ignored.
+##
+## @return : <tuple> arrays of the indices of the matched names in the order of
+##           the names, and their version numbers.
+def _vector_versions(names, layout, compiled, version_key, prefix, min_version):
+    head, group_start, digits, tail, end = layout
+    count = len(names)
+    size = len(head) + digits + len(tail)
+    text = not isinstance(names[0], bytes)
+
+    lengths = _numpy.fromiter(_imap(len, names), dtype = _numpy.int64, count = count)
+    rows = _numpy.array(names, dtype = ("U%d" if text else "S%d") % (size + 1))
+    codes = rows.view(_numpy.uint32 if text else _numpy.uint8).reshape(count, size + 1)
+
+    if end is None:
+        valid = lengths >= size
+    else:
+        valid = lengths == size
+        if end == "$":
+            valid |= (lengths == size + 1) & (codes[:, size] == ord("\n"))
+
+    columns = list(range(len(head))) + list(range(len(head) + digits, size))
+    if columns:
+        valid &= (codes[:, columns] == _numpy.array(head + tail)).all(axis = 1)
+
+    values = codes[:, len(head):len(head) + digits].astype(_numpy.int64) - ord("0")
+    ascii_digits = ((values >= 0) & (values <= 9)).all(axis = 1)
+    nums = values.dot(10 ** _numpy.arange(digits - 1, -1, -1, dtype = _numpy.int64))
+
+    others = _numpy.flatnonzero(valid & ~ascii_digits) if text else ()
+    valid &= ascii_digits
+    for index in others:
+        mObj = compiled.matchFunc(names[index])
+        if mObj is not None:
+            nums[index] = int(mObj.group(version_key).replace(prefix, ""))
+            valid[index] = True
+
+    valid &= nums >= min_version
+    indices = _numpy.flatnonzero(valid)
+    return indices, nums[indices]
+
+
+
+#-------------------------------------------------------------------------------
+## Runs the function over the arguments in worker processes. Results are in
+## the order of the arguments.
+##
+## @param func : <function> module level function.
+##
+## @param args : <list> arguments of each call.
+##
+## @param workers : <int> maximum number of worker processes.
+##
+## @return : <list> results.
+def _process_map(func, args, workers):
+    pool = multiprocessing.Pool(min(workers, len(args)))
+    try:
+        results = pool.map(func, args)
+    except BaseException:
+        pool.terminate()
+        raise
+
+    pool.close()
+    pool.join()
+    return results
+
+
+#-------------------------------------------------------------------------------
+## Scans a shard of names in a worker process.
+##
+## @param args : <tuple> names, pattern settings, initial number and whether
+##               all the versions are needed.
+##
+## @return : <VersionObj> latest version of the shard, or <list> of version
+##           number, version name and name tuples.
+def _scan_names_shard(args):
+    names, (name_pattern, prefix, padding, version_key, match_type, scheme_template), initial_number, history = args
+    vernist = Versionist(names, name_pattern, padding = padding, prefix = prefix,
+                         initial_number = initial_number, match_type = match_type, version_key = version_key,
+                         version_scheme = scheme_template)
+    if history:
+        return [(ver_obj.versionNum, ver_obj.versionName, ver_obj.name) for ver_obj in vernist._iter_versions(names)]
+
+    return vernist._scan_latest(names)
+
+
+#-------------------------------------------------------------------------------
+## Scans a byte range of a manifest in a worker process.
+##
+## @param args : <tuple> manifest path, range, pattern settings, initial number
+##               and encoding.
+##
+## @return : <tuple> result of _scan_manifest_range().
+def _scan_manifest_shard(args):
+    path, start, end, (name_pattern, prefix, padding, version_key, match_type, scheme_template), initial_number, encoding = args
+    compiled = _compile_name_pattern(name_pattern, prefix, padding, version_key, match_type, scheme_template)
+    with open(path, "rb") as manifest:
+        buf = mmap.mmap(manifest.fileno(), 0, access = mmap.ACCESS_READ)
+        try:
+            return _scan_manifest_range(buf, start, end, compiled, version_key, prefix, initial_number, encoding)
+        finally:
+            buf.close()
 
 
 
 class VersionObj(object):
+    """Immutable version information. Version objects are hashable and are
+    ordered by version number, version name and complete string. The empty
+    version object is ordered before any version.
+    """
+
+    __slots__ = ("_versionNum", "_versionName", "_name")
+
+    def __init__(self, verNum = None, verName = None, name = None):
+        super(VersionObj, self).__init__()
+        object.__setattr__(self, "_versionNum", verNum)
+        object.__setattr__(self, "_versionName", verName)
+        object.__setattr__(self, "_name", name)
+
+
+    def __setattr__(self, key, value):
+        raise AttributeError("VersionObj is immutable.")
+
+
+    def __delattr__(self, key):
+        raise AttributeError("VersionObj is immutable.")
+
+
+    def __reduce__(self):
+        return (VersionObj, (self._versionNum, self._versionName, self._name))
+
+
+    def __repr__(self):
+        return "VersionObj(verNum=%r, verName=%r, name=%r)" % (self._versionNum, self._versionName, self._name)
+
+
+    def _sort_key(self):
+        num = self._versionNum
+        return (num is not None, 0 if num is None else num, self._versionName or "", self._name or "")
+
+
+    def __hash__(self):
+        return hash((self._versionNum, self._versionName, self._name))
+
+
+    def __eq__(self, other):
+        if not isinstance(other, VersionObj):
+            return NotImplemented
+        return (self._versionNum, self._versionName, self._name) == \
+               (other._versionNum, other._versionName, other._name)
+
+
+    def __ne__(self, other):
+        if not isinstance(other, VersionObj):
+            return NotImplemented
+        return not self == other
+
+
+    def __lt__(self, other):
+        if not isinstance(other, VersionObj):
+            return NotImplemented
+        return self._sort_key() < other._sort_key()
+
+
+    def __le__(self, other):
+        if not isinstance(other, VersionObj):
+            return NotImplemented
+        return self._sort_key() <= other._sort_key()
+
+
+    def __gt__(self, other):
+        if not isinstance(other, VersionObj):
+            return NotImplemented
+        return self._sort_key() > other._sort_key()
+
+
+    def __ge__(self, other):
+        if not isinstance(other, VersionObj):
+            return NotImplemented
+        return self._sort_key() >= other._sort_key()
+
+
+    @property
+    def versionNum(self):
+        """Getter of version number."""
+        return self._versionNum
+
+    @property
+    def versionName(self):
+        """Getter of version name."""
+        return self._versionName
+
+    @property
+    def name(self):
+        """Getter of complete string."""
+        return self._name
+
+
+
+class _StringTable(object):
+    """Table of unique strings. Each string is stored once and referred by its
+    index. Tables can be shared by several version tables.
+    """
+
+    def __init__(self):
+        super(_StringTable, self).__init__()
+        self._strings = []
+        self._ids = {}
+
+
+    def intern(self, text):
+        if text is None:
+            return -1
+
+        index = self._ids.get(text)
+        if index is None:
+            index = len(self._strings)
+            self._strings.append(text)
+            self._ids[text] = index
+
+        return index
+
+
+    def get(self, index):
+        if index < 0:
+            return None
+
+        return self._strings[index]
+
+
+    def __len__(self):
+        return len(self._strings)
+
+
+
+class VersionTable(object):
+    """Columnar storage of version objects for large result sets.
+    Version numbers are stored in array('q') and version names are stored as
+    indices of a string table, in which each name like 'v001' is held once.
+    Complete strings are mostly unique, so they are kept in a plain list.
+    Tuple sort keys of version schemes do not fit the array, and they are kept
+    in a list instead.
+    Items are returned as VersionObj.
+    """
+
+    try:
+        array.array("q")
+        kNumTypeCode = "q"
+    except ValueError:
+        kNumTypeCode = "l"
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of VersionTable.
+    ##
+    ## @param versions : <iterable> of VersionObj.
+    ##
+    ## @param strings : <_StringTable> string table to share. None creates
+    ##                 a table for this instance.
+    def __init__(self, versions = (), strings = None):
+        super(VersionTable, self).__init__()
+        self._strings = _StringTable() if strings is None else strings
+        self._nums = array.array(self.kNumTypeCode)
+        self._version_names = array.array("i")
+        self._names = []
+
+        for ver_obj in versions:
+            self.append(ver_obj)
+
+
+    @property
+    def nums(self):
+        """Getter of version number column."""
+        return self._nums
+
+
+    def __len__(self):
+        return len(self._nums)
+
+
+    def __iter__(self):
+        get = self._strings.get
+        for num, version_name, name in zip(self._nums, self._version_names, self._names):
+            yield VersionObj(verNum=num, verName=get(version_name), name=name)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._nums)))]
+
+        get = self._strings.get
+        return VersionObj(verNum=self._nums[index],
+                          verName=get(self._version_names[index]),
+                          name=self._names[index])
+
+
+    def __delitem__(self, index):
+        del self._nums[index]
+        del self._version_names[index]
+        del self._names[index]
+
+
+    #---------------------------------------------------------------------------
+    ## Adds a version at the end.
+    ##
+    ## @param ver_obj : <VersionObj> version to add.
+    def append(self, ver_obj):
+        self.insert(len(self._nums), ver_obj)
+
+
+    #---------------------------------------------------------------------------
+    ## Adds a version before the index.
+    ##
+    ## @param index : <int> position.
+    ##
+    ## @param ver_obj : <VersionObj> version to add.
+    def insert(self, index, ver_obj):
+        num = ver_obj.versionNum
+        if isinstance(num, tuple) and isinstance(self._nums, array.array):
+            if self._nums:
+                raise TypeError("Version keys and version numbers can not be mixed.")
+            self._nums = []
+
+        self._nums.insert(index, num)
+        self._version_names.insert(index, self._strings.intern(ver_obj.versionName))
+        self._names.insert(index, ver_obj.name)
+
+
+
+class VersionHistory(object):
+    """VersionHistory holds versions sorted by version number in a columnar
+    VersionTable. Queries are answered with binary search, and new versions are
+    inserted at their place without sorting again. Versions which have the same
+    number keep the order they were added in; the first one is used as the
+    representative, like the latest version of Versionist.
+    Query arguments can be version numbers or version names like 'v007'.
+    """
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of VersionHistory.
+    ##
+    ## @param versions : <iterable> of VersionObj. The order is free.
+    ##
+    ## @param prefix : <str> version string's prefix used to read version names.
+    ##
+    ## @param strings : <_StringTable> string table shared with other histories.
+    ##
+    ## @param version_scheme : <VersionScheme> scheme used to read version names.
+    ##                        None reads them as prefix and number.
+    def __init__(self, versions = (), prefix = "v", strings = None, version_scheme = None):
+        super(VersionHistory, self).__init__()
+        self._prefix = prefix
+        self._version_scheme = version_scheme
+        self._versions = VersionTable(sorted(versions, key = lambda ver_obj: ver_obj.versionNum), strings)
+        self._nums = self._versions.nums
+
+
+    def __len__(self):
+        return len(self._nums)
+
+
+    def __iter__(self):
+        return iter(self._versions)
+
+
+    def __getitem__(self, index):
+        return self._versions[index]
+
+
+    def __contains__(self, version):
+        return self.has_version(version)
+
+
+    #---------------------------------------------------------------------------
+    ## Adds a version at its sorted place.
+    ##
+    ## @param ver_obj : <VersionObj> version to add.
+    def insert(self, ver_obj):
+        index = bisect.bisect_right(self._nums, ver_obj.versionNum)
+        self._versions.insert(index, ver_obj)
+        self._nums = self._versions.nums
+
+
+    #---------------------------------------------------------------------------
+    ## Removes the version object.
+    ##
+    ## @param ver_obj : <VersionObj> version to remove.
+    ##
+    ## @return : <bool> True when it was found.
+    def remove(self, ver_obj):
+        num = ver_obj.versionNum
+        index = bisect.bisect_left(self._nums, num)
+        end = bisect.bisect_right(self._nums, num)
+
+        for i in range(index, end):
+            if self._versions[i] == ver_obj:
+                del self._versions[i]
+                return True
+
+        return False
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version. If no version exists, returns empty VersionObj.
+    ##
+    ## @return : <VersionObj> latest version information
+    def latest(self):
+        if not self._nums:
+            return VersionObj()
+
+        return self._versions[bisect.bisect_left(self._nums, self._nums[-1])]
+
+
+    #---------------------------------------------------------------------------
+    ## Returns the most recent versions, newest first.
+    ##
+    ## @param count : <int> number of versions.
+    ##
+    ## @return : <list> of VersionObj
+    def latest_n(self, count):
+        if count <= 0:
+            return []
+
+        return self._versions[:-count - 1:-1]
+
+
+    #---------------------------------------------------------------------------
+    ## Returns the version which has the number. If it does not exist,
+    ## returns None type.
+    ##
+    ## @param version : <int> version number or <str> version name.
+    ##
+    ## @return : <VersionObj> version information
+    def get(self, version):
+        num = self._to_num(version)
+        index = bisect.bisect_left(self._nums, num)
+        if index < len(self._nums) and self._nums[index] == num:
+            return self._versions[index]
+
+        return None
+
+
+    #---------------------------------------------------------------------------
+    ## Tells the version exists.
+    ##
+    ## @param version : <int> version number or <str> version name.
+    ##
+    ## @return : <bool> True when it exists.
+    def has_version(self, version):
+        return self.get(version) is not None
+
+
+    #---------------------------------------------------------------------------
+    ## Returns the closest version before the given version. If it does not
+    ## exist, returns None type.
+    ##
+    ## @param version : <int> version number or <str> version name.
+    ##
+    ## @return : <VersionObj> version information
+    def previous(self, version):
+        index = bisect.bisect_left(self._nums, self._to_num(version))
+        if index == 0:
+            return None
+
+        return self._versions[bisect.bisect_left(self._nums, self._nums[index - 1])]
+
+
+    #---------------------------------------------------------------------------
+    ## Returns the closest version after the given version. If it does not
+    ## exist, returns None type.
+    ##
+    ## @param version : <int> version number or <str> version name.
+    ##
+    ## @return : <VersionObj> version information
+    def next(self, version):
+        index = bisect.bisect_right(self._nums, self._to_num(version))
+        if index == len(self._nums):
+            return None
+
+        return self._versions[index]
+
+
+    #---------------------------------------------------------------------------
+    ## Returns versions between the two versions. Both ends are included.
+    ##
+    ## @param start : <int> version number or <str> version name.
+    ##
+    ## @param end : <int> version number or <str> version name.
+    ##
+    ## @return : <list> of VersionObj sorted by version number.
+    def between(self, start, end):
+        first = bisect.bisect_left(self._nums, self._to_num(start))
+        last = bisect.bisect_right(self._nums, self._to_num(end))
+        return self._versions[first:last]
+
+
+    def _to_num(self, version):
+        if isinstance(version, _string_types):
+            if self._version_scheme is not None:
+                return self._version_scheme.parse(version)
+
+            return int(version.replace(self._prefix, ""))
+
+        return version
+
+
+
+_SchemeField = collections.namedtuple("_SchemeField", ["name", "kind", "regex", "width", "start", "format"])
+
+
+
+class VersionScheme(object):
+    """VersionScheme describes version names made of several fields, like
+    'v2.10.3', 'v012_r04' or '20261017_v03'. The fields are tokens of a template
+    and the other text is literal. Tokens are...
+    <name:int> digits. <name:int:3> three digits. <name:int:2:1> two digits
+    which start from 1 when they are reset.
+    <name:date:%Y%m%d> date written in the strftime format.
+    <name:text> letters. <name:text:[a-z]+> text which matches the regex.
+    Each version gets a tuple sort key with one item per field when the name is
+    matched: the number of int fields, seconds since 0001-01-01 of date fields
+    and the text of text fields. The key is used as the version number.
+    So for example...
+    scheme = VersionScheme("v<major:int>.<minor:int>.<patch:int>")
+    vernist = Versionist(targets, "^lib_<version>\\.so$", version_scheme = scheme)
+    vernist.get_next_version_name("minor")
+    """
+
+    kTokenPattern = re.compile(r"<(\w+)(?::(int|date|text)(?::([^>]*))?)?>")
+    kDateDirectives = {"Y": r"\d{4}", "y": r"\d{2}", "m": r"\d{2}", "d": r"\d{2}",
+                       "H": r"\d{2}", "M": r"\d{2}", "S": r"\d{2}", "j": r"\d{3}", "%": "%"}
+    kParseKey = "_scheme"
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of VersionScheme.
+    ##
+    ## @param template : <str> version name with field tokens.
+    def __init__(self, template):
+        super(VersionScheme, self).__init__()
+        self._template = template
+        self._fields = []
+        self._literals = []
+
+        position = 0
+        for mObj in self.kTokenPattern.finditer(template):
+            self._literals.append(template[position:mObj.start()])
+            self._fields.append(self._make_field(*mObj.groups()))
+            position = mObj.end()
+        self._literals.append(template[position:])
+
+        names = [field.name for field in self._fields]
+        if not names:
+            raise ValueError("Version scheme needs one field at least: %r" % template)
+        if len(set(names)) != len(names):
+            raise ValueError("Field names of version scheme must be unique: %r" % template)
+
+        self._name_regex = re.compile("(?:%s)$" % self.regex(self.kParseKey))
+        self._parse_key = self.key_function(self.kParseKey)
+
+
+    @property
+    def template(self):
+        """Getter of template."""
+        return self._template
+
+
+    @property
+    def field_names(self):
+        """Getter of field names."""
+        return tuple(field.name for field in self._fields)
+
+
+    @property
+    def lexical(self):
+        """Tells version names are ordered like their sort keys when they are
+        compared as strings. That is when all fields are fixed width numbers.
+        """
+        return all(field.kind == "int" and field.width for field in self._fields)
+
+
+    def __repr__(self):
+        return "VersionScheme(%r)" % self._template
+
+
+    def __eq__(self, other):
+        if not isinstance(other, VersionScheme):
+            return NotImplemented
+        return self._template == other._template
+
+
+    def __ne__(self, other):
+        if not isinstance(other, VersionScheme):
+            return NotImplemented
+        return not self == other
+
+
+    def __hash__(self):
+        return hash(self._template)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns regular expression of version names. Each field is a named group
+    ## of the version key and the field name.
+    ##
+    ## @param version_key : <str> version group name.
+    ##
+    ## @return : <str> regular expression.
+    def regex(self, version_key):
+        pieces = []
+        for literal, field in zip(self._literals, self._fields):
+            pieces.append(re.escape(literal))
+            pieces.append("(?P<%s>%s)" % (self._group_name(version_key, field), field.regex))
+        pieces.append(re.escape(self._literals[-1]))
+        return "".join(pieces)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns function which builds sort key from match object of the regex.
+    ## Invalid dates raise ValueError.
+    ##
+    ## @param version_key : <str> version group name.
+    ##
+    ## @return : <function> takes match object and returns <tuple> sort key.
+    def key_function(self, version_key):
+        groups = [self._group_name(version_key, field) for field in self._fields]
+
+        if all(field.kind == "int" for field in self._fields):
+            ## Common sizes are spelled out, which is faster than map().
+            if len(groups) == 1:
+                group = groups[0]
+                return lambda mObj: (int(mObj.group(group)),)
+
+            if len(groups) == 2:
+                first, second = groups
+                return lambda mObj: (int(mObj.group(first)), int(mObj.group(second)))
+
+            if len(groups) == 3:
+                first, second, third = groups
+                return lambda mObj: (int(mObj.group(first)), int(mObj.group(second)), int(mObj.group(third)))
+
+            return lambda mObj: tuple(map(int, mObj.group(*groups)))
+
+        converters = [self._converter(field) for field in self._fields]
+
+        def key(mObj):
+            return tuple([convert(mObj.group(group)) for convert, group in zip(converters, groups)])
+
+        return key
+
+
+    #---------------------------------------------------------------------------
+    ## Returns sort key of version name.
+    ##
+    ## @param version_name : <str> version name like 'v2.10.3'.
+    ##
+    ## @return : <tuple> sort key.
+    def parse(self, version_name):
+        mObj = self._name_regex.match(version_name)
+        if mObj is None:
+            raise ValueError("Version name does not fit the scheme %r: %r" % (self._template, version_name))
+
+        return self._parse_key(mObj)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns version name of sort key.
+    ##
+    ## @param key : <tuple> sort key.
+    ##
+    ## @return : <str> version name.
+    def format(self, key):
+        pieces = []
+        for literal, field, value in zip(self._literals, self._fields, key):
+            pieces.append(literal)
+            if field.kind == "int":
+                pieces.append(str(value).zfill(field.width))
+            elif field.kind == "date":
+                date = datetime.datetime.fromordinal(value // 86400) + datetime.timedelta(seconds = value % 86400)
+                pieces.append(date.strftime(field.format))
+            else:
+                pieces.append(value)
+        pieces.append(self._literals[-1])
+        return "".join(pieces)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns sort key of the first version. Int fields have their start
+    ## value and date fields have today's date.
+    ##
+    ## @return : <tuple> sort key.
+    def initial(self):
+        values = []
+        for field in self._fields:
+            if field.kind == "text":
+                raise ValueError("Text field '%s' has no initial value." % field.name)
+            values.append(self._reset_value(field))
+
+        return tuple(values)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns sort key of the version after the given one. The int field is
+    ## increased, or the date field gets today's date, and the int fields after
+    ## it are reset to their start value.
+    ##
+    ## @param key : <tuple> sort key, or None type for the first version.
+    ##
+    ## @param field : <str> name of the field to bump. None bumps the last int
+    ##               field.
+    ##
+    ## @param steps : <int> number of versions to advance int fields.
+    ##
+    ## @return : <tuple> sort key.
+    def bump(self, key, field = None, steps = 1):
+        index = self._bump_index(field)
+        if key is None:
+            return self.initial()
+
+        if steps == 0:
+            return tuple(key)
+
+        values = list(key)
+        bumped = self._fields[index]
+        if bumped.kind == "int":
+            values[index] += steps
+
+        else:
+            today = self._reset_value(bumped)
+            if today <= values[index]:
+                raise ValueError("Date field '%s' can not be bumped past %s." %
+                                 (bumped.name, self.format(key)))
+            values[index] = today
+
+        for later in range(index + 1, len(values)):
+            if self._fields[later].kind == "int":
+                values[later] = self._fields[later].start
+
+        return tuple(values)
+
+
+    def _bump_index(self, field):
+        kinds = [item.kind for item in self._fields]
+        if field is None:
+            for kind in ("int", "date"):
+                if kind in kinds:
+                    return len(kinds) - 1 - kinds[::-1].index(kind)
+
+            raise ValueError("Version scheme %r has no field to bump." % self._template)
+
+        names = self.field_names
+        if field not in names:
+            raise ValueError("Unknown field of version scheme %r: %r" % (self._template, field))
+
+        index = names.index(field)
+        if kinds[index] == "text":
+            raise ValueError("Text field '%s' can not be bumped." % field)
+
+        return index
+
+
+    def _reset_value(self, field):
+        if field.kind == "date":
+            return self._converter(field)(datetime.datetime.now().strftime(field.format))
+
+        return field.start
+
+
+    def _make_field(self, name, kind, option):
+        kind = kind or "int"
+        if kind == "int":
+            width, start = 0, 0
+            if option:
+                values = option.split(":")
+                width = int(values[0] or 0)
+                if len(values) > 1:
+                    start = int(values[1])
+            regex = r"\d{%d}" % width if width else r"\d+"
+            return _SchemeField(name, kind, regex, width, start, None)
+
+        if kind == "date":
+            date_format = option or "%Y%m%d"
+            regex = re.sub("%(.)", lambda mObj: self._date_directive(date_format, mObj.group(1)),
+                           re.escape(date_format).replace("\\%", "%"))
+            return _SchemeField(name, kind, regex, 0, None, date_format)
+
+        return _SchemeField(name, kind, option or "[A-Za-z]+", 0, None, None)
+
+
+    def _date_directive(self, date_format, directive):
+        regex = self.kDateDirectives.get(directive)
+        if regex is None:
+            raise ValueError("Unsupported date directive %%%s in %r" % (directive, date_format))
+
+        return regex
+
+
+    def _converter(self, field):
+        if field.kind == "int":
+            return int
+
+        if field.kind == "text":
+            return lambda text: text
+
+        ## Few distinct dates appear in a listing, so parsed dates are memoized.
+        date_format = field.format
+        memo = {}
+
+        def convert(text):
+            value = memo.get(text)
+            if value is None:
+                date = datetime.datetime.strptime(text, date_format)
+                value = date.toordinal() * 86400 + date.hour * 3600 + date.minute * 60 + date.second
+                if len(memo) < 4096:
+                    memo[text] = value
+
+            return value
+
+        return convert
+
+
+    @staticmethod
+    def _group_name(version_key, field):
+        return "%s__%s" % (version_key, field.name)
+
+
+
+class Profile(object):
+    """Profile collects instrumentation events of the thread which entered it.
+    Use it with the 'with' statement, and read counters and timers afterwards.
+    So for example...
+    with Versionist.profile() as profile:
+        vernist.get_latest_name()
+    print(profile.counters["regex"], profile.timers["listing"])
+    Events are listed in Versionist.add_hook.
+    """
+
+    def __init__(self):
+        super(Profile, self).__init__()
+        self.counters = collections.defaultdict(int)
+        self.timers = collections.defaultdict(float)
+        self._thread = None
+
+
+    def __enter__(self):
+        self._thread = threading.current_thread()
+        Versionist.add_hook(self)
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        Versionist.remove_hook(self)
+        self._thread = None
+        return False
+
+
+    def __call__(self, event, count, seconds):
+        if threading.current_thread() is not self._thread:
+            return
+
+        self.counters[event] += count
+        if seconds is not None:
+            self.timers[event] += seconds
+
+
+    def __repr__(self):
+        return "Profile(counters=%r, timers=%r)" % (dict(self.counters), dict(self.timers))
+
+
+
+class Versionist(object):
+    """Versionist class explores given name strings and detect latest or next
+    version information.
+    In order to find version token from the given names, this class uses regular
+    expression.
+    The regrex should have version group, which has name of 'VERSION_KEY';
+    the default value is 'version', but the group can be simply written with 
+    version token like '<VERSION_KEY>'. So for example...
+    cKTS_(?P<version>v\d{3}).ma can be cKTS_<version>.ma
+    The regrex for version token automatically generated with padding and prefix
+    parameters.
+    """
+
+    VERSION_KEY = "version"
+    kMatchType = "match"
+    kSearchType = "search"
+    kParallelThreshold = 200000
+    kBackendPython = "python"
+    kBackendNumpy = "numpy"
+
+
+    #---------------------------------------------------------------------------
+    ## Set version group name. Called on the class, this changes the default
+    ## key of all instances which do not have their own key. Called on an
+    ## instance, this changes the key of the instance only.
+    ##
+    ## @param version_key : <str> version group name.
+    @_classOrInstanceMethod
+    def set_version_key(target, version_key):
+        if not isinstance(version_key, _string_types):
+            raise ValueError("Version key should be string type")
+
+        if isinstance(target, type):
+            target.VERSION_KEY = version_key
+
+        else:
+            target._version_key = version_key
+            target._invalidate()
+
+
+    #---------------------------------------------------------------------------
+    ## Returns statistics of the compiled pattern cache shared by all instances.
+    ##
+    ## @return : <CacheInfo> hits, misses, evictions, maxsize and currsize.
+    @staticmethod
+    def pattern_cache_info():
+        return _PATTERN_CACHE.info()
+
+
+    #---------------------------------------------------------------------------
+    ## Clears the compiled pattern cache and its statistics.
+    @staticmethod
+    def clear_pattern_cache():
+        _PATTERN_CACHE.clear()
+
+
+    #---------------------------------------------------------------------------
+    ## Set the number of compiled patterns kept in the shared cache.
+    ##
+    ## @param maxsize : <int> maximum number of cached patterns.
+    @staticmethod
+    def set_pattern_cache_size(maxsize):
+        _PATTERN_CACHE.set_maxsize(maxsize)
+
+
+    #---------------------------------------------------------------------------
+    ## Registers instrumentation hook. The hook is called from the thread which
+    ## does the work, as hook(event, count, seconds). Events are...
+    ## pattern_compile, pattern_cache_hit : compiled pattern cache.
+    ## scan, targets, regex, matches : scans of targets, with the number of
+    ##     names, regular expression evaluations and matches.
+    ## latest_cache_hit : memoized latest version was used.
+    ## listing, listing_entries, type_check : directory listings, with the
+    ##     number of entries and file type checks of accepted names. scandir
+    ##     usually answers type checks without a stat call.
+    ## listing_cache_hit, listing_cache_miss : shared listing cache.
+    ## seconds is given for pattern_compile, scan and listing, and None for
+    ## others. While no hook is registered nothing is measured.
+    ##
+    ## @param hook : <function> callable which takes event, count and seconds.
+    @staticmethod
+    def add_hook(hook):
+        global _HOOKS
+        with _HOOKS_LOCK:
+            _HOOKS = _HOOKS + (hook,)
+
+
+    #---------------------------------------------------------------------------
+    ## Unregisters instrumentation hook.
+    ##
+    ## @param hook : <function> registered hook.
+    @staticmethod
+    def remove_hook(hook):
+        global _HOOKS
+        with _HOOKS_LOCK:
+            hooks = list(_HOOKS)
+            if hook in hooks:
+                hooks.remove(hook)
+            _HOOKS = tuple(hooks)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns context manager which collects the events of the calling thread.
+    ##
+    ## @return : <Profile> profile.
+    @staticmethod
+    def profile():
+        return Profile()
+
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of Versionist.
+    ##
+    ## @param targets : <iterable> of string names. See set_targets.
+    ##
+    ## @param name_pattern : <str> regular expression to match targets
+    ##
+    ## @param padding : <int> padding number of version.
+    ##                This is used version token regrex replacement.
+    ##
+    ## @param prefix : <str> version string's prefix. This can be empty string.
+    ##
+    ## @param initial_number : <int> first number of version.
+    ##
+    ## @param match_type : <str> match type. This is used to decide regrex
+    ##                    matching process.
+    ##
+    ## @param version_key : <str> version group name of this instance.
+    ##                     None follows the class wide VERSION_KEY.
+    ##
+    ## @param version_scheme : <VersionScheme> or <str> template of version
+    ##                        names with several fields. See set_version_scheme.
+    def __init__(self, targets,
+                       name_pattern,
+                       padding = 3,
+                       prefix = "v",
+                       initial_number = 1,
+                       match_type = kMatchType,  ## 'match' or 'search'
+                       version_key = None,
+                       version_scheme = None
+                       ):
+        super(Versionist, self).__init__()
+        if version_key is not None and not isinstance(version_key, _string_types):
+            raise ValueError("Version key should be string type")
+
+        self._targets = targets
+        self._name_pattern = name_pattern
+        self._padding = padding
+        self._prefix = prefix
+        self._initial_number = initial_number
+        self._match_type = match_type
+        self._version_key = version_key
+        self._targets_consumed = False
+        self._latest_version = None
+        self._latest_version_key = None
+        self._history = None
+        self._history_key = None
+        self._workers = None
+        self._parallel_threshold = None
+        self._backend = self.kBackendPython
+        self._version_scheme = self._as_version_scheme(version_scheme)
+
+
+    #---------------------------------------------------------------------------
+    ## Set new targets. This should be used when the instance is shared for
+    ## several targets.
+    ## Targets can be any iterable. A one-shot iterator, like a generator or
+    ## os.scandir iterator, is scanned with constant memory but only once; set
+    ## new targets when the settings are changed after the scan.
+    ##
+    ## @ param targets : <iterable> of target string names or directory entries.
+    ##
+    def set_targets(self, targets):
+        self._targets = targets
+        self._targets_consumed = False
+        self._invalidate()
+
+
+    #---------------------------------------------------------------------------
+    ## Set new name pattern.
+    ##
+    ## @param name_pattern : <str> regular expression to match targets
+    def set_name_pattern(self, name_pattern):
+        self._name_pattern = name_pattern
+        self._invalidate()
+
+
+    #---------------------------------------------------------------------------
+    ## Set new padding number of version.
+    ##
+    ## @param padding : <int> padding number of version.
+    def set_padding(self, padding):
+        self._padding = padding
+        self._invalidate()
+
+
+    #---------------------------------------------------------------------------
+    ## Set new version string's prefix.
+    ##
+    ## @param prefix : <str> version string's prefix. This can be empty string.
+    def set_prefix(self, prefix):
+        self._prefix = prefix
+        self._invalidate()
+
+
+    #---------------------------------------------------------------------------
+    ## Set new first number of version.
+    ##
+    ## @param initial_number : <int> first number of version.
+    def set_initial_number(self, initial_number):
+        self._initial_number = initial_number
+        self._invalidate()
+
+
+    #---------------------------------------------------------------------------
+    ## Set new match type.
+    ##
+    ## @param match_type : <str> 'match' or 'search'
+    def set_match_type(self, match_type):
+        self._match_type = match_type
+        self._invalidate()
+
+
+    #---------------------------------------------------------------------------
+    ## Set version scheme. With a scheme, the version token of the name pattern
+    ## matches version names of the scheme instead of prefix and padded number,
+    ## and version numbers are tuple sort keys. Prefix, padding and initial
+    ## number are not used.
+    ##
+    ## @param version_scheme : <VersionScheme> or <str> template like
+    ##                        'v<major:int>.<minor:int>'. None uses single
+    ##                        version number.
+    def set_version_scheme(self, version_scheme):
+        self._version_scheme = self._as_version_scheme(version_scheme)
+        self._invalidate()
+
+
+    @staticmethod
+    def _as_version_scheme(version_scheme):
+        if version_scheme is None or isinstance(version_scheme, VersionScheme):
+            return version_scheme
+
+        return VersionScheme(version_scheme)
+
+
+    #---------------------------------------------------------------------------
+    ## Enables scans in worker processes. Targets are split into one shard per
+    ## worker, and the results of the shards are reduced in the order of the
+    ## targets, so the result is the same as the serial scan. Only targets with
+    ## length, like lists, are split.
+    ##
+    ## @param workers : <int> number of worker processes. None or 1 scans serially.
+    ##
+    ## @param threshold : <int> targets smaller than this are scanned serially.
+    ##                   None uses kParallelThreshold of the class.
+    def set_parallel(self, workers, threshold = None):
+        self._workers = workers
+        self._parallel_threshold = threshold
+
+
+    #---------------------------------------------------------------------------
+    ## Set scan backend. The NumPy backend finds versions of target lists with
+    ## array operations when the pattern is literal text around the version
+    ## token, like '^dog_<version>\\.ma$'. Other patterns and targets use the
+    ## regular expression scan.
+    ##
+    ## @param backend : <str> 'python' or 'numpy'
+    def set_backend(self, backend):
+        if backend not in (self.kBackendPython, self.kBackendNumpy):
+            raise ValueError("Unknown backend: %r" % (backend,))
+
+        if backend == self.kBackendNumpy and _numpy is None:
+            raise ImportError("NumPy backend needs numpy module.")
+
+        self._backend = backend
+        self._invalidate()
+
+
+    #---------------------------------------------------------------------------
+    ## Finds versions of the targets with the NumPy backend.
+    ##
+    ## @param targets : <iterable> of names or directory entries.
+    ##
+    ## @return : <tuple> result of _vector_versions(), or None type when the
+    ##           targets or the pattern do not fit the backend.
+    def _vector_scan(self, targets):
+        if self._backend != self.kBackendNumpy or not isinstance(targets, (list, tuple)):
+            return None
+
+        if not targets or not isinstance(targets[0], _string_types + (bytes,)) or self._version_scheme is not None:
+            return None
+
+        compiled = self._compile_pattern()
+        version_key = self.get_version_key()
+        layout = compiled.fixed_width_layout(version_key, self._prefix)
+        if layout is None:
+            return None
+
+        return _vector_versions(targets, layout, compiled, version_key, self._prefix, self._initial_number)
+
+
+    #---------------------------------------------------------------------------
+    ## Builds version object of a name found by the NumPy backend.
+    ##
+    ## @param targets : <list> of names.
+    ##
+    ## @param index : <int> index of the name.
+    ##
+    ## @param num : <int> version number.
+    ##
+    ## @return : <VersionObj> version information
+    def _vector_version(self, targets, index, num):
+        head, group_start, digits, _, _ = self._compile_pattern().fixed_width_layout(self.get_version_key(), self._prefix)
+        name = targets[index]
+        return VersionObj(verNum=int(num), verName=name[group_start:len(head) + digits], name=name)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns the number of worker processes for the scan of the given size.
+    ##
+    ## @param size : <int> size of the scan.
+    ##
+    ## @return : <int> number of worker processes, or 0 for the serial scan.
+    def _parallel_workers(self, size):
+        workers = self._workers
+        if not workers or workers < 2:
+            return 0
+
+        threshold = self._parallel_threshold
+        if threshold is None:
+            threshold = self.kParallelThreshold
+
+        if size < threshold:
+            return 0
+
+        return workers
+
+
+    #---------------------------------------------------------------------------
+    ## Returns shards of names for worker processes, or None type when the scan
+    ## of the targets stays serial.
+    ##
+    ## @param targets : <iterable> of names or directory entries.
+    ##
+    ## @return : <list> of name lists.
+    def _shard_targets(self, targets):
+        if iter(targets) is targets or not hasattr(targets, "__len__"):
+            return None
+
+        workers = self._parallel_workers(len(targets))
+        if not workers:
+            return None
+
+        names = list(_iter_target_names(targets))
+        size = -(-len(names) // workers)
+        return [names[index:index + size] for index in range(0, len(names), size)]
+
+
+    #---------------------------------------------------------------------------
+    ## Discard the memoized scan result. The next getter scans the targets
+    ## again. This is needed when the targets list is modified in place.
+    def refresh(self):
+        self._invalidate()
+
+
+    #---------------------------------------------------------------------------
+    ## Drop the memoized latest version.
+    def _invalidate(self):
+        self._latest_version = None
+        self._latest_version_key = None
+        self._history = None
+        self._history_key = None
+
+
+    #---------------------------------------------------------------------------
+    ## Returns version group name used by this instance.
+    ##
+    ## @return : <str> version group name.
+    def get_version_key(self):
+        if self._version_key is not None:
+            return self._version_key
+
+        return self.VERSION_KEY
+
+
+    #---------------------------------------------------------------------------
+    ## Convert name pattern. If the given string containts version token,
+    ## it is replaced at here.
+    ##
+    ## @return : <str> actual regular expression pattern.
+    def _format_pattern(self):
+        return _format_name_pattern(self._name_pattern, self.get_version_key(), self._prefix, self._padding)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns compiled name pattern from the shared pattern cache.
+    ##
+    ## @return : <_sre.SRE_Pattern> compiled regular expression.
+    def _compile_pattern(self):
+        return _compile_name_pattern(*self._pattern_signature())
+
+
+    #---------------------------------------------------------------------------
+    ## Returns the settings which decide the compiled pattern.
+    ##
+    ## @return : <tuple> pattern, prefix, padding, version key, match type and
+    ##           template of version scheme.
+    def _pattern_signature(self):
+        version_scheme = self._version_scheme
+        return (self._name_pattern,
+                self._prefix,
+                self._padding,
+                self.get_version_key(),
+                self._match_type,
+                version_scheme.template if version_scheme is not None else None)
+
+
+#-------------------------------------------------------------------------------
+# These methods might not be useful because it needs first version at least in the targets.
+#
+#     def getNextVersionFilePath(self):
+#         nextFile = self.getNextVersionFile()
+#         if nextFile is None:
+#             return None
+#
+#         return os.path.join(self._directory, nextFile)
+#
+#
+#     def getNextVersionFile(self):
+#         versionInfo = self._get_latest_version()
+#         versionFile = versionInfo.get("fileName")
+#         versionName = versionInfo.get("versionName")
+#         if versionFile is None or versionName is None:
+#             return None
+#
+#         nextName = versionFile.replace(versionName, self.get_next_version_name())
+#         return nextName
+
+
+    #---------------------------------------------------------------------------
+    ## Returns next version name. If no version exists, returns initial version name.
+    ##
+    ## @param field : <str> field of the version scheme to bump. None bumps
+    ##               the last int field.
+    ##
+    ## @return : <str> next version name
+    def get_next_version_name(self, field = None):
+        next_number = self.get_next_version_num(field)
+        return self._format_version(next_number)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns next version number. If no version exists, returns initial number.
+    ##
+    ## @param field : <str> field of the version scheme to bump. None bumps
+    ##               the last int field.
+    ##
+    ## @return : <int> next version number, or <tuple> sort key with version scheme.
+    def get_next_version_num(self, field = None):
+        if self._version_scheme is not None:
+            return self._version_scheme.bump(self.get_latest_version_num(), field)
+
+        if field is not None:
+            raise ValueError("Fields can be bumped only with version scheme.")
+
+        latest_num = self.get_latest_version_num()
+        if not isinstance(latest_num, int):
+            return self._initial_number
+
+        nextNum = latest_num + 1
+        return nextNum
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version name. If no version exists, returns None type.
+    ##
+    ## @return : <str> latest version name
+    def get_latest_version_name(self):
+        ver_obj = self._get_latest_version()
+        return ver_obj.versionName
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version number. If no version exists, returns None type.
+    ##
+    ## @return : <int> latest version number, or <tuple> sort key with version scheme.
+    def get_latest_version_num(self):
+        ver_obj = self._get_latest_version()
+        return ver_obj.versionNum
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version's string. If no version exists, returns None type.
+    ##
+    ## @return : <str> latest string
+    def get_latest_name(self):
+        ver_obj = self._get_latest_version()
+        return ver_obj.name
+
+
+    #---------------------------------------------------------------------------
+    ## Returns version name of the version number.
+    ##
+    ## @param num : <int> version number, or <tuple> sort key with version scheme.
+    ##
+    ## @return : <str> version name
+    def _format_version(self, num):
+        if self._version_scheme is not None:
+            return self._version_scheme.format(num)
+
+        return "%s%s" % (self._prefix, str(num).zfill(self._padding))
+
+
+    #---------------------------------------------------------------------------
+    ## Returns version number the steps after the version number.
+    ##
+    ## @param num : <int> version number, or <tuple> sort key with version scheme.
+    ##
+    ## @param steps : <int> number of versions.
+    ##
+    ## @return : <int> version number, or <tuple> sort key with version scheme.
+    def _version_after(self, num, steps):
+        if self._version_scheme is not None:
+            return self._version_scheme.bump(num, steps = steps)
+
+        return num + steps
+
+
+    #---------------------------------------------------------------------------
+    ## Returns all versions found in the targets as sorted history. Versions
+    ## below the initial number are ignored like the latest version does.
+    ## The history is memoized like the latest version.
+    ##
+    ## @return : <VersionHistory> version history
+    def get_history(self):
+        version_key = self.get_version_key()
+        if self._history is None or self._history_key != version_key:
+            self._history = self._scan_history()
+            self._history_key = version_key
+
+        return self._history
+
+
+    #---------------------------------------------------------------------------
+    ## Scans all targets and builds version history.
+    ##
+    ## @return : <VersionHistory> version history
+    def _scan_history(self):
+        targets = self._targets
+        if self._targets_consumed:
+            raise RuntimeError("One-shot targets were already scanned. Set new targets.")
+
+        if iter(targets) is targets:
+            self._targets_consumed = True
+
+        shards = self._shard_targets(targets)
+        if shards is not None:
+            args = [(shard, self._pattern_signature(), self._initial_number, True) for shard in shards]
+            results = _process_map(_scan_names_shard, args, len(shards))
+            versions = (VersionObj(verNum=num, verName=version_name, name=name)
+                        for num, version_name, name in itertools.chain.from_iterable(results))
+            return VersionHistory(versions, prefix = self._prefix, version_scheme = self._version_scheme)
+
+        return VersionHistory(self._iter_versions(targets), prefix = self._prefix, version_scheme = self._version_scheme)
+
+
+    #---------------------------------------------------------------------------
+    ## Yields version objects of the names which match.
+    ##
+    ## @param targets : <iterable> of names or directory entries.
+    ##
+    ## @return : <generator> of VersionObj
+    def _iter_versions(self, targets):
+        vector = self._vector_scan(targets)
+        if vector is not None:
+            indices, nums = vector
+            order = _numpy.argsort(nums, kind = "stable")
+            head, group_start, digits, _, _ = self._compile_pattern().fixed_width_layout(self.get_version_key(), self._prefix)
+            group_end = len(head) + digits
+            for index, num in zip(indices[order].tolist(), nums[order].tolist()):
+                name = targets[index]
+                yield VersionObj(verNum=num, verName=name[group_start:group_end], name=name)
+            return
+
+        compiled = self._compile_pattern()
+        version_key = self.get_version_key()
+        prefix = self._prefix
+        min_version = self._initial_number
+
+        if compiled.version_scheme is not None:
+            for ver_obj in self._iter_scheme_versions(compiled, version_key, targets):
+                yield ver_obj
+            return
+
+        for name, mObj in compiled.iter_matches(_iter_target_names(targets)):
+            version_name = mObj.group(version_key)
+            version_num = int(version_name.replace(prefix, ""))
+
+            if version_num >= min_version:
+                yield VersionObj(verNum=version_num, verName=version_name, name=name)
+
+
+    #---------------------------------------------------------------------------
+    ## Yields version objects of the names which match, with sort keys of the
+    ## version scheme as version numbers. Names of invalid dates are skipped.
+    ##
+    ## @param compiled : <_NamePattern> compiled name pattern with version scheme.
+    ##
+    ## @param version_key : <str> version group name.
+    ##
+    ## @param targets : <iterable> of names or directory entries.
+    ##
+    ## @return : <generator> of VersionObj
+    def _iter_scheme_versions(self, compiled, version_key, targets):
+        key_of = compiled.version_scheme.key_function(version_key)
+
+        for name, mObj in compiled.iter_matches(_iter_target_names(targets)):
+            try:
+                key = key_of(mObj)
+            except ValueError:
+                continue
+
+            yield VersionObj(verNum=key, verName=mObj.group(version_key), name=name)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version object. The scan result is memoized until the
+    ## targets or the pattern settings are changed, or refresh() is called.
+    ##
+    ## @return : <VersionObj> latest version information
+    def _get_latest_version(self):
+        version_key = self.get_version_key()
+        if self._latest_version is None or self._latest_version_key != version_key:
+            self._latest_version = self._scan_latest_version()
+            self._latest_version_key = version_key
+
+        elif _HOOKS:
+            _emit("latest_cache_hit")
+
+        return self._latest_version
+
+
+    #---------------------------------------------------------------------------
+    ## Scans all targets and finds latest version.
+    ##
+    ## @return : <VersionObj> latest version information
+    def _scan_latest_version(self):
+        targets = self._targets
+        if self._targets_consumed:
+            raise RuntimeError("One-shot targets were already scanned. Set new targets.")
+
+        if iter(targets) is targets:
+            self._targets_consumed = True
+
+        shards = self._shard_targets(targets)
+        if shards is not None:
+            args = [(shard, self._pattern_signature(), self._initial_number, False) for shard in shards]
+            latest = None
+            for ver_obj in _process_map(_scan_names_shard, args, len(shards)):
+                if ver_obj.name is not None and (latest is None or ver_obj.versionNum > latest.versionNum):
+                    latest = ver_obj
+
+            return latest or self._scan_latest(())
+
+        return self._scan_latest(targets)
+
+
+    #---------------------------------------------------------------------------
+    ## Scans given names and finds latest version. Only the latest match is
+    ## kept, so any iterable is scanned with constant memory.
+    ##
+    ## @param targets : <iterable> of names or directory entries.
+    ##
+    ## @return : <VersionObj> latest version information
+    def _scan_latest(self, targets):
+        vector = self._vector_scan(targets)
+        if vector is not None:
+            indices, nums = vector
+            if not len(indices):
+                return self._scan_latest(())
+
+            position = _numpy.argmax(nums)
+            return self._vector_version(targets, indices[position], nums[position])
+
+        compiled = self._compile_pattern()
+        version_key = self.get_version_key()
+
+        version_scheme = compiled.version_scheme
+        if version_scheme is not None and version_scheme.lexical:
+            max_version_name = ""
+            max_name = None
+
+            for name, mObj in compiled.iter_matches(_iter_target_names(targets)):
+                version_name = mObj.group(version_key)
+                if version_name > max_version_name:
+                    max_version_name = version_name
+                    max_name = name
+
+            if max_name is None:
+                return VersionObj()
+
+            return VersionObj(verNum=version_scheme.parse(max_version_name), verName=max_version_name, name=max_name)
+
+        if version_scheme is not None:
+            key_of = version_scheme.key_function(version_key)
+            ## Empty tuple is ordered before any sort key.
+            max_key = ()
+            max_match = None
+
+            for name, mObj in compiled.iter_matches(_iter_target_names(targets)):
+                try:
+                    key = key_of(mObj)
+                except ValueError:
+                    continue
+
+                if key > max_key:
+                    max_key = key
+                    max_match = (name, mObj)
+
+            if max_match is None:
+                return VersionObj()
+
+            return VersionObj(verNum=max_key, verName=max_match[1].group(version_key), name=max_match[0])
+
+        max_version = self._initial_number -1
+        max_version_name = None
+        max_name = None
+
+        for name, mObj in compiled.iter_matches(_iter_target_names(targets)):
+
+            version_name = mObj.group(version_key)
+            version_num = int(version_name.replace(self._prefix, ""))
+
+            if version_num > max_version:
+                max_version = version_num
+                max_version_name = version_name
+                max_name = name
+
+        if max_version == -1:
+            return VersionObj()
+
+        else:
+            return VersionObj(verNum=max_version, verName=max_version_name, name=max_name)
+
+
+
+class FileVersionist(Versionist):
+    """FileVersionist class explores given directory and detect latest or next
+    version information.
+    In order to find version token from the given names, this class uses regular
+    expression.
+    The regrex should have version group, which has name of VERSION_KEY, but the
+    group can be simply written with version token like '<VERSION_KEY>'.
+    So for example...
+    cKTS_(?P<version>v\d{3}).ma can be cKTS_<version>.ma
+    The regrex for version token automatically generated with padding and prefix
+    parameters.
+    """
+
+    kTargetFile = "file"
+    kTargetDir = "dir"
+    kTargetBoth = "both"
+    kReserveAttempts = 100
+    kReserveRelistInterval = 8
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of FileVersionist.
+    ##
+    ## @param directory : <str> Directory which containts target file names
+    ##
+    ## @param name_pattern : <str> regular expression to match targets
+    ##
+    ## @param padding : <int> padding number of version.
+    ##                This is used version token regrex replacement.
+    ##
+    ## @param prefix : <str> version string's prefix. This can be empty string.
+    ##
+    ## @param initial_number : <int> first number of version.
+    ##
+    ## @param match_type : <str> match type. This is used to decide regrex
+    ##                    matching process.
+    ##
+    ## @param target_type : <str> This affects how to obtain target names from
+    ##                     specified directory. You can choose ""file", "dir" or "both".
+    ##
+    ## @param version_key : <str> version group name of this instance.
+    ##                     None follows the class wide VERSION_KEY.
+    ##
+    ## @param streaming : <bool> True does not hold the directory listing.
+    ##                   The directory is streamed through the scan whenever
+    ##                   the memoized result is invalidated, with constant memory.
+    ##
+    ## @param persistent_index : <PersistentIndex> on-disk index of parsed
+    ##                          versions. Lookups are answered from the index
+    ##                          while the directory is unchanged.
+    ##
+    ## @param listing_backend : <ListingBackend> lists the directory. None
+    ##                         lists the local file system.
+    ##
+    ## @param version_scheme : <VersionScheme> or <str> template of version
+    ##                        names with several fields.
+    ##
+    def __init__(self, directory = None,
+                       name_pattern = None,
+                       padding = 3,
+                       prefix = "v",
+                       initial_number = 1,
+                       match_type = Versionist.kMatchType,
+                       target_type = kTargetFile, ## 'file', 'dir' or 'both'
+                       version_key = None,
+                       streaming = False,
+                       persistent_index = None,
+                       listing_backend = None,
+                       version_scheme = None
+                       ):
+        super(FileVersionist, self).__init__(targets = [],
+                                             name_pattern = name_pattern,
+                                             padding = padding,
+                                             prefix = prefix,
+                                             initial_number = initial_number,
+                                             match_type = match_type,
+                                             version_key = version_key,
+                                             version_scheme = version_scheme)
+        self._directory = directory
+        self._target_type = target_type
+        self._listing_signature = None
+        self._listing_entry = None
+        self._watcher = None
+        self._live_state = None
+        self._streaming = streaming
+        self._persistent_index = persistent_index
+        self._reserve_cursor = None
+        self._listing_backend = listing_backend if listing_backend is not None else _LOCAL_LISTING_BACKEND
+
+        if persistent_index is not None:
+            self._require_local_backend("Persistent index")
+
+        if self._directory is not None and not self._lazy_listing():
+            targets = self._find_targets()
+            self.set_targets(targets)
+
+
+    #---------------------------------------------------------------------------
+    ## Enables the process wide directory listing cache. FileVersionist
+    ## instances for the same directory and target type share the listing and
+    ## the scan results computed from it.
+    ##
+    ## @param maxsize : <int> maximum number of cached directories.
+    ##
+    ## @param ttl : <float> seconds an entry is used without checking the
+    ##             directory. None validates entries with the directory's
+    ##             mtime and inode instead.
+    @staticmethod
+    def enable_listing_cache(maxsize = 1024, ttl = None):
+        global _LISTING_CACHE
+        _LISTING_CACHE = _ListingCache(maxsize = maxsize, ttl = ttl)
+
+
+    #---------------------------------------------------------------------------
+    ## Disables the directory listing cache and drops its entries.
+    @staticmethod
+    def disable_listing_cache():
+        global _LISTING_CACHE
+        _LISTING_CACHE = None
+
+
+    #---------------------------------------------------------------------------
+    ## Drops all entries of the directory listing cache.
+    @staticmethod
+    def clear_listing_cache():
+        if _LISTING_CACHE is not None:
+            _LISTING_CACHE.clear()
+
+
+    #---------------------------------------------------------------------------
+    ## Returns statistics of the directory listing cache.
+    ##
+    ## @return : <CacheInfo> hits, misses, evictions, maxsize and currsize.
+    ##           None when the cache is disabled.
+    @staticmethod
+    def listing_cache_info():
+        if _LISTING_CACHE is None:
+            return None
+
+        return _LISTING_CACHE.info()
+
+
+    #---------------------------------------------------------------------------
+    ## Finds latest version of many directories at once. Directories are listed
+    ## and scanned on a pool of threads, and results are yielded in order of
+    ## completion. A failure of one directory is reported in its result and
+    ## does not stop the others.
+    ##
+    ## @param directories : <list> of directory paths, or of (directory,
+    ##                     name_pattern) pairs.
+    ##
+    ## @param name_pattern : <str> regular expression used for the directories
+    ##                      given without their own pattern.
+    ##
+    ## @param max_workers : <int> number of threads.
+    ##
+    ## @param kwargs : other FileVersionist parameters such as padding, prefix
+    ##                or target_type.
+    ##
+    ## @return : <generator> of DirectoryResult.
+    @classmethod
+    def scan_directories(cls, directories, name_pattern = None, max_workers = 8, **kwargs):
+        tasks = _queue.Queue()
+        results = _queue.Queue()
+        cancelled = threading.Event()
+        count = 0
+
+        for item in directories:
+            tasks.put(item)
+            count += 1
+
+        def work():
+            while not cancelled.is_set():
+                try:
+                    item = tasks.get_nowait()
+                except _queue.Empty:
+                    return
+
+                ## Items which are not directories nor pairs are reported in
+                ## their result like other failures.
+                directory, pattern = item, name_pattern
+                try:
+                    if not isinstance(item, _string_types) and not hasattr(item, "__fspath__"):
+                        directory, pattern = item
+                    directory = _fspath(directory)
+
+                    vernist = cls(directory, pattern, **kwargs)
+                    version = vernist._get_latest_version()
+                    result = DirectoryResult(directory, pattern, version, vernist.get_latest_namePath(), None)
+
+                except Exception as e:
+                    result = DirectoryResult(directory, pattern, None, None, e)
+
+                results.put(result)
+
+        for _ in range(min(max(max_workers, 1), count)):
+            worker = threading.Thread(target = work)
+            worker.daemon = True
+            worker.start()
+
+        try:
+            for _ in range(count):
+                yield results.get()
+
+        finally:
+            cancelled.set()
+
+
+    #---------------------------------------------------------------------------
+    ## Explores the directory again and discards the memoized scan result.
+    def refresh(self):
+        if self._directory is None:
+            self._invalidate()
+            return
+
+        if self._watcher is not None:
+            self._watcher._resync(self)
+            return
+
+        if self._lazy_listing():
+            self._invalidate()
+            return
+
+        targets = self._find_targets()
+        self.set_targets(targets)
+
+
+    #---------------------------------------------------------------------------
+    ## Set directory to search versions. Internally this methods explors the target
+    ## directory and holds the strings found in there.
+    ##
+    ## @param directory : <str> target directory path to seach version files.
+    def set_directory(self, directory):
+        if self._switch_directory(directory):
+            return
+
+        if self._lazy_listing():
+            self._invalidate()
+            return
+
+        targets = self._find_targets()
+        self.set_targets(targets)
+
+
+    #---------------------------------------------------------------------------
+    ## Sets the directory without listing it. Versions reserved in the previous
+    ## directory do not carry over, and watch mode moves to the new directory.
+    ##
+    ## @param directory : <str> target directory path.
+    ##
+    ## @return : <bool> True when the instance is watched.
+    def _switch_directory(self, directory):
+        watcher = self._watcher
+        if watcher is not None:
+            ## Not unwatch(), which would list the old directory again.
+            watcher._remove(self)
+            self._watcher = None
+            self._live_state = None
+
+        self._directory = directory
+        self._reserve_cursor = None
+
+        if watcher is not None:
+            self.watch(watcher)
+            return True
+
+        return False
+
+
+    #---------------------------------------------------------------------------
+    ## Starts watch mode. The watcher keeps latest version of the directory up
+    ## to date from file system events, and getters answer from that state
+    ## without directory access.
+    ##
+    ## @param watcher : <VersionWatcher> watcher which observes the directory.
+    def watch(self, watcher):
+        if self._directory is None:
+            raise RuntimeError("Search target directory is not set.")
+
+        self._require_local_backend("Watch mode")
+
+        if self._watcher is not None:
+            self.unwatch()
+
+        watcher._add(self)
+        self._watcher = watcher
+
+
+    #---------------------------------------------------------------------------
+    ## Stops watch mode. The directory is listed again for later lookups.
+    def unwatch(self):
+        watcher = self._watcher
+        if watcher is None:
+            return
+
+        watcher._remove(self)
+        self._watcher = None
+        self._live_state = None
+        self.refresh()
+
+
+    #---------------------------------------------------------------------------
+    ## Depending on the target type, this method finds appropriate names.
+    ## Names which do not match the name pattern are dropped while listing,
+    ## so they never reach memory nor need a file type check.
+    ##
+    ## @return : <str> search target names.
+    def _find_targets(self):
+        if self._directory is None:
+            raise RuntimeError("Search target directory is not set.")
+
+        signature = self._pattern_signature()
+        targets, entry = self._fetch_targets(self._directory, signature, self._listing_filter())
+        self._listing_signature = signature
+        self._listing_entry = entry
+        return targets
+
+
+    #---------------------------------------------------------------------------
+    ## Lists target names of the directory, from the listing cache when it is
+    ## enabled. This does not change the instance, so it can run on a thread.
+    ##
+    ## @param directory : <str> directory path.
+    ##
+    ## @param signature : <tuple> pattern signature of the filter.
+    ##
+    ## @param accept : <function> match function or None.
+    ##
+    ## @return : <tuple> list of target names and listing cache entry.
+    def _fetch_targets(self, directory, signature, accept):
+        cache = _LISTING_CACHE
+        if cache is None or not self._listing_backend.kLocal:
+            return (self._list_directory(directory, accept), None)
+
+        entry = cache.fetch(directory, self._target_type, lambda: self._list_directory(directory))
+        targets = entry.filtered.get(signature)
+
+        if targets is None:
+            if accept is None:
+                targets = entry.names
+
+            else:
+                targets = [name for name in entry.names if accept(name) is not None]
+
+            entry.filtered[signature] = targets
+
+        return (targets, entry)
+
+
+    #---------------------------------------------------------------------------
+    ## Lists the directory. Missing directory gives empty list.
+    ##
+    ## @param directory : <str> directory path.
+    ##
+    ## @param accept : <function> match function or None.
+    ##
+    ## @return : <list> of target names.
+    def _list_directory(self, directory, accept = None):
+        return list(self._iter_directory(directory, accept))
+
+
+    #---------------------------------------------------------------------------
+    ## Yields target names of the directory one by one. Missing directory
+    ## yields nothing.
+    ##
+    ## @param directory : <str> directory path.
+    ##
+    ## @param accept : <function> match function or None.
+    ##
+    ## @return : <generator> of target names.
+    def _iter_directory(self, directory, accept = None):
+        prefix = self._listing_prefix(accept)
+        if _HOOKS:
+            return self._counted_directory(directory, accept, prefix)
+
+        return self._listing_backend.iter_names(directory, self._target_type, accept, prefix)
+
+
+    #---------------------------------------------------------------------------
+    ## Yields target names like _iter_directory() and reports the listing time,
+    ## the number of entries and the number of file type checks. A type check
+    ## is answered from the directory entry by scandir on most file systems,
+    ## so it is not a stat call. The time does not include the time the caller
+    ## spends between the names.
+    def _counted_directory(self, directory, accept, prefix):
+        counts = [0, 0]
+
+        def counted_accept(name):
+            counts[0] += 1
+            mObj = accept(name) if accept is not None else True
+            if mObj is not None:
+                counts[1] += 1
+            return mObj
+
+        names = self._listing_backend.iter_names(directory, self._target_type, counted_accept, prefix)
+        seconds = 0.0
+        try:
+            while True:
+                start = _timer()
+                try:
+                    name = next(names)
+                finally:
+                    seconds += _timer() - start
+                yield name
+
+        except StopIteration:
+            pass
+
+        finally:
+            _emit("listing", 1, seconds)
+            _emit("listing_entries", counts[0])
+            if self._target_type != self.kTargetBoth:
+                _emit("type_check", counts[1])
+
+
+    #---------------------------------------------------------------------------
+    ## Returns function which tells a name can match the name pattern.
+    ## When the pattern is not usable yet, names are not filtered.
+    ##
+    ## @return : <function> match function or None.
+    def _listing_filter(self):
+        if self._name_pattern is None:
+            return None
+
+        try:
+            compiled = self._compile_pattern()
+
+        except (VersionKeyError, RuntimeError, re.error):
+            return None
+
+        return compiled.accept
+
+
+    #---------------------------------------------------------------------------
+    ## Returns literal prefix every name accepted by the function starts with.
+    ## Listing backends can use it as a server side filter. The prefix is known
+    ## only for the filter of the instance's own name pattern.
+    ##
+    ## @param accept : <function> match function or None.
+    ##
+    ## @return : <str> literal prefix, or empty string.
+    def _listing_prefix(self, accept):
+        if accept is None or self._name_pattern is None:
+            return ""
+
+        try:
+            compiled = self._compile_pattern()
+
+        except (VersionKeyError, RuntimeError, re.error):
+            return ""
+
+        return compiled.prefix if compiled.accept is accept else ""
+
+
+    def _require_local_backend(self, feature):
+        if not self._listing_backend.kLocal:
+            raise RuntimeError("%s needs the local file system." % feature)
+
+
+    #---------------------------------------------------------------------------
+    ## Lists the directory again when the pattern settings were changed after
+    ## the listing, because the listing is filtered by the pattern.
+    ##
+    ## @return : <VersionObj> latest version information
+    def _get_latest_version(self):
+        state = self._current_live_state()
+        if state is not None:
+            return state.latest
+
+        self._sync_listing()
+        return super(FileVersionist, self)._get_latest_version()
+
+
+    #---------------------------------------------------------------------------
+    ## Returns all versions found in the directory as sorted history.
+    ##
+    ## @return : <VersionHistory> version history
+    def get_history(self):
+        state = self._current_live_state()
+        if state is not None:
+            return state.history
+
+        self._sync_listing()
+        return super(FileVersionist, self).get_history()
+
+
+    #---------------------------------------------------------------------------
+    ## Returns live state of watch mode, rebuilt when the pattern settings
+    ## were changed. Returns None type when the instance is not watched.
+    ##
+    ## @return : <_LiveVersionState> live state
+    def _current_live_state(self):
+        state = self._live_state
+        if state is not None and state.signature != self._scan_signature():
+            self._watcher._resync(self)
+            state = self._live_state
+
+        return state
+
+
+    #---------------------------------------------------------------------------
+    ## Lists the directory again when the pattern settings were changed after
+    ## the listing.
+    def _sync_listing(self):
+        if self._lazy_listing():
+            return
+
+        if self._directory is not None and self._listing_signature != self._pattern_signature():
+            self.set_targets(self._find_targets())
+
+
+    #---------------------------------------------------------------------------
+    ## Builds version history. In streaming mode the directory is streamed.
+    ##
+    ## @return : <VersionHistory> version history
+    def _scan_history(self):
+        if self._persistent_index is not None and self._directory is not None:
+            return self._indexed_history()
+
+        if self._streaming and self._directory is not None:
+            names = self._iter_directory(self._directory, self._listing_filter())
+            return VersionHistory(self._iter_versions(names), prefix = self._prefix, version_scheme = self._version_scheme)
+
+        return super(FileVersionist, self)._scan_history()
+
+
+    #---------------------------------------------------------------------------
+    ## Tells the directory is not listed until a lookup needs it.
+    ##
+    ## @return : <bool> True in streaming or persistent index mode.
+    def _lazy_listing(self):
+        return self._streaming or self._persistent_index is not None
+
+
+    #---------------------------------------------------------------------------
+    ## Returns version history from the persistent index. When the index does
+    ## not have valid data for the directory, the directory is scanned and the
+    ## result is written to the index.
+    ##
+    ## @return : <VersionHistory> version history
+    def _indexed_history(self):
+        index = self._persistent_index
+        directory = self._directory
+        signature = self._scan_signature()
+        stamp, mtime = _directory_stamp(directory)
+
+        history = index.load(directory, self._target_type, signature, stamp, prefix = self._prefix,
+                             version_scheme = self._version_scheme)
+        if history is not None:
+            return history
+
+        names = self._iter_directory(directory, self._listing_filter())
+        history = VersionHistory(self._iter_versions(names), prefix = self._prefix, version_scheme = self._version_scheme)
+
+        if mtime is not None and time.time() - mtime >= _ListingCache.kRacyWindow:
+            index.store(directory, self._target_type, signature, stamp, history)
+
+        return history
+
+
+    #---------------------------------------------------------------------------
+    ## Returns the settings a scan result depends on.
+    ##
+    ## @return : <tuple> pattern signature and initial number.
+    def _scan_signature(self):
+        return self._pattern_signature() + (self._initial_number,)
+
+
+    #---------------------------------------------------------------------------
+    ## Scans the targets. When the targets came from the listing cache, the scan
+    ## result is shared with other instances through the cache entry.
+    ##
+    ## @return : <VersionObj> latest version information
+    def _scan_latest_version(self):
+        if self._persistent_index is not None and self._directory is not None:
+            history = self.get_history()
+            return history.latest()
+
+        if self._streaming:
+            if self._directory is None:
+                return super(FileVersionist, self)._scan_latest_version()
+
+            return self._scan_latest(self._iter_directory(self._directory, self._listing_filter()))
+
+        entry = self._listing_entry
+        if entry is None or entry.filtered.get(self._listing_signature) is not self._targets:
+            return super(FileVersionist, self)._scan_latest_version()
+
+        key = self._listing_signature + (self._initial_number,)
+        ver_obj = entry.results.get(key)
+
+        if ver_obj is None:
+            ver_obj = super(FileVersionist, self)._scan_latest_version()
+            entry.results[key] = ver_obj
+
+        return ver_obj
+
+
+    #---------------------------------------------------------------------------
+    ## returns latest version file or directory's complete path.
+    ##
+    ## @return : <str> latest version path.
+    def get_latest_namePath(self):
+        latest_name = self.get_latest_name()
+        if latest_name is None:
+            return None
+
+        return os.path.join(self._directory, latest_name)
+
+
+    #---------------------------------------------------------------------------
+    ## Claims next version in the directory by creating its file or directory
+    ## exclusively, so concurrent publishers never get the same version.
+    ## When the name is already taken, the next version is tried, jumping
+    ## further ahead as conflicts repeat. After a run of conflicts the directory
+    ## is listed again and the next attempt jumps past the latest version found.
+    ##
+    ## @param name_template : <str> name of the new version with version token
+    ##                       like 'comp_<version>.nk'. None derives the name
+    ##                       from the latest version's name.
+    ##
+    ## @param max_attempts : <int> number of attempts before giving up.
+    ##
+    ## @return : <str> path of the reserved file or directory.
+    def reserve_next_version(self, name_template = None, max_attempts = kReserveAttempts):
+        return self.reserve_next_versions(1, name_template, max_attempts)[0]
+
+
+    #---------------------------------------------------------------------------
+    ## Claims consecutive versions in the directory. When any of them is
+    ## already taken, the ones created by this call are removed and all of them
+    ## are tried again past the conflict.
+    ##
+    ## @param count : <int> number of versions to reserve.
+    ##
+    ## @param name_template : <str> name of the new versions with version token.
+    ##                       None derives the name from the latest version's name.
+    ##
+    ## @param max_attempts : <int> number of attempts before giving up.
+    ##
+    ## @return : <list> paths of the reserved files or directories in version order.
+    def reserve_next_versions(self, count, name_template = None, max_attempts = kReserveAttempts):
+        if self._directory is None:
+            raise RuntimeError("Search target directory is not set.")
+
+        self._require_local_backend("Reservation")
+
+        if count < 1:
+            raise ValueError("count must be 1 or more.")
+
+        head, tail = self._reservation_template(name_template)
+        number = self.get_next_version_num()
+        if self._reserve_cursor is not None:
+            number = max(number, self._reserve_cursor)
+
+        conflicts = 0
+        for _ in range(max_attempts):
+            created = []
+            try:
+                for offset in range(count):
+                    version_name = self._format_version(self._version_after(number, offset))
+                    path = os.path.join(self._directory, head + version_name + tail)
+                    self._create_reserved(path)
+                    created.append(path)
+
+            except OSError as e:
+                for path in created:
+                    self._discard_reserved(path)
+
+                if e.errno != errno.EEXIST:
+                    raise
+
+                ## Publishers which keep losing the same version spread out over
+                ## the following versions, so they stop racing each other.
+                conflicts += 1
+                number = self._version_after(number, offset + 1 + random.randrange(1 << min(conflicts - 1, 6)))
+                if conflicts % self.kReserveRelistInterval == 0:
+                    self.refresh()
+                    number = max(number, self.get_next_version_num())
+                continue
+
+            self._reserve_cursor = self._version_after(number, count)
+            return created
+
+        raise RuntimeError("Could not reserve %d version(s) in %s after %d attempts." %
+                           (count, self._directory, max_attempts))
+
+
+    #---------------------------------------------------------------------------
+    ## Splits the name of new versions around the version.
+    ##
+    ## @param name_template : <str> name with version token, or None type.
+    ##
+    ## @return : <tuple> text before and after the version.
+    def _reservation_template(self, name_template):
+        if name_template is not None:
+            token = "<%s>" % self.get_version_key()
+            if name_template.count(token) != 1:
+                raise ValueError("name_template must have one %s token: %r" % (token, name_template))
+
+            head, tail = name_template.split(token)
+            return head, tail
+
+        latest_name = self.get_latest_name()
+        if latest_name is None:
+            raise ValueError("name_template is required when no version exists.")
+
+        mObj = self._compile_pattern().matchFunc(latest_name)
+        start, end = mObj.span(self.get_version_key())
+        return latest_name[:start], latest_name[end:]
+
+
+    def _create_reserved(self, path):
+        if self._target_type == self.kTargetDir:
+            os.mkdir(path)
+            return
+
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+
+
+    def _discard_reserved(self, path):
+        try:
+            if self._target_type == self.kTargetDir:
+                os.rmdir(path)
+            else:
+                os.remove(path)
+
+        except OSError:
+            pass
+
+
+    #---------------------------------------------------------------------------
+    ## Set the number of directory listings the asyncio API runs at the same
+    ## time. Listings already running are not affected.
+    ##
+    ## @param limit : <int> maximum number of concurrent listings.
+    @staticmethod
+    def set_max_concurrent_listings(limit):
+        global _ASYNC_EXECUTOR, _ASYNC_MAX_LISTINGS
+        with _ASYNC_LOCK:
+            _ASYNC_MAX_LISTINGS = max(int(limit), 1)
+            executor = _ASYNC_EXECUTOR
+            _ASYNC_EXECUTOR = None
+
+        if executor is not None:
+            executor.shutdown(wait = False)
+
+
+    #---------------------------------------------------------------------------
+    ## Lists the directory on the listing thread pool. Concurrent requests for
+    ## the same directory, target type, pattern and listing backend share one
+    ## listing.
+    ##
+    ## @return : <asyncio.Future> resolved with the target names.
+    def _find_targets_async(self):
+        loop = _current_event_loop()
+        directory = self._directory
+        if directory is None:
+            raise RuntimeError("Search target directory is not set.")
+
+        signature = self._pattern_signature()
+        inflight = _ASYNC_INFLIGHT.setdefault(loop, {})
+        key = (type(self), id(self._listing_backend), directory, self._target_type, signature)
+        listing = inflight.get(key)
+
+        if listing is None:
+            listing = loop.run_in_executor(_async_executor(),
+                                           self._fetch_targets,
+                                           directory,
+                                           signature,
+                                           self._listing_filter())
+            inflight[key] = listing
+
+            def forget(future):
+                if inflight.get(key) is future:
+                    del inflight[key]
+                if not inflight:
+                    _ASYNC_INFLIGHT.pop(loop, None)
+
+            listing.add_done_callback(forget)
+
+        result = loop.create_future()
+
+        def apply(future):
+            if result.cancelled():
+                return
+
+            if future.cancelled():
+                result.cancel()
+                return
+
+            exc = future.exception()
+            if exc is not None:
+                result.set_exception(exc)
+                return
+
+            targets, entry = future.result()
+            if self._directory == directory:
+                self.set_targets(targets)
+                self._listing_signature = signature
+                self._listing_entry = entry
+
+            result.set_result(targets)
+
+        listing.add_done_callback(apply)
+        return result
+
+
+    #---------------------------------------------------------------------------
+    ## Returns future which lists the directory and then resolves with the
+    ## return value of the function.
+    ##
+    ## @param func : <function> called without argument after the listing.
+    ##
+    ## @return : <asyncio.Future> resolved with the function's return value.
+    def _after_listing_async(self, func):
+        ## Watched instances answer from the live state of the watcher.
+        if self._directory is None or self._watcher is not None:
+            return self._call_async(func)
+
+        loop = _current_event_loop()
+
+        ## Streaming and persistent index lookups read the directory or the
+        ## index themselves, so the whole lookup runs off the loop instead of
+        ## a listing before it.
+        if self._lazy_listing():
+            return loop.run_in_executor(_async_executor(), func)
+
+        result = loop.create_future()
+
+        def call(future):
+            if result.cancelled():
+                return
+
+            if future.cancelled():
+                result.cancel()
+                return
+
+            exc = future.exception()
+            if exc is not None:
+                result.set_exception(exc)
+                return
+
+            try:
+                result.set_result(func())
+            except Exception as e:
+                result.set_exception(e)
+
+        self._find_targets_async().add_done_callback(call)
+        return result
+
+
+    #---------------------------------------------------------------------------
+    ## Returns future resolved with the return value of the function, which is
+    ## called now on the event loop.
+    ##
+    ## @param func : <function> called without argument.
+    ##
+    ## @return : <asyncio.Future> resolved with the function's return value.
+    def _call_async(self, func):
+        result = _current_event_loop().create_future()
+        try:
+            result.set_result(func())
+        except Exception as e:
+            result.set_exception(e)
+
+        return result
+
+
+    #---------------------------------------------------------------------------
+    ## Asyncio version of set_directory. The directory is listed off the
+    ## event loop unless the instance is watched.
+    ##
+    ## @param directory : <str> target directory path to seach version files.
+    ##
+    ## @return : <asyncio.Future> resolved with None.
+    def set_directory_async(self, directory):
+        if not self._switch_directory(directory) and self._lazy_listing():
+            return self._call_async(self._invalidate)
+
+        return self._after_listing_async(lambda: None)
+
+
+    #---------------------------------------------------------------------------
+    ## Asyncio version of refresh.
+    ##
+    ## @return : <asyncio.Future> resolved with None.
+    def refresh_async(self):
+        if self._lazy_listing():
+            return self._call_async(self.refresh)
+
+        return self._after_listing_async(lambda: None)
+
+
+    #---------------------------------------------------------------------------
+    ## Asyncio version of get_latest_name. The directory is listed again off
+    ## the event loop before the lookup. In streaming and persistent index
+    ## mode the whole lookup runs off the event loop, and watched instances
+    ## answer from the live state.
+    ##
+    ## @return : <asyncio.Future> resolved with latest string.
+    def get_latest_name_async(self):
+        return self._after_listing_async(self.get_latest_name)
+
+
+    #---------------------------------------------------------------------------
+    ## Asyncio version of get_latest_namePath.
+    ##
+    ## @return : <asyncio.Future> resolved with latest version path.
+    def get_latest_namePath_async(self):
+        return self._after_listing_async(self.get_latest_namePath)
+
+
+    #---------------------------------------------------------------------------
+    ## Asyncio version of get_latest_version_name.
+    ##
+    ## @return : <asyncio.Future> resolved with latest version name.
+    def get_latest_version_name_async(self):
+        return self._after_listing_async(self.get_latest_version_name)
+
+
+    #---------------------------------------------------------------------------
+    ## Asyncio version of get_latest_version_num.
+    ##
+    ## @return : <asyncio.Future> resolved with latest version number.
+    def get_latest_version_num_async(self):
+        return self._after_listing_async(self.get_latest_version_num)
+
+
+    #---------------------------------------------------------------------------
+    ## Asyncio version of get_next_version_name.
+    ##
+    ## @return : <asyncio.Future> resolved with next version name.
+    def get_next_version_name_async(self):
+        return self._after_listing_async(self.get_next_version_name)
+
+
+    #---------------------------------------------------------------------------
+    ## Asyncio version of get_next_version_num.
+    ##
+    ## @return : <asyncio.Future> resolved with next version number.
+    def get_next_version_num_async(self):
+        return self._after_listing_async(self.get_next_version_num)
+
+
+
+class ListingBackend(_ABCBase):
+    """ListingBackend lists target names of a directory for FileVersionist.
+    Subclasses implement iter_names. kLocal tells the directory is on the local
+    file system, which the listing cache, the persistent index, watch mode and
+    reservations need.
+    """
+
+    kLocal = False
+
+    #---------------------------------------------------------------------------
+    ## Yields target names of the directory one by one. Missing directory
+    ## yields nothing. Names which the accept function rejects are dropped
+    ## before their type is checked.
+    ##
+    ## @param directory : <str> directory path.
+    ##
+    ## @param target_type : <str> 'file', 'dir' or 'both'.
+    ##
+    ## @param accept : <function> match function or None.
+    ##
+    ## @param prefix : <str> literal prefix every accepted name starts with.
+    ##                Backends can use it to list fewer names.
+    ##
+    ## @return : <generator> of target names.
+    @abc.abstractmethod
+    def iter_names(self, directory, target_type, accept = None, prefix = ""):
+        pass
+
+
+
+class LocalListingBackend(ListingBackend):
+    """LocalListingBackend lists a directory of the local file system with
+    os.scandir, or os.listdir when os.scandir is not available.
+    """
+
+    kLocal = True
+
+    def iter_names(self, directory, target_type, accept = None, prefix = ""):
+        try:
+            if _scandir is None:
+                names = self._list_names(directory, target_type, accept)
+
+            else:
+                names = self._scan_names(directory, target_type, accept)
+
+            for name in names:
+                yield name
+
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+    #---------------------------------------------------------------------------
+    ## Lists target names with os.scandir. The file type is taken from the
+    ## directory entry, which avoids a stat call when the file system provides
+    ## the type.
+    ##
+    ## @param directory : <str> directory path.
+    ##
+    ## @param target_type : <str> 'file', 'dir' or 'both'.
+    ##
+    ## @param accept : <function> match function or None.
+    ##
+    ## @return : <generator> of target names.
+    def _scan_names(self, directory, target_type, accept):
+        iterator = _scandir(directory)
+
+        try:
+            for entry in iterator:
+                name = entry.name
+
+                if accept is not None and accept(name) is None:
+                    continue
+
+                if target_type == FileVersionist.kTargetDir:
+                    if not entry.is_dir():
+                        continue
+
+                elif target_type == FileVersionist.kTargetFile:
+                    if not entry.is_file():
+                        continue
+
+                yield name
+
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+
+    #---------------------------------------------------------------------------
+    ## Lists target names with os.listdir. This is used when os.scandir is
+    ## not available.
+    ##
+    ## @param directory : <str> directory path.
+    ##
+    ## @param target_type : <str> 'file', 'dir' or 'both'.
+    ##
+    ## @param accept : <function> match function or None.
+    ##
+    ## @return : <list> of target names.
+    def _list_names(self, directory, target_type, accept):
+        files = os.listdir(directory)
+
+        if target_type == FileVersionist.kTargetDir:
+            check_func = os.path.isdir
+
+        elif target_type == FileVersionist.kTargetFile:
+            check_func = os.path.isfile
+
+        else:
+            check_func = None
+
+        targets = []
+
+        for name in files:
+            if accept is not None and accept(name) is None:
+                continue
+
+            if check_func is None:
+                targets.append(name)
+
+            else:
+                actualPath = os.path.join(directory, name)
+
+                if check_func(actualPath):
+                    targets.append(name)
+
+        return targets
+
+
+## Backend of FileVersionist instances which are not given one. It has no
+## state, and sharing it lets their async listings be coalesced.
+_LOCAL_LISTING_BACKEND = LocalListingBackend()
+
+
+
+class ObjectStoreListingBackend(ListingBackend):
+    """ObjectStoreListingBackend lists a 'directory' of S3 style object storage
+    with ListObjectsV2. The directory is a key prefix of the bucket, objects are
+    files and common prefixes are directories.
+    The literal prefix of the name pattern is added to the key prefix, so the
+    server returns only candidate keys, and pages are requested one by one
+    while the names are consumed.
+    Requests are sent by a boto3 style client when it is given, or as plain
+    HTTP GET requests to the endpoint, which suits public buckets and S3
+    compatible servers without request signing.
+    So for example...
+    backend = ObjectStoreListingBackend("publish", endpoint = "http://minio:9000")
+    vernist = FileVersionist("show/sh010/comp", "^comp_<version>\\.nk$", listing_backend = backend)
+    """
+
+    kPageSize = 1000
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of ObjectStoreListingBackend.
+    ##
+    ## @param bucket : <str> bucket name.
+    ##
+    ## @param endpoint : <str> URL of the server like 'http://localhost:9000'.
+    ##                  Requests use path style addressing.
+    ##
+    ## @param client : <object> client which has list_objects_v2 method, like
+    ##                boto3's S3 client. This is used instead of the endpoint.
+    ##
+    ## @param page_size : <int> maximum number of keys of a page.
+    ##
+    ## @param headers : <dict> extra HTTP headers of the requests.
+    ##
+    ## @param timeout : <float> seconds to wait for the server.
+    def __init__(self, bucket, endpoint = None, client = None, page_size = kPageSize, headers = None, timeout = 30.0):
+        super(ObjectStoreListingBackend, self).__init__()
+        if endpoint is None and client is None:
+            raise ValueError("Either endpoint or client is required.")
+
+        self._bucket = bucket
+        self._endpoint = endpoint.rstrip("/") if endpoint is not None else None
+        self._client = client
+        self._page_size = page_size
+        self._headers = dict(headers or {})
+        self._timeout = timeout
+        self.request_count = 0
+
+
+    def iter_names(self, directory, target_type, accept = None, prefix = ""):
+        directory = (directory or "").strip("/")
+        key_prefix = directory + "/" if directory else ""
+        start = len(key_prefix)
+        files = target_type != FileVersionist.kTargetDir
+        dirs = target_type != FileVersionist.kTargetFile
+
+        for keys, common_prefixes in self._iter_pages(key_prefix + prefix):
+            names = []
+            if files:
+                names.extend(key[start:] for key in keys)
+            if dirs:
+                names.extend(common_prefix[start:].rstrip("/") for common_prefix in common_prefixes)
+
+            for name in names:
+                ## Empty name is the marker object of the directory itself.
+                if not name:
+                    continue
+
+                if accept is not None and accept(name) is None:
+                    continue
+
+                yield name
+
+
+    #---------------------------------------------------------------------------
+    ## Yields pages of the listing. The next page is requested when the
+    ## previous one is consumed.
+    ##
+    ## @param key_prefix : <str> key prefix.
+    ##
+    ## @return : <generator> of (keys, common prefixes) tuples.
+    def _iter_pages(self, key_prefix):
+        token = None
+        while True:
+            self.request_count += 1
+            if self._client is not None:
+                keys, common_prefixes, token = self._client_page(key_prefix, token)
+            else:
+                keys, common_prefixes, token = self._http_page(key_prefix, token)
+
+            yield keys, common_prefixes
+
+            if token is None:
+                return
+
+
+    def _client_page(self, key_prefix, token):
+        kwargs = {"Bucket": self._bucket, "Prefix": key_prefix, "Delimiter": "/", "MaxKeys": self._page_size}
+        if token is not None:
+            kwargs["ContinuationToken"] = token
+
+        response = self._client.list_objects_v2(**kwargs)
+        keys = [item["Key"] for item in response.get("Contents", ())]
+        common_prefixes = [item["Prefix"] for item in response.get("CommonPrefixes", ())]
+        token = response.get("NextContinuationToken") if response.get("IsTruncated") else None
+        return keys, common_prefixes, token
+
+
+    def _http_page(self, key_prefix, token):
+        def utf8(text):
+            return text if isinstance(text, bytes) else text.encode("utf-8")
+
+        params = [("list-type", "2"), ("prefix", utf8(key_prefix)), ("delimiter", "/"),
+                  ("max-keys", str(self._page_size))]
+        if token is not None:
+            params.append(("continuation-token", utf8(token)))
+
+        url = "%s/%s?%s" % (self._endpoint, _url_quote(self._bucket), _url_encode(params))
+        response = _url_open(_UrlRequest(url, headers = self._headers), timeout = self._timeout)
+        try:
+            root = _ElementTree.fromstring(response.read())
+        finally:
+            response.close()
+
+        keys = []
+        common_prefixes = []
+        truncated = False
+        next_token = None
+
+        ## Tags are compared without the namespace, which differs between servers.
+        for element in root:
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag == "Contents":
+                keys.append(self._child_text(element, "Key"))
+            elif tag == "CommonPrefixes":
+                common_prefixes.append(self._child_text(element, "Prefix"))
+            elif tag == "IsTruncated":
+                truncated = (element.text or "").strip() == "true"
+            elif tag == "NextContinuationToken":
+                next_token = element.text
+
+        return keys, common_prefixes, next_token if truncated else None
+
+
+    @staticmethod
+    def _child_text(element, name):
+        for child in element:
+            if child.tag.rsplit("}", 1)[-1] == name:
+                return child.text or ""
+
+        return ""
+
+
+
+class VersionIndex(object):
+    """VersionIndex explores given name strings only once and holds latest
+    version of every group of names.
+    Names are grouped by the named groups of the regrex other than the version
+    group. So for example...
+    (?P<asset>\w+)_<version>.ma gives latest version of every asset.
+    When the regrex has one extra group, the group key is the matched string.
+    When it has several groups, the key is a tuple of the matched strings in
+    order of the groups.
+    """
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of VersionIndex.
+    ##
+    ## @param targets : <list> of string names.
+    ##
+    ## @param name_pattern : <str> regular expression to match targets.
+    ##                      It should have named groups for the group key.
+    ##
+    ## @param padding : <int> padding number of version.
+    ##
+    ## @param prefix : <str> version string's prefix. This can be empty string.
+    ##
+    ## @param initial_number : <int> first number of version. Versions below
+    ##                        this number are ignored like Versionist does.
+    ##
+    ## @param match_type : <str> 'match' or 'search'
+    ##
+    ## @param version_key : <str> version group name. None follows
+    ##                     Versionist.VERSION_KEY.
+    def __init__(self, targets,
+                       name_pattern,
+                       padding = 3,
+                       prefix = "v",
+                       initial_number = 1,
+                       match_type = Versionist.kMatchType,
+                       version_key = None
+                       ):
+        super(VersionIndex, self).__init__()
+        self._name_pattern = name_pattern
+        self._padding = padding
+        self._prefix = prefix
+        self._initial_number = initial_number
+        self._match_type = match_type
+        self._version_key = version_key
+        self._latest = {}
+        self._versions = {}
+        self.set_targets(targets)
+
+
+    #---------------------------------------------------------------------------
+    ## Set new targets and rebuild the index.
+    ##
+    ## @param targets : <list> of target string names.
+    def set_targets(self, targets):
+        version_key = self._version_key
+        if version_key is None:
+            version_key = Versionist.VERSION_KEY
+
+        compiled = _compile_name_pattern(self._name_pattern,
+                                         self._prefix,
+                                         self._padding,
+                                         version_key,
+                                         self._match_type)
+
+        group_names = [group for group, _ in sorted(compiled.groupindex.items(), key = lambda item: item[1])
+                       if group != version_key]
+
+        latest = {}
+        versions = {}
+        min_version = self._initial_number
+
+        for name, mObj in compiled.iter_matches(_iter_target_names(targets)):
+            version_name = mObj.group(version_key)
+            version_num = int(version_name.replace(self._prefix, ""))
+
+            if version_num < min_version:
+                continue
+
+            if not group_names:
+                key = None
+
+            elif len(group_names) == 1:
+                key = mObj.group(group_names[0])
+
+            else:
+                key = mObj.group(*group_names)
+
+            ver_obj = VersionObj(verNum=version_num, verName=version_name, name=name)
+
+            if key in versions:
+                versions[key].append(ver_obj)
+                if version_num > latest[key].versionNum:
+                    latest[key] = ver_obj
+
+            else:
+                versions[key] = [ver_obj]
+                latest[key] = ver_obj
+
+        self._latest = latest
+        strings = _StringTable()
+        self._versions = dict((key, VersionHistory(ver_objs, prefix = self._prefix, strings = strings))
+                              for key, ver_objs in versions.items())
+
+
+    def __len__(self):
+        return len(self._latest)
+
+
+    def __contains__(self, key):
+        return key in self._latest
+
+
+    def __iter__(self):
+        return iter(self._latest)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns all group keys found in the targets.
+    ##
+    ## @return : <list> of group keys.
+    def keys(self):
+        return list(self._latest.keys())
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version object of the group. If the group does not
+    ## exist, returns empty VersionObj.
+    ##
+    ## @param key : group key.
+    ##
+    ## @return : <VersionObj> latest version information
+    def get_latest(self, key):
+        ver_obj = self._latest.get(key)
+        if ver_obj is None:
+            return VersionObj()
+
+        return ver_obj
+
+
+    #---------------------------------------------------------------------------
+    ## Returns all version objects of the group sorted by version number.
+    ##
+    ## @param key : group key.
+    ##
+    ## @return : <list> of VersionObj
+    def get_versions(self, key):
+        return list(self._versions.get(key, []))
+
+
+    #---------------------------------------------------------------------------
+    ## Returns version history of the group.
+    ##
+    ## @param key : group key.
+    ##
+    ## @return : <VersionHistory> version history
+    def get_history(self, key):
+        history = self._versions.get(key)
+        if history is None:
+            return VersionHistory(prefix = self._prefix)
+
+        return history
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version name of the group. If no version exists,
+    ## returns None type.
+    ##
+    ## @return : <str> latest version name
+    def get_latest_version_name(self, key):
+        return self.get_latest(key).versionName
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version number of the group. If no version exists,
+    ## returns None type.
+    ##
+    ## @return : <int> latest version number
+    def get_latest_version_num(self, key):
+        return self.get_latest(key).versionNum
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version's string of the group. If no version exists,
+    ## returns None type.
+    ##
+    ## @return : <str> latest string
+    def get_latest_name(self, key):
+        return self.get_latest(key).name
+
+
+    #---------------------------------------------------------------------------
+    ## Returns next version number of the group. If no version exists,
+    ## returns initial number.
+    ##
+    ## @return : <int> next version number
+    def get_next_version_num(self, key):
+        latest_num = self.get_latest_version_num(key)
+        if not isinstance(latest_num, int):
+            return self._initial_number
+
+        return latest_num + 1
+
+
+    #---------------------------------------------------------------------------
+    ## Returns next version name of the group. If no version exists,
+    ## returns initial version name.
+    ##
+    ## @return : <str> next version name
+    def get_next_version_name(self, key):
+        next_number = self.get_next_version_num(key)
+        return "%s%s" % (self._prefix, str(next_number).zfill(self._padding))
+
+
+
+class MultiVersionist(object):
+    """MultiVersionist finds latest version of several named patterns with only
+    one pass over the targets.
+    Patterns are grouped by the literal prefix and suffix their matches require.
+    Each name is sent only to the patterns of the groups whose prefix and suffix
+    it has, so the cost grows with the number of targets and the number of
+    distinct prefix and suffix lengths, not with the number of patterns.
+    """
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of MultiVersionist.
+    ##
+    ## @param targets : <iterable> of string names.
+    ##
+    ## @param name_patterns : <dict> of pattern name and regular expression.
+    ##
+    ## @param padding : <int> padding number of version.
+    ##
+    ## @param prefix : <str> version string's prefix. This can be empty string.
+    ##
+    ## @param initial_number : <int> first number of version.
+    ##
+    ## @param match_type : <str> 'match' or 'search'
+    ##
+    ## @param version_key : <str> version group name. None follows
+    ##                     Versionist.VERSION_KEY.
+    def __init__(self, targets,
+                       name_patterns,
+                       padding = 3,
+                       prefix = "v",
+                       initial_number = 1,
+                       match_type = Versionist.kMatchType,
+                       version_key = None
+                       ):
+        super(MultiVersionist, self).__init__()
+        self._targets = targets
+        self._name_patterns = dict(name_patterns)
+        self._padding = padding
+        self._prefix = prefix
+        self._initial_number = initial_number
+        self._match_type = match_type
+        self._version_key = version_key
+        self._latest_versions = None
+
+
+    #---------------------------------------------------------------------------
+    ## Set new targets.
+    ##
+    ## @param targets : <iterable> of target string names.
+    def set_targets(self, targets):
+        self._targets = targets
+        self._latest_versions = None
+
+
+    #---------------------------------------------------------------------------
+    ## Discard the memoized scan result.
+    def refresh(self):
+        self._latest_versions = None
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version of every pattern. A pattern which matches nothing
+    ## has empty VersionObj.
+    ##
+    ## @return : <dict> of pattern name and VersionObj.
+    def get_latest_versions(self):
+        if self._latest_versions is None:
+            self._latest_versions = self._scan()
+
+        return dict(self._latest_versions)
+
+
+    #---------------------------------------------------------------------------
+    ## Returns latest version of the pattern.
+    ##
+    ## @param key : <str> pattern name.
+    ##
+    ## @return : <VersionObj> latest version information
+    def get_latest_version(self, key):
+        if key not in self._name_patterns:
+            raise KeyError(key)
+
+        if self._latest_versions is None:
+            self._latest_versions = self._scan()
+
+        return self._latest_versions[key]
+
+
+    def _scan(self):
+        version_key = self._version_key
+        if version_key is None:
+            version_key = Versionist.VERSION_KEY
+
+        shapes = {}
+        for key, name_pattern in self._name_patterns.items():
+            compiled = _compile_name_pattern(name_pattern,
+                                             self._prefix,
+                                             self._padding,
+                                             version_key,
+                                             self._match_type)
+            head = compiled.prefix
+            tail = compiled.suffixes[0] if compiled.suffixes else ""
+            buckets = shapes.setdefault((len(head), len(tail)), {})
+            buckets.setdefault((head, tail), []).append((key, compiled.accept))
+
+        shapes = list(shapes.items())
+        prefix = self._prefix
+        max_versions = dict((key, self._initial_number - 1) for key in self._name_patterns)
+        latest = dict((key, None) for key in self._name_patterns)
+
+        for name in _iter_target_names(self._targets):
+            stripped = name[:-1] if name.endswith("\n") else None
+
+            for (head_length, tail_length), buckets in shapes:
+                head = name[:head_length]
+                candidates = buckets.get((head, name[len(name) - tail_length:] if tail_length else ""))
+
+                if stripped is not None and tail_length:
+                    more = buckets.get((head, stripped[len(stripped) - tail_length:]))
+                    if more:
+                        candidates = (candidates or []) + more
+
+                if not candidates:
+                    continue
+
+                for key, accept in candidates:
+                    mObj = accept(name)
+                    if mObj is None:
+                        continue
+
+                    version_name = mObj.group(version_key)
+                    version_num = int(version_name.replace(prefix, ""))
+
+                    if version_num > max_versions[key]:
+                        max_versions[key] = version_num
+                        latest[key] = VersionObj(verNum=version_num, verName=version_name, name=name)
+
+        return dict((key, ver_obj if ver_obj is not None else VersionObj()) for key, ver_obj in latest.items())
+
+
+
+class PathTemplateResolver(object):
+    """PathTemplateResolver resolves path templates which have versions and
+    fields at several levels. So for example...
+    /show/<seq>/<shot>/publish/<version>/cache_<version>.abc
+    gives the latest cache of the latest publish of every shot.
+    Tokens are written like '<name>'. The version token is replaced with version
+    group like FileVersionist does, and other tokens are fields which match any
+    name unless a pattern is given. A field used at several levels must have the
+    same value at all of them.
+    Levels without tokens are joined without listing, and each directory is
+    listed only once, filtered by the literal parts of its level. At versioned
+    levels only the latest version of every group is followed.
+    """
+
+    kTokenRegex = re.compile(r"<(\w+)>")
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of PathTemplateResolver.
+    ##
+    ## @param template : <str> path template separated by '/'.
+    ##
+    ## @param padding : <int> padding number of version.
+    ##
+    ## @param prefix : <str> version string's prefix. This can be empty string.
+    ##
+    ## @param initial_number : <int> first number of version.
+    ##
+    ## @param target_type : <str> type of the last level; 'file', 'dir' or
+    ##                     'both'. Other levels are directories.
+    ##
+    ## @param field_patterns : <dict> regular expression of each field.
+    ##                        Fields not given match any name.
+    ##
+    ## @param version_key : <str> version token name. None follows
+    ##                     Versionist.VERSION_KEY.
+    def __init__(self, template,
+                       padding = 3,
+                       prefix = "v",
+                       initial_number = 1,
+                       target_type = FileVersionist.kTargetBoth,
+                       field_patterns = None,
+                       version_key = None
+                       ):
+        super(PathTemplateResolver, self).__init__()
+        self._root = "/" if template.startswith("/") else ""
+        self._levels = [component for component in template.split("/") if component]
+        self._padding = padding
+        self._prefix = prefix
+        self._initial_number = initial_number
+        self._target_type = target_type
+        self._field_patterns = dict(field_patterns or {})
+        self._version_key = version_key
+        self._listers = {}
+        self._listings = {}
+        self.listing_count = 0
+
+
+    #---------------------------------------------------------------------------
+    ## Resolves the template. One path is given for every combination of field
+    ## values found, with the latest version at every versioned level.
+    ## listing_count tells the number of directories listed by the call.
+    ##
+    ## @param fields : <dict> fixed values of fields. Levels which have only
+    ##                fixed fields are joined without listing.
+    ##
+    ## @param fallback : <bool> True tries older versions when the latest
+    ##                  version has nothing at the levels below.
+    ##
+    ## @return : <list> of ResolvedPath; path, dict of field values and tuple
+    ##           of VersionObj of the versioned levels.
+    def resolve(self, fields = None, fallback = False):
+        self._listings = {}
+        self.listing_count = 0
+        results = []
+        self._resolve(0, self._root, dict(fields or {}), (), fallback, results)
+        return results
+
+
+    def _get_version_key(self):
+        if self._version_key is not None:
+            return self._version_key
+
+        return Versionist.VERSION_KEY
+
+
+    def _resolve(self, index, directory, fields, versions, fallback, results):
+        if index == len(self._levels):
+            results.append(ResolvedPath(directory, fields, versions))
+            return True
+
+        pattern, literal, has_version = self._level_pattern(self._levels[index], fields)
+        last = index == len(self._levels) - 1
+
+        if literal is not None:
+            path = os.path.join(directory, literal)
+            if last and not self._exists(path):
+                return False
+
+            return self._resolve(index + 1, path, fields, versions, fallback, results)
+
+        version_key = self._get_version_key()
+        if has_version:
+            compiled = _compile_name_pattern(pattern, self._prefix, self._padding, version_key, Versionist.kMatchType)
+        else:
+            compiled = _LEVEL_PATTERN_CACHE.get(pattern)
+            if compiled is None:
+                compiled = _NamePattern(re.compile(pattern), Versionist.kMatchType)
+                _LEVEL_PATTERN_CACHE.put(pattern, compiled)
+
+        names = self._list_level(directory, last, compiled.accept)
+        found = False
+
+        if not has_version:
+            for name, mObj in compiled.iter_matches(sorted(names)):
+                sub_fields = dict(fields, **mObj.groupdict())
+                if self._resolve(index + 1, os.path.join(directory, name), sub_fields, versions, fallback, results):
+                    found = True
+
+            return found
+
+        version_index = VersionIndex(names, pattern,
+                                     padding = self._padding,
+                                     prefix = self._prefix,
+                                     initial_number = self._initial_number,
+                                     version_key = version_key)
+
+        for key in sorted(version_index.keys(), key = lambda key: version_index.get_latest(key).name):
+            latest = version_index.get_latest(key)
+            candidates = [latest]
+            if fallback:
+                candidates.extend(ver_obj for ver_obj in reversed(version_index.get_versions(key)) if ver_obj is not latest)
+
+            for ver_obj in candidates:
+                groups = compiled.matchFunc(ver_obj.name).groupdict()
+                groups.pop(version_key)
+                sub_fields = dict(fields, **groups)
+                if self._resolve(index + 1, os.path.join(directory, ver_obj.name), sub_fields,
+                                 versions + (ver_obj,), fallback, results):
+                    found = True
+                    break
+
+        return found
+
+
+    #---------------------------------------------------------------------------
+    ## Builds regular expression of a level. Fields which already have values
+    ## are replaced with the values.
+    ##
+    ## @param component : <str> level of the template.
+    ##
+    ## @param fields : <dict> field values of the upper levels.
+    ##
+    ## @return : <tuple> name pattern, literal name when the level has no token
+    ##           left, and whether the level has version token.
+    def _level_pattern(self, component, fields):
+        version_key = self._get_version_key()
+        parts = ["^"]
+        literal = []
+        seen = set()
+        has_version = False
+        has_group = False
+        position = 0
+
+        for mObj in self.kTokenRegex.finditer(component):
+            text = component[position:mObj.start()]
+            parts.append(re.escape(text))
+            literal.append(text)
+            position = mObj.end()
+            token = mObj.group(1)
+
+            if token != version_key and token in fields:
+                parts.append(re.escape(fields[token]))
+                literal.append(fields[token])
+                continue
+
+            has_group = True
+            if token in seen:
+                parts.append("(?P=%s)" % token)
+
+            elif token == version_key:
+                parts.append(mObj.group(0))
+                has_version = True
+
+            else:
+                parts.append("(?P<%s>%s)" % (token, self._field_patterns.get(token, ".+")))
+
+            seen.add(token)
+
+        text = component[position:]
+        parts.append(re.escape(text) + "$")
+        literal.append(text)
+
+        if has_group:
+            return ("".join(parts), None, has_version)
+
+        return ("".join(parts), "".join(literal), has_version)
+
+
+    #---------------------------------------------------------------------------
+    ## Lists a directory of a level once. Intermediate levels list directories,
+    ## the last level lists the target type.
+    ##
+    ## @param directory : <str> directory path.
+    ##
+    ## @param last : <bool> True for the last level.
+    ##
+    ## @param accept : <function> match function of the level.
+    ##
+    ## @return : <list> of names.
+    def _list_level(self, directory, last, accept):
+        target_type = self._target_type if last else FileVersionist.kTargetDir
+        key = (directory, target_type)
+        names = self._listings.get(key)
+        if names is None:
+            lister = self._listers.get(target_type)
+            if lister is None:
+                lister = FileVersionist(target_type = target_type)
+                self._listers[target_type] = lister
+
+            names = lister._list_directory(directory or os.curdir, accept)
+            self._listings[key] = names
+            self.listing_count += 1
+
+        return names
+
+
+    def _exists(self, path):
+        if self._target_type == FileVersionist.kTargetDir:
+            return os.path.isdir(path)
+
+        elif self._target_type == FileVersionist.kTargetFile:
+            return os.path.isfile(path)
+
+        return os.path.exists(path)
+
+
+
+class ManifestVersionist(Versionist):
+    """ManifestVersionist detects versions in a manifest file which has one name
+    per line. The names are the lines without the line feed.
+    The latest version is found by running a bytes version of the name pattern
+    over the memory mapped file, so the lines are never loaded as strings and
+    only the winning line is decoded. The result is the same as the scan of the
+    list of lines. Patterns which can not run over the buffer, like the ones
+    with lookarounds, are matched line by line.
+    The parallel scan splits the file into byte ranges, so its threshold is the
+    size of the file in bytes.
+    """
+
+    kParallelThreshold = 64 << 20
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of ManifestVersionist.
+    ##
+    ## @param manifest_path : <str> path of the manifest file.
+    ##
+    ## @param name_pattern : <str> regular expression to match targets
+    ##
+    ## @param padding : <int> padding number of version.
+    ##
+    ## @param prefix : <str> version string's prefix. This can be empty string.
+    ##
+    ## @param initial_number : <int> first number of version.
+    ##
+    ## @param match_type : <str> 'match' or 'search'
+    ##
+    ## @param version_key : <str> version group name of this instance.
+    ##                     None follows the class wide VERSION_KEY.
+    ##
+    ## @param encoding : <str> text encoding of the manifest.
+    ##
+    ## @param version_scheme : <VersionScheme> or <str> template of version
+    ##                        names with several fields. Manifests are scanned
+    ##                        line by line with version scheme.
+    def __init__(self, manifest_path = None,
+                       name_pattern = None,
+                       padding = 3,
+                       prefix = "v",
+                       initial_number = 1,
+                       match_type = Versionist.kMatchType,
+                       version_key = None,
+                       encoding = "utf-8",
+                       version_scheme = None
+                       ):
+        super(ManifestVersionist, self).__init__([],
+                                                 name_pattern,
+                                                 padding = padding,
+                                                 prefix = prefix,
+                                                 initial_number = initial_number,
+                                                 match_type = match_type,
+                                                 version_key = version_key,
+                                                 version_scheme = version_scheme)
+        self._manifest_path = manifest_path
+        self._encoding = encoding
 
 
-    def __init__(self, verNum = None, verName = None, name = None):
-        super(VersionObj, self).__init__()
-        self._versionNum = verNum
-        self._versionName = verName
-        self._name = name
+    #---------------------------------------------------------------------------
+    ## Set manifest file to search versions.
+    ##
+    ## @param manifest_path : <str> path of the manifest file.
+    def set_manifest(self, manifest_path):
+        self._manifest_path = manifest_path
+        self._invalidate()
 
 
-    @property
-    def versionNum(self):
-        """Getter of version number."""
-        return self._versionNum
+    #---------------------------------------------------------------------------
+    ## Scans the manifest and finds latest version.
+    ##
+    ## @return : <VersionObj> latest version information
+    def _scan_latest_version(self):
+        if self._manifest_path is None:
+            raise RuntimeError("Manifest file is not set.")
+
+        with open(self._manifest_path, "rb") as manifest:
+            size = os.fstat(manifest.fileno()).st_size
+            if size == 0:
+                return self._scan_latest(())
+
+            buf = mmap.mmap(manifest.fileno(), 0, access = mmap.ACCESS_READ)
+            try:
+                return self._scan_buffer(buf, size)
+            finally:
+                buf.close()
+
+
+    #---------------------------------------------------------------------------
+    ## Finds latest version in the mapped manifest.
+    ##
+    ## @param buf : <mmap> mapped manifest.
+    ##
+    ## @param size : <int> size of the manifest.
+    ##
+    ## @return : <VersionObj> latest version information
+    def _scan_buffer(self, buf, size):
+        if self._version_scheme is not None:
+            return self._scan_latest(self._iter_lines())
+
+        workers = self._parallel_workers(size)
+        if workers:
+            result = self._scan_buffer_parallel(buf, size, workers)
+        else:
+            result = _scan_manifest_range(buf, 0, size, self._compile_pattern(), self.get_version_key(),
+                                          self._prefix, self._initial_number, self._encoding)
+        if result is None:
+            return self._scan_latest(self._iter_lines())
+
+        return self._decode_winner(buf, size, result[1])
+
+
+    #---------------------------------------------------------------------------
+    ## Scans byte ranges of the manifest in worker processes. Ranges are split
+    ## at line feeds, and the results are reduced in the order of the ranges.
+    ##
+    ## @param buf : <mmap> mapped manifest.
+    ##
+    ## @param size : <int> size of the manifest.
+    ##
+    ## @param workers : <int> number of worker processes.
+    ##
+    ## @return : <tuple> result of _scan_manifest_range().
+    def _scan_buffer_parallel(self, buf, size, workers):
+        bounds = [0]
+        for index in range(1, workers):
+            bound = buf.find(b"\n", max(size * index // workers, bounds[-1]), size) + 1
+            if bound == 0 or bound >= size:
+                break
+            bounds.append(bound)
+        bounds.append(size)
+
+        signature = self._pattern_signature()
+        args = [(self._manifest_path, start, end, signature, self._initial_number, self._encoding)
+                for start, end in zip(bounds, bounds[1:])]
+
+        best = (None, None)
+        for result in _process_map(_scan_manifest_shard, args, len(args)):
+            if result is None:
+                return None
+
+            if result[1] is not None and (best[1] is None or result[0] > best[0]):
+                best = result
+
+        return best
+
+
+    #---------------------------------------------------------------------------
+    ## Builds version object from the winning line of the buffer.
+    ##
+    ## @param buf : <mmap> mapped manifest.
+    ##
+    ## @param size : <int> size of the manifest.
+    ##
+    ## @param line_start : <int> start offset of the line, or None type.
+    ##
+    ## @return : <VersionObj> latest version information
+    def _decode_winner(self, buf, size, line_start):
+        if line_start is None:
+            return self._scan_latest(())
+
+        line_end = buf.find(b"\n", line_start, size)
+        if line_end == -1:
+            line_end = size
+
+        return self._scan_latest((self._decode(buf[line_start:line_end]),))
+
+
+    #---------------------------------------------------------------------------
+    ## Builds version history from the lines of the manifest.
+    ##
+    ## @return : <VersionHistory> version history
+    def _scan_history(self):
+        if self._manifest_path is None:
+            raise RuntimeError("Manifest file is not set.")
+
+        return VersionHistory(self._iter_versions(self._iter_lines()), prefix = self._prefix,
+                              version_scheme = self._version_scheme)
+
+
+    #---------------------------------------------------------------------------
+    ## Yields the lines of the manifest as names.
+    ##
+    ## @return : <generator> of names.
+    def _iter_lines(self):
+        decode = self._decode
+        with open(self._manifest_path, "rb") as manifest:
+            for line in manifest:
+                if line.endswith(b"\n"):
+                    line = line[:-1]
+
+                yield decode(line)
+
+
+    def _decode(self, line):
+        if bytes is str:
+            return line
+
+        return line.decode(self._encoding)
+
+
+
+class _LiveVersionState(object):
+    """Version history of one watched FileVersionist, updated name by name
+    from file system events.
+    """
+
+    def __init__(self, vernist):
+        super(_LiveVersionState, self).__init__()
+        self.signature = vernist._scan_signature()
+        self.latest = VersionObj()
+        self.history = VersionHistory(prefix = vernist._prefix, version_scheme = vernist._version_scheme)
+        self._target_type = vernist._target_type
+        self._prefix = vernist._prefix
+        self._version_scheme = vernist._version_scheme
+        self._version_key = vernist.get_version_key()
+        self._min_version = vernist._initial_number
+        self._entries = {}
+        compiled = vernist._compile_pattern()
+        self._matchFunc = compiled.accept
+        self._key_of = None
+        if compiled.version_scheme is not None:
+            self._key_of = compiled.version_scheme.key_function(self._version_key)
+
+
+    #---------------------------------------------------------------------------
+    ## Rebuilds the state from the directory listing.
+    ##
+    ## @param names : <list> of target names.
+    def reset(self, names):
+        self._entries = {}
+        self.history = VersionHistory(prefix = self._prefix, version_scheme = self._version_scheme)
+        self.latest = VersionObj()
+        for name in names:
+            self.add_name(name, None)
+
+
+    #---------------------------------------------------------------------------
+    ## Adds the name which appeared in the directory.
+    ##
+    ## @param name : <str> entry name.
+    ##
+    ## @param is_dir : <bool> the entry is directory. None skips the type check.
+    def add_name(self, name, is_dir):
+        if is_dir is not None:
+            if self._target_type == FileVersionist.kTargetDir and not is_dir:
+                return
+            if self._target_type == FileVersionist.kTargetFile and is_dir:
+                return
+
+        mObj = self._matchFunc(name)
+        if mObj is None:
+            return
+
+        version_name = mObj.group(self._version_key)
+        if self._key_of is not None:
+            try:
+                version_num = self._key_of(mObj)
+            except ValueError:
+                return
+
+        else:
+            version_num = int(version_name.replace(self._prefix, ""))
+            if version_num < self._min_version:
+                return
+
+        old = self._entries.pop(name, None)
+        if old is not None:
+            self.history.remove(old)
+
+        ver_obj = VersionObj(verNum=version_num, verName=version_name, name=name)
+        self._entries[name] = ver_obj
+        self.history.insert(ver_obj)
+        self.latest = self.history.latest()
+
+
+    #---------------------------------------------------------------------------
+    ## Removes the name which disappeared from the directory.
+    ##
+    ## @param name : <str> entry name.
+    def remove_name(self, name):
+        ver_obj = self._entries.pop(name, None)
+        if ver_obj is None:
+            return
+
+        self.history.remove(ver_obj)
+        self.latest = self.history.latest()
+
+
+
+class _WatchedDirectory(object):
+    """Live states of the FileVersionist instances which watch one directory."""
+
+    def __init__(self, directory):
+        super(_WatchedDirectory, self).__init__()
+        self.directory = directory
+        self.wd = None
+        self.stamp = None
+        self.vernists = []
+
+
+
+class VersionWatcher(object):
+    """VersionWatcher keeps latest version of watched directories up to date.
+    On Linux it uses inotify create, move and delete events, so lookups of the
+    watched FileVersionist instances need no directory access.
+    When inotify is not available, or its event queue overflows, directories
+    are rescanned when their mtime changes, checked every poll_interval seconds.
+    """
+
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    kWatchMask = (IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+                  IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of VersionWatcher.
+    ##
+    ## @param poll_interval : <float> seconds between rescan checks of the
+    ##                       directories which are not watched by inotify.
+    ##
+    ## @param use_inotify : <bool> False always uses periodic rescans.
+    def __init__(self, poll_interval = 5.0, use_inotify = True):
+        super(VersionWatcher, self).__init__()
+        self._poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self._directories = {}
+        self._wds = {}
+        self._libc = None
+        self._fd = None
+        self._closed = False
+        self._wake_read, self._wake_write = os.pipe()
+
+        if use_inotify:
+            self._libc = self._load_inotify()
+
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+            if fd < 0:
+                self._libc = None
+            else:
+                self._fd = fd
+
+        self._thread = threading.Thread(target = self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    #---------------------------------------------------------------------------
+    ## Returns True when directories are watched by inotify.
+    ##
+    ## @return : <bool> inotify is used.
+    def uses_inotify(self):
+        return self._fd is not None
+
+
+    #---------------------------------------------------------------------------
+    ## Stops watching. Watched FileVersionist instances keep the last state
+    ## until they are unwatched.
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        os.write(self._wake_write, b"x")
+        self._thread.join()
+
+        with self._lock:
+            fd, self._fd = self._fd, None
+        if fd is not None:
+            os.close(fd)
+
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+
+    @staticmethod
+    def _load_inotify():
+        if not sys.platform.startswith("linux"):
+            return None
+
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno = True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        except (ImportError, OSError, AttributeError):
+            return None
+
+        return libc
+
+
+    def _add(self, vernist):
+        directory = os.path.abspath(vernist._directory)
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("VersionWatcher is closed.")
+
+            watched = self._directories.get(directory)
+            if watched is None:
+                watched = _WatchedDirectory(directory)
+                self._directories[directory] = watched
+                self._add_watch(watched)
+
+            watched.vernists.append(vernist)
+            self._rescan(watched, [vernist])
+
+
+    def _remove(self, vernist):
+        directory = os.path.abspath(vernist._directory)
+
+        with self._lock:
+            watched = self._directories.get(directory)
+            if watched is None or vernist not in watched.vernists:
+                return
+
+            watched.vernists.remove(vernist)
+            if watched.vernists:
+                return
+
+            del self._directories[directory]
+            if watched.wd is not None:
+                self._wds.pop(watched.wd, None)
+                ## Watches of a closed watcher went away with its descriptor.
+                if self._fd is not None:
+                    self._libc.inotify_rm_watch(self._fd, watched.wd)
+
+
+    def _resync(self, vernist):
+        directory = os.path.abspath(vernist._directory)
+
+        with self._lock:
+            watched = self._directories.get(directory)
+            if watched is not None:
+                self._rescan(watched, [vernist])
+
+
+    def _add_watch(self, watched):
+        if self._fd is None:
+            return
+
+        path = watched.directory
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding())
+
+        wd = self._libc.inotify_add_watch(self._fd, path, self.kWatchMask)
+        if wd < 0:
+            watched.wd = None
+            return
+
+        watched.wd = wd
+        self._wds[wd] = watched
+
+
+    def _rescan(self, watched, vernists = None):
+        watched.stamp = _directory_stamp(watched.directory)[0]
+
+        for vernist in (watched.vernists if vernists is None else vernists):
+            state = _LiveVersionState(vernist)
+            accept = vernist._listing_filter()
+            state.reset(vernist._list_directory(watched.directory, accept))
+            vernist._live_state = state
+
+
+    def _run(self):
+        last_poll = time.time()
+
+        while True:
+            readers = [self._wake_read]
+            if self._fd is not None:
+                readers.append(self._fd)
+
+            ready = select.select(readers, [], [], self._poll_interval)[0]
+
+            with self._lock:
+                if self._closed:
+                    return
+
+                if self._fd is not None and self._fd in ready:
+                    self._read_events()
+
+                if time.time() - last_poll >= self._poll_interval:
+                    last_poll = time.time()
+                    self._poll()
+
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 65536)
+
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            raise
+
+        header = self._EVENT_HEADER
+        offset = 0
+
+        while offset + header.size <= len(data):
+            wd, mask, _, length = header.unpack_from(data, offset)
+            offset += header.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            self._handle_event(wd, mask, name)
+
+
+    def _handle_event(self, wd, mask, name):
+        if mask & self.IN_Q_OVERFLOW:
+            for watched in self._directories.values():
+                self._rescan(watched)
+            return
+
+        watched = self._wds.get(wd)
+        if watched is None:
+            return
+
+        if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF | self.IN_IGNORED):
+            self._wds.pop(wd, None)
+            if not mask & self.IN_IGNORED:
+                self._libc.inotify_rm_watch(self._fd, wd)
+            watched.wd = None
+            self._rescan(watched)
+            return
+
+        if not isinstance(watched.directory, bytes):
+            name = _fs_decode(name)
+
+        if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+            is_dir = bool(mask & self.IN_ISDIR)
+            for vernist in watched.vernists:
+                vernist._live_state.add_name(name, is_dir)
+
+        elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+            for vernist in watched.vernists:
+                vernist._live_state.remove_name(name)
+
+
+    def _poll(self):
+        for watched in self._directories.values():
+            if watched.wd is not None:
+                continue
+
+            stamp = _directory_stamp(watched.directory)[0]
+            if stamp == watched.stamp:
+                continue
+
+            if self._fd is not None and stamp[0] is not None:
+                self._add_watch(watched)
+
+            self._rescan(watched)
+
+
+
+class PersistentIndex(object):
+    """PersistentIndex keeps parsed versions of directories in a SQLite file,
+    so new processes can answer lookups without listing the directories.
+    Each record holds the directory's mtime, inode and device at the time of
+    the scan, and it is used only while a stat of the directory gives the same
+    values.
+    Connections are opened per thread and per process, and writes are done in
+    immediate transactions on a WAL journal, so many processes on the same
+    machine can read and write one file at the same time. SQLite locking is not
+    reliable on network file systems; keep the file on local disk.
+    """
+
+    kSchema = (
+        "CREATE TABLE IF NOT EXISTS scans ("
+        "    id INTEGER PRIMARY KEY,"
+        "    directory TEXT NOT NULL,"
+        "    target_type TEXT NOT NULL,"
+        "    signature TEXT NOT NULL,"
+        "    stamp TEXT NOT NULL,"
+        "    updated REAL NOT NULL,"
+        "    UNIQUE (directory, target_type, signature))",
+        "CREATE TABLE IF NOT EXISTS versions ("
+        "    scan_id INTEGER NOT NULL,"
+        "    position INTEGER NOT NULL,"
+        "    num INTEGER NOT NULL,"
+        "    version_name TEXT NOT NULL,"
+        "    name TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS versions_scan ON versions (scan_id, position)",
+    )
+
+    #---------------------------------------------------------------------------
+    ## Initializes a new instance of PersistentIndex.
+    ##
+    ## @param path : <str> path of the SQLite file. It is created when missing.
+    ##
+    ## @param timeout : <float> seconds to wait for a lock held by other writers.
+    def __init__(self, path, timeout = 30.0):
+        super(PersistentIndex, self).__init__()
+        import sqlite3
+        self._sqlite3 = sqlite3
+        self._path = path
+        self._timeout = timeout
+        self._local = threading.local()
+        self._connection()
+
+
+    #---------------------------------------------------------------------------
+    ## Returns version history of the directory when the record is still valid.
+    ##
+    ## @param directory : <str> directory path.
+    ##
+    ## @param target_type : <str> 'file', 'dir' or 'both'.
+    ##
+    ## @param signature : <tuple> settings the scan depends on.
+    ##
+    ## @param stamp : <tuple> current stamp of the directory.
+    ##
+    ## @param prefix : <str> version string's prefix of the history.
+    ##
+    ## @param version_scheme : <VersionScheme> version scheme of the history.
+    ##
+    ## @return : <VersionHistory> version history, or None type.
+    def load(self, directory, target_type, signature, stamp, prefix = "v", version_scheme = None):
+        connection = self._connection()
+
+        ## Both reads are done in one transaction to see the same snapshot.
+        connection.execute("BEGIN")
+        try:
+            row = connection.execute("SELECT id, stamp FROM scans "
+                                     "WHERE directory = ? AND target_type = ? AND signature = ?",
+                                     (directory, target_type, self._encode(signature))).fetchone()
+
+            if row is None or row[1] != self._encode(stamp):
+                return None
+
+            rows = connection.execute("SELECT num, version_name, name FROM versions "
+                                      "WHERE scan_id = ? ORDER BY position", (row[0],)).fetchall()
+
+        finally:
+            connection.execute("COMMIT")
+
+        decode = self._decode_num
+        versions = [VersionObj(verNum=decode(num), verName=version_name, name=name) for num, version_name, name in rows]
+        return VersionHistory(versions, prefix = prefix, version_scheme = version_scheme)
+
+
+    #---------------------------------------------------------------------------
+    ## Writes version history of the directory, replacing the old record.
+    ##
+    ## @param directory : <str> directory path.
+    ##
+    ## @param target_type : <str> 'file', 'dir' or 'both'.
+    ##
+    ## @param signature : <tuple> settings the scan depends on.
+    ##
+    ## @param stamp : <tuple> stamp of the directory taken before the scan.
+    ##
+    ## @param history : <iterable> of VersionObj.
+    def store(self, directory, target_type, signature, stamp, history):
+        connection = self._connection()
+        signature = self._encode(signature)
+        encode = self._encode_num
+        rows = [(position, encode(ver_obj.versionNum), ver_obj.versionName, ver_obj.name)
+                for position, ver_obj in enumerate(history)]
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for (scan_id,) in connection.execute("SELECT id FROM scans "
+                                                 "WHERE directory = ? AND target_type = ? AND signature = ?",
+                                                 (directory, target_type, signature)).fetchall():
+                connection.execute("DELETE FROM versions WHERE scan_id = ?", (scan_id,))
+                connection.execute("DELETE FROM scans WHERE id = ?", (scan_id,))
+
+            cursor = connection.execute("INSERT INTO scans (directory, target_type, signature, stamp, updated) "
+                                        "VALUES (?, ?, ?, ?, ?)",
+                                        (directory, target_type, signature, self._encode(stamp), time.time()))
+            scan_id = cursor.lastrowid
+            connection.executemany("INSERT INTO versions (scan_id, position, num, version_name, name) "
+                                   "VALUES (?, ?, ?, ?, ?)",
+                                   [(scan_id,) + row for row in rows])
+
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        connection.execute("COMMIT")
+
+
+    #---------------------------------------------------------------------------
+    ## Removes all records.
+    def clear(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("DELETE FROM versions")
+        connection.execute("DELETE FROM scans")
+        connection.execute("COMMIT")
+
+
+    #---------------------------------------------------------------------------
+    ## Closes the connection of the calling thread.
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+    def _connection(self):
+        local = self._local
+        connection = getattr(local, "connection", None)
+
+        if connection is None or local.pid != os.getpid():
+            connection = self._sqlite3.connect(self._path, timeout = self._timeout, isolation_level = None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute("BEGIN IMMEDIATE")
+            for statement in self.kSchema:
+                connection.execute(statement)
+            connection.execute("COMMIT")
+            local.connection = connection
+            local.pid = os.getpid()
+
+        return connection
+
+
+    @staticmethod
+    def _encode(value):
+        return json.dumps(value)
+
+
+    ## Sort keys of version schemes are stored as JSON text in the num column.
+    @staticmethod
+    def _encode_num(num):
+        if isinstance(num, tuple):
+            return json.dumps(num)
+
+        return num
+
+
+    @staticmethod
+    def _decode_num(num):
+        if isinstance(num, _string_types):
+            return tuple(json.loads(num))
+
+        return num
+
+
+
+#-------------------------------------------------------------------------------
+## Returns socket path of the daemon. VERSIONIST_SOCKET environment variable
+## overrides the default path, which is in XDG_RUNTIME_DIR, or else in a
+## directory of the temp directory which only the user can access.
+##
+## @return : <str> socket path.
+def _default_socket_path():
+    path = os.environ.get("VERSIONIST_SOCKET")
+    if path:
+        return path
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "versionist.sock")
+
+    directory = os.path.join(tempfile.gettempdir(), "versionist-%d" % _current_uid())
+    try:
+        os.mkdir(directory, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    ## The directory may have been made by another user before us.
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != _current_uid() or st.st_mode & 0o077:
+        raise OSError(errno.EPERM, "socket directory is not private to the user", directory)
+
+    return os.path.join(directory, "versionist.sock")
+
+
+def _current_uid():
+    return os.getuid() if hasattr(os, "getuid") else 0
+
+
+#-------------------------------------------------------------------------------
+## Raises OSError unless the path is a socket of the current user, so
+## neither the server nor the client trusts a socket made by someone else.
+##
+## @param path : <str> socket path.
+def _check_socket_owner(path):
+    st = os.lstat(path)
+    if not stat.S_ISSOCK(st.st_mode):
+        raise OSError(errno.EEXIST, "path exists and is not a socket", path)
+
+    if st.st_uid != _current_uid():
+        raise OSError(errno.EPERM, "socket is owned by another user", path)
+
+
+#-------------------------------------------------------------------------------
+## Answers a query with FileVersionist. Failures are reported in the response,
+## so one bad query does not stop the others.
+##
+## @param query : <dict> query which has directory, name_pattern, and optional
+##               id, query and FileVersionist options.
+##
+## @return : <dict> response which has result or error, and id of the query.
+def _answer_query(query):
+    response = {}
+    try:
+        options = dict(query)
+        if "id" in options:
+            response["id"] = options.pop("id")
+
+        directory = options.pop("directory")
+        name_pattern = options.pop("name_pattern")
+        kind = options.pop("query", "latest_path")
+
+        if kind not in _QUERY_METHODS:
+            raise ValueError("unknown query '%s'" % kind)
+
+        unknown = set(options) - _QUERY_OPTIONS
+        if unknown:
+            raise ValueError("unknown options %s" % ", ".join(sorted(unknown)))
+
+        vernist = FileVersionist(directory, name_pattern, **options)
+        response["result"] = getattr(vernist, _QUERY_METHODS[kind])()
+
+    except KeyError as e:
+        response["error"] = "missing %s" % e
+
+    except Exception as e:
+        response["error"] = "%s: %s" % (type(e).__name__, e)
+
+    return response
+
+
+#-------------------------------------------------------------------------------
+## Answers a JSON line of the protocol.
+##
+## @param line : <bytes> JSON encoded query.
+##
+## @return : <bytes> JSON encoded response with line feed.
+def _answer_line(line):
+    try:
+        query = json.loads(line.decode("utf-8"))
+        if not isinstance(query, dict):
+            raise ValueError("query must be an object")
+
+    except ValueError as e:
+        response = {"error": "invalid query: %s" % e}
+
+    else:
+        response = _answer_query(query)
+
+    return (json.dumps(response) + "\n").encode("utf-8")
+
+
+
+class _QueryHandler(_socketserver.StreamRequestHandler):
+    """Answers JSON lines of a client connection until the client closes it."""
+
+    def handle(self):
+        try:
+            for line in iter(self.rfile.readline, b""):
+                if line.strip():
+                    self.wfile.write(_answer_line(line))
 
-    @property
-    def versionName(self):
-        """Getter of version name."""
-        return self._versionName
+        except socket.error:
+            ## The client went away.
+            pass
 
-    @property
-    def name(self):
-        """Getter of complete string."""
-        return self._name
 
+    def finish(self):
+        try:
+            _socketserver.StreamRequestHandler.finish(self)
+        except socket.error:
+            pass
 
 
 
-class Versionist(object):
-    """Versionist class explores given name strings and detect latest or next
-    version information.
-    In order to find version token from the given names, this class uses regular
-    expression.
-    The regrex should have version group, which has name of 'VERSION_KEY';
-    the default value is 'version', but the group can be simply written with 
-    version token like '<VERSION_KEY>'. So for example...
-    cKTS_(?P<version>v\d{3}).ma can be cKTS_<version>.ma
-    The regrex for version token automatically generated with padding and prefix
-    parameters.
-    """
+if hasattr(socket, "AF_UNIX"):
+    class _QueryServer(_socketserver.ThreadingMixIn, _socketserver.UnixStreamServer):
+        daemon_threads = True
 
-    VERSION_KEY = "version"
-    kMatchType = "match"
-    kSearchType = "search"
+else:
+    _QueryServer = None
 
 
-    @classmethod
-    def set_version_key(cls, version_key):
-        if isinstance(version_key, str):
-            cls.VERSION_KEY = version_key
-        else:
-            raise ValueError("Version key should be string type")
 
+class VersionServer(object):
+    """VersionServer is a resident process which answers version lookups on a
+    Unix domain socket, so short lived processes do not pay start-up, import
+    and a cold directory scan for every lookup.
+    The protocol is JSON lines. A query has directory, name_pattern, optional
+    id, query and FileVersionist options, and its response has result or error.
+    So for example...
+    {"id": 1, "directory": "/show/sh010/comp", "name_pattern": "^comp_<version>\\.nk$"}
+    {"id": 1, "result": "/show/sh010/comp/comp_v012.nk"}
+    Queries are 'latest_path', 'latest_name', 'latest_version_name',
+    'latest_version_num', 'next_version_name' and 'next_version_num'.
+    Every connection is served on its own thread, and all of them share the
+    process wide directory listing cache, which is validated with one stat of
+    the directory per lookup.
+    """
 
     #---------------------------------------------------------------------------
-    ## Initializes a new instance of Versionist.
-    ##
-    ## @param targets : <list> of string names.
-    ##
-    ## @param name_pattern : <str> regular expression to match targets
-    ##
-    ## @param padding : <int> padding number of version.
-    ##                This is used version token regrex replacement.
+    ## Initializes a new instance of VersionServer and binds the socket.
     ##
-    ## @param prefix : <str> version string's prefix. This can be empty string.
+    ## @param socket_path : <str> socket path. None uses the default path.
     ##
-    ## @param initial_number : <int> first number of version.
+    ## @param listing_cache_size : <int> maximum number of cached directories.
+    ##                            The listing cache is enabled unless it is
+    ##                            already enabled.
     ##
-    ## @param match_type : <str> match type. This is used to decide regrex
-    ##                    matching process.
-    def __init__(self, targets,
-                       name_pattern,
-                       padding = 3,
-                       prefix = "v",
-                       initial_number = 1,
-                       match_type = kMatchType  ## 'match' or 'search'
-                       ):
-        super(Versionist, self).__init__()
-        self._targets = targets
-        self._name_pattern = name_pattern
-        self._padding = padding
-        self._prefix = prefix
-        self._initial_number = initial_number
-        self._match_type = match_type
+    ## @param ttl : <float> ttl of the listing cache. See
+    ##             FileVersionist.enable_listing_cache.
+    def __init__(self, socket_path = None, listing_cache_size = 1024, ttl = None):
+        super(VersionServer, self).__init__()
+        if _QueryServer is None:
+            raise OSError(errno.EAFNOSUPPORT, "Unix domain sockets are not supported")
+
+        self._socket_path = socket_path or _default_socket_path()
+        self._remove_stale_socket()
+
+        if _LISTING_CACHE is None:
+            FileVersionist.enable_listing_cache(maxsize = listing_cache_size, ttl = ttl)
+
+        self._server = _QueryServer(self._socket_path, _QueryHandler)
+
+
+    @property
+    def socket_path(self):
+        return self._socket_path
 
 
     #---------------------------------------------------------------------------
-    ## Set new targets. This should be used when the instance is shared for
-    ## several targets.
-    ##
-    ## @ param targets : <list> of target string names.
-    ##
-    def set_targets(self, targets):
-        self._targets = targets
+    ## Serves connections until shutdown is called.
+    def serve_forever(self):
+        self._server.serve_forever()
 
 
     #---------------------------------------------------------------------------
-    ## Convert name pattern. If the given string containts version token,
-    ## it is replaced at here.
-    ##
-    ## @return : <str> actual regular expression pattern.
-    def _format_pattern(self):
+    ## Stops serve_forever. This must be called from another thread.
+    def shutdown(self):
+        self._server.shutdown()
 
-        if not isinstance(self._name_pattern, (str, unicode)):
-            raise RuntimeError("File pattern is not set.")
 
-        if "(?P<%s>" % self.VERSION_KEY in self._name_pattern:
-            return self._name_pattern
+    #---------------------------------------------------------------------------
+    ## Closes the socket and removes its file.
+    def close(self):
+        self._server.server_close()
+        try:
+            os.remove(self._socket_path)
+        except OSError:
+            pass
 
-        elif "<%s>" % self.VERSION_KEY in self._name_pattern:
-            groupKey = r"(?P<%s>%s\d{%d})" % (self.VERSION_KEY, self._prefix, self._padding)
-            pat = self._name_pattern.replace("<%s>" % self.VERSION_KEY, groupKey)
-            return pat
 
-        else:
-            raise VersionKeyError("Name pattern needs version key '%s'. Got %s." % (self.VERSION_KEY, self._name_pattern))
+    def _remove_stale_socket(self):
+        try:
+            _check_socket_owner(self._socket_path)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return
+            raise
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self._socket_path)
+
+        except socket.error:
+            os.remove(self._socket_path)
+            return
+
+        finally:
+            probe.close()
+
+        raise OSError(errno.EADDRINUSE, "server is already running", self._socket_path)
 
 
-#-------------------------------------------------------------------------------
-# These methods might not be useful because it needs first version at least in the targets.
-#
-#     def getNextVersionFilePath(self):
-#         nextFile = self.getNextVersionFile()
-#         if nextFile is None:
-#             return None
-#
-#         return os.path.join(self._directory, nextFile)
-#
-#
-#     def getNextVersionFile(self):
-#         versionInfo = self._get_latest_version()
-#         versionFile = versionInfo.get("fileName")
-#         versionName = versionInfo.get("versionName")
-#         if versionFile is None or versionName is None:
-#             return None
-#
-#         nextName = versionFile.replace(versionName, self.get_next_version_name())
-#         return nextName
 
+class VersionClient(object):
+    """VersionClient sends version lookups to VersionServer. When the server is
+    not running, lookups are answered in this process instead, so callers do
+    not need to know whether the server is running.
+    Connections are kept open per thread and per process. After a failed
+    connection the server is not tried again for kRetryInterval seconds.
+    """
+
+    kRetryInterval = 1.0
+    ## Number of queries sent before their responses are read. Responses of
+    ## a window must fit in the socket buffers, or both ends wait for each other.
+    kPipelineWindow = 128
 
     #---------------------------------------------------------------------------
-    ## Returns next version name. If no version exists, returns initial version name.
+    ## Initializes a new instance of VersionClient.
     ##
-    ## @return : <str> next version name
-    def get_next_version_name(self):
-        next_number = self.get_next_version_num()
-        return "%s%s" % (self._prefix, str(next_number).zfill(self._padding))
+    ## @param socket_path : <str> socket path. None uses the default path.
+    ##
+    ## @param timeout : <float> seconds to wait for the server.
+    ##
+    ## @param fallback : <bool> True answers lookups in this process when the
+    ##                  server is not running. False raises the socket error.
+    def __init__(self, socket_path = None, timeout = 10.0, fallback = True):
+        super(VersionClient, self).__init__()
+        self._socket_path = socket_path or _default_socket_path()
+        self._timeout = timeout
+        self._fallback = fallback
+        self._local = threading.local()
+        self._retry_time = 0.0
 
 
     #---------------------------------------------------------------------------
-    ## Returns next version number. If no version exists, returns initial number.
+    ## Returns result of a lookup.
     ##
-    ## @return : <int> next version number
-    def get_next_version_num(self):
-        latest_num = self.get_latest_version_num()
-        if not isinstance(latest_num, int):
-            return self._initial_number
+    ## @param directory : <str> directory path.
+    ##
+    ## @param name_pattern : <str> regular expression to match targets.
+    ##
+    ## @param query : <str> kind of the lookup. See VersionServer.
+    ##
+    ## @param options : FileVersionist options such as padding, prefix or
+    ##                 target_type.
+    ##
+    ## @return : result of the lookup.
+    def query(self, directory, name_pattern, query = "latest_path", **options):
+        options.update(directory = directory, name_pattern = name_pattern, query = query)
+        response = self.query_many([options])[0]
+        if "error" in response:
+            raise VersionQueryError(response["error"])
 
-        nextNum = latest_num + 1
-        return nextNum
+        return response["result"]
 
 
     #---------------------------------------------------------------------------
-    ## Returns latest version name. If no version exists, returns None type.
+    ## Sends many queries at once and returns their responses in order.
+    ## Failures are reported in the responses and are not raised.
     ##
-    ## @return : <str> latest version name
-    def get_latest_version_name(self):
-        ver_obj = self._get_latest_version()
-        return ver_obj.versionName
+    ## @param queries : <list> of query dicts. See VersionServer.
+    ##
+    ## @return : <list> of response dicts.
+    def query_many(self, queries):
+        queries = list(queries)
+        if not queries:
+            return []
 
+        lines = [(json.dumps(query) + "\n").encode("utf-8") for query in queries]
 
-    #---------------------------------------------------------------------------
-    ## Returns latest version number. If no version exists, returns None type.
-    ##
-    ## @return : <str> latest version name
-    def get_latest_version_num(self):
-        ver_obj = self._get_latest_version()
-        return ver_obj.versionNum
+        for _ in range(2):
+            connection = self._connection()
+            if connection is None:
+                break
+
+            try:
+                responses = []
+                for start in range(0, len(lines), self.kPipelineWindow):
+                    window = lines[start:start + self.kPipelineWindow]
+                    responses.extend(self._exchange(connection, b"".join(window), len(window)))
+                return responses
+
+            except (socket.error, EOFError):
+                ## The server was restarted or stopped; connect once more.
+                self._disconnect()
+
+        if not self._fallback:
+            raise socket.error(errno.ECONNREFUSED, "server is not running", self._socket_path)
+
+        return [_answer_query(query) for query in queries]
 
 
     #---------------------------------------------------------------------------
-    ## Returns latest version's string. If no version exists, returns None type.
+    ## returns latest version file or directory's complete path.
     ##
-    ## @return : <str> latest string
-    def get_latest_name(self):
-        ver_obj = self._get_latest_version()
-        return ver_obj.name
-
+    ## @return : <str> latest version path.
+    def get_latest_namePath(self, directory, name_pattern, **options):
+        return self.query(directory, name_pattern, "latest_path", **options)
 
-    def _get_latest_version(self):
 
-        formatted_pattern = self._format_pattern()
-        compiled = re.compile(formatted_pattern)
-        max_version = self._initial_number -1
-        max_version_name = None
-        max_name = None
+    #---------------------------------------------------------------------------
+    ## Closes the connection of the calling thread.
+    def close(self):
+        self._disconnect()
 
-        for name in self._targets:
 
-            if self._match_type == self.kMatchType:
-                matchFunc = compiled.match
+    def _connection(self):
+        local = self._local
+        connection = getattr(local, "connection", None)
+        if connection is not None and local.pid == os.getpid():
+            return connection
 
-            else:
-                matchFunc = compiled.search
+        if time.time() < self._retry_time:
+            return None
 
-            mObj = matchFunc(name)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self._timeout)
+        try:
+            _check_socket_owner(self._socket_path)
+            sock.connect(self._socket_path)
 
-            if mObj is None:
-                continue
+        except (OSError, socket.error) as e:
+            if e.errno == errno.EPERM and not self._fallback:
+                sock.close()
+                raise
+            sock.close()
+            self._retry_time = time.time() + self.kRetryInterval
+            return None
 
-            version_name = mObj.group(self.VERSION_KEY)
-            version_num = int(version_name.replace(self._prefix, ""))
+        local.connection = (sock, sock.makefile("rb"))
+        local.pid = os.getpid()
+        return local.connection
 
-            if version_num > max_version:
-                max_version = version_num
-                max_version_name = version_name
-                max_name = name
 
-        if max_version == -1:
-            return VersionObj()
+    def _disconnect(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            for item in reversed(connection):
+                try:
+                    item.close()
+                except socket.error:
+                    pass
 
-        else:
-            return VersionObj(verNum=max_version, verName=max_version_name, name=max_name)
 
+    @staticmethod
+    def _exchange(connection, request, count):
+        sock, reader = connection
+        sock.sendall(request)
+        responses = []
+        for _ in range(count):
+            line = reader.readline()
+            if not line:
+                raise EOFError("server closed the connection")
+            responses.append(json.loads(line.decode("utf-8")))
 
+        return responses
 
-class FileVersionist(Versionist):
-    """FileVersionist class explores given directory and detect latest or next
-    version information.
-    In order to find version token from the given names, this class uses regular
-    expression.
-    The regrex should have version group, which has name of VERSION_KEY, but the
-    group can be simply written with version token like '<VERSION_KEY>'.
-    So for example...
-    cKTS_(?P<version>v\d{3}).ma can be cKTS_<version>.ma
-    The regrex for version token automatically generated with padding and prefix
-    parameters.
-    """
 
-    kTargetFile = "file"
-    kTargetDir = "dir"
-    kTargetBoth = "both"
 
-    #---------------------------------------------------------------------------
-    ## Initializes a new instance of FileVersionist.
-    ##
-    ## @param directory : <str> Directory which containts target file names
-    ##
-    ## @param name_pattern : <str> regular expression to match targets
-    ##
-    ## @param padding : <int> padding number of version.
-    ##                This is used version token regrex replacement.
-    ##
-    ## @param prefix : <str> version string's prefix. This can be empty string.
-    ##
-    ## @param initial_number : <int> first number of version.
-    ##
-    ## @param match_type : <str> match type. This is used to decide regrex
-    ##                    matching process.
-    ##
-    ## @param target_type : <str> This affects how to obtain target names from
-    ##                     specified directory. You can choose ""file", "dir" or "both".
-    ##
-    def __init__(self, directory = None,
-                       name_pattern = None,
-                       padding = 3,
-                       prefix = "v",
-                       initial_number = 1,
-                       match_type = Versionist.kMatchType,
-                       target_type = kTargetFile ## 'file', 'dir' or 'both'
-                       ):
-        super(FileVersionist, self).__init__(targets = [],
-                                             name_pattern = name_pattern,
-                                             padding = padding,
-                                             prefix = prefix,
-                                             initial_number = initial_number,
-                                             match_type = match_type)
-        self._directory = directory
-        self._target_type = target_type
+class VersionKeyError(Exception):
+    pass
 
-        if self._directory is not None:
-            targets = self._find_targets()
-            self.set_targets(targets)
 
 
-    #---------------------------------------------------------------------------
-    ## Set directory to search versions. Internally this methods explors the target
-    ## directory and holds the strings found in there.
-    ##
-    ## @param directory : <str> target directory path to seach version files.
-    def set_directory(self, directory):
-        self._directory = directory
-        targets = self._find_targets()
-        self.set_targets(targets)
+class VersionQueryError(Exception):
+    pass
 
 
-    #---------------------------------------------------------------------------
-    ## Depending on the target type, this method finds appropriate names.
-    ##
-    ## @return : <str> search target names.
-    def _find_targets(self):
-        if self._directory is None:
-            raise RuntimeError("Search target directory is not set.")
 
-        if not os.path.exists(self._directory):
-            return []
+#-------------------------------------------------------------------------------
+## Reads JSON line queries from stdin and writes their responses to stdout in
+## order. Queries are answered in this process with the listing cache, or by
+## the server when socket_path is given and the server is running.
+##
+## @param socket_path : <str> socket path of the server, or None type.
+def _run_batch(socket_path = None):
+    stdin = getattr(sys.stdin, "buffer", sys.stdin)
+    stdout = getattr(sys.stdout, "buffer", sys.stdout)
+    client = None
 
-        files = os.listdir(self._directory)
+    if socket_path is not None:
+        client = VersionClient(socket_path)
+    elif _LISTING_CACHE is None:
+        FileVersionist.enable_listing_cache()
 
-        if self._target_type == "dir":
-            check_func = os.path.isdir
+    for line in iter(stdin.readline, b""):
+        if not line.strip():
+            continue
 
-        elif self._target_type == "file":
-            check_func = os.path.isfile
+        if client is None:
+            stdout.write(_answer_line(line))
 
         else:
-            check_func = None
+            try:
+                query = json.loads(line.decode("utf-8"))
+                response = client.query_many([query])[0]
+            except (ValueError, TypeError, AttributeError) as e:
+                response = {"error": "invalid query: %s" % e}
+            stdout.write((json.dumps(response) + "\n").encode("utf-8"))
 
-        targets = []
+        stdout.flush()
 
-        for name in files:
-            if check_func is None:
-                targets.append(name)
 
-            else:
-                actualPath = os.path.join(self._directory, name)
+#-------------------------------------------------------------------------------
+## Command line entry point.
+##
+## versionist.py batch [--socket PATH] < queries.jsonl
+## versionist.py serve [--socket PATH] [--cache-size N] [--ttl SECONDS]
+##
+## @param argv : <list> of arguments. None uses sys.argv.
+##
+## @return : <int> exit status.
+def main(argv = None):
+    import argparse
+    import signal
 
-                if check_func(actualPath):
-                    targets.append(name)
+    parser = argparse.ArgumentParser(prog = "versionist", description = "Version lookups of directories.")
+    commands = parser.add_subparsers(dest = "command")
 
-        return targets
+    batch_parser = commands.add_parser("batch", help = "answer JSON line queries from stdin")
+    batch_parser.add_argument("--socket", default = None,
+                              help = "send queries to the server on this socket when it is running")
 
+    serve_parser = commands.add_parser("serve", help = "run the server")
+    serve_parser.add_argument("--socket", default = None, help = "socket path")
+    serve_parser.add_argument("--cache-size", type = int, default = 1024, help = "maximum number of cached directories")
+    serve_parser.add_argument("--ttl", type = float, default = None, help = "seconds a listing is used without a check")
 
-    #---------------------------------------------------------------------------
-    ## returns latest version file or directory's complete path.
-    ##
-    ## @return : <str> latest version path.
-    def get_latest_namePath(self):
-        latest_name = self.get_latest_name()
-        if latest_name is None:
-            return None
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        _run_batch(args.socket)
+        return 0
 
-        return os.path.join(self._directory, latest_name)
+    elif args.command == "serve":
+        server = VersionServer(args.socket, listing_cache_size = args.cache_size, ttl = args.ttl)
 
+        def terminate(signum, frame):
+            raise SystemExit(0)
 
-class VersionKeyError(Exception):
-    pass
+        signal.signal(signal.SIGTERM, terminate)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+        return 0
+
+    parser.print_help()
+    return 2
 
 
 
 if __name__ == '__main__':
 
-    pass
+    sys.exit(main())
 
 
 #-------------------------------------------------------------------------------